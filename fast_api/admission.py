@@ -0,0 +1,199 @@
+"""
+Admission Control
+Bounds how many analysis requests run at once and how many may wait for a
+slot. Waiting requests are admitted in arrival order; a request that finds
+the queue full is rejected at once (429), and one that cannot start before
+its deadline is dropped (503) instead of occupying a slot for a client
+that has already given up. Both carry a Retry-After estimate from the
+recent slot hold times.
+
+Everything runs on the event loop: no locks, and a slot freed by one
+request is handed straight to the oldest waiter.
+"""
+
+import asyncio
+import math
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from inference_scheduler import percentile
+
+_ticket: ContextVar[Optional["Ticket"]] = ContextVar("request_ticket", default=None)
+
+
+class AdmissionRejected(Exception):
+    """
+    A request was not admitted.
+
+    Attributes:
+        status_code: 429 (queue full), 503 (would miss its deadline) or
+            504 (admitted, but the deadline passed before inference)
+        reason: 'queue_full', 'deadline' or 'expired'
+        retry_after: Seconds the client should wait before retrying
+    """
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """A held slot (pass it back to release)."""
+    admitted_at: float
+    deadline: float
+    queue_wait: float
+    holders: int = 1  # The request, plus work that outlives it (see retain())
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded FIFO wait queue.
+
+    Args:
+        max_concurrent: Requests holding a slot at once
+        max_queue: Requests allowed to wait for a slot (0 = reject when busy)
+        max_retry_after: Upper bound of the Retry-After hint, in seconds
+        stats_window: Number of recent samples kept for wait-time percentiles
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_retry_after: int = 30, stats_window: int = 2048):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_retry_after = max(1, max_retry_after)
+        self.active = 0
+        self._waiters: deque = deque()
+        self._hold_seconds: Optional[float] = None  # Moving average of slot hold times
+
+        self.admitted = 0
+        self.rejections: Counter = Counter()
+        self._queue_waits: deque = deque(maxlen=stats_window)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until the request at this queue position (1 = next) gets a slot."""
+        if self._hold_seconds is None:
+            return 0.0
+        return math.ceil(position / self.max_concurrent) * self._hold_seconds
+
+    def _retry_after(self) -> int:
+        return min(self.max_retry_after, max(1, math.ceil(self.estimated_wait(self.queued + 1))))
+
+    def _reject(self, status_code: int, reason: str, detail: str) -> AdmissionRejected:
+        self.rejections[reason] += 1
+        return AdmissionRejected(status_code, reason, detail, self._retry_after())
+
+    async def acquire(self, deadline: float) -> Ticket:
+        """
+        Waits for a slot.
+
+        Args:
+            deadline: time.monotonic() by which the request must have started
+
+        Returns:
+            Ticket: Pass it to release() when the request is done
+
+        Raises:
+            AdmissionRejected: Queue full (429), or no slot before the deadline (503)
+        """
+        enqueued_at = time.monotonic()
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+        else:
+            if self.queued >= self.max_queue:
+                raise self._reject(429, "queue_full", f"Analysis queue is full ({self.queued} waiting)")
+            remaining = deadline - enqueued_at
+            if self.estimated_wait(self.queued + 1) > remaining:
+                raise self._reject(503, "deadline", "Analysis queue would not reach this request before its deadline")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=max(0.0, remaining))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    self._hand_over()  # The slot arrived as we gave up: pass it on
+                else:
+                    try:
+                        self._waiters.remove(waiter)
+                    except ValueError:
+                        pass
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._reject(503, "deadline", "No analysis slot became free before the request deadline")
+                raise
+        admitted_at = time.monotonic()
+        self.admitted += 1
+        self._queue_waits.append(admitted_at - enqueued_at)
+        return Ticket(admitted_at=admitted_at, deadline=deadline, queue_wait=admitted_at - enqueued_at)
+
+    def retain(self, ticket: Ticket) -> None:
+        """Keeps ticket's slot until one more release(), for work that may outlive its request."""
+        ticket.holders += 1
+
+    def release(self, ticket: Ticket) -> None:
+        """
+        Drops one hold on ticket; the last one frees the slot (handing it to
+        the oldest waiter, if any).
+        """
+        ticket.holders -= 1
+        if ticket.holders > 0:
+            return
+        held = time.monotonic() - ticket.admitted_at
+        self._hold_seconds = held if self._hold_seconds is None else 0.8 * self._hold_seconds + 0.2 * held
+        self._hand_over()
+
+    def expired(self, stage: str) -> AdmissionRejected:
+        """Rejection for an admitted request whose deadline passed before stage."""
+        return self._reject(504, "expired", f"Request deadline passed before {stage}")
+
+    def _hand_over(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # Slot changes hands, self.active stays
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._queue_waits)
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejections),
+            "avg_hold_ms": round(self._hold_seconds * 1000, 1) if self._hold_seconds is not None else None,
+            "queue_wait_ms": {
+                "p50": round(percentile(waits, 50) * 1000, 2),
+                "p95": round(percentile(waits, 95) * 1000, 2),
+                "p99": round(percentile(waits, 99) * 1000, 2),
+            },
+        }
+
+
+def set_ticket(ticket: Optional[Ticket]):
+    """Makes ticket (and its deadline) the current request's; returns the token to reset it with."""
+    return _ticket.set(ticket)
+
+
+def reset_ticket(token) -> None:
+    _ticket.reset(token)
+
+
+def current_ticket() -> Optional[Ticket]:
+    """The admission ticket of the current request (None outside admission control)."""
+    return _ticket.get()
+
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None without one)."""
+    ticket = _ticket.get()
+    return ticket.deadline - time.monotonic() if ticket is not None else None
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Batch Analysis Benchmark
+Scores the same synthetic studies two ways and compares throughput:
+one /analyze call per study, sent one after another (how case imports ran
+so far), and one streamed /analyze/batch request. For the batch it also
+reports the time to the first result line and the service's RSS growth.
+
+Caches are off unless --cache is given, so every study does the full work.
+
+Usage:
+    python benchmarks/bench_batch.py
+    python benchmarks/bench_batch.py --studies 64 --concurrency 8 --defer-heatmap
+    python benchmarks/bench_batch.py --storage-latency 0.1     # storage round-trips like Supabase
+    python benchmarks/bench_batch.py --url http://127.0.0.1:5000
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import httpx
+
+from bench_load import make_files, make_payloads, parse_gauge, start_service, wait_ready
+from local_dicom_server import LocalDicomServer
+
+
+def service_rss_mb(client, base):
+    rss = parse_gauge(client.get(f"{base}/metrics").text, "cdss_process_resident_memory_bytes")
+    return rss / 1e6 if rss is not None else None
+
+
+def run_sequential(client, base, payloads):
+    started = time.perf_counter()
+    failed = sum(client.post(f"{base}/analyze", json=payload).status_code != 200 for payload in payloads)
+    return time.perf_counter() - started, failed
+
+
+def run_batch(client, base, payloads, concurrency):
+    body = {"studies": [{"id": str(i), **payload} for i, payload in enumerate(payloads)]}
+    if concurrency:
+        body["concurrency"] = concurrency
+    started = time.perf_counter()
+    first, summary = None, None
+    with client.stream("POST", f"{base}/analyze/batch", json=body) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if first is None:
+                first = time.perf_counter() - started
+            record = json.loads(line)
+            summary = record.get("summary", summary)
+    return time.perf_counter() - started, first, summary
+
+
+def main(args):
+    files = make_files([args.workload], args.studies, args.frames, args.size)
+    process = None
+    base = args.url
+    if base is None:
+        process = start_service(args)
+        base = f"http://127.0.0.1:{args.port}"
+    try:
+        health = wait_ready(base, args.startup_timeout)
+        print(f"Service: {health['device']}, backend {health['inference_backend']['name']}, batching "
+              f"{'on' if health.get('inference_scheduler') else 'off'}")
+        with LocalDicomServer(files, latency=args.storage_latency) as server, httpx.Client(timeout=args.timeout) as client:
+            payloads = make_payloads(args.workload, server, args.studies, args.defer_heatmap)
+            client.post(f"{base}/analyze", json=payloads[0]).raise_for_status()  # Warm the connection pools
+
+            sequential, sequential_failed = run_sequential(client, base, payloads)
+            rss_before = service_rss_mb(client, base)
+            batch, first, summary = run_batch(client, base, payloads, args.concurrency)
+            rss_after = service_rss_mb(client, base)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    n = len(payloads)
+    print(f"{n} {args.workload} studies")
+    print(f"  sequential /analyze: {sequential:7.2f} s  {n / sequential:6.2f} studies/s  ({sequential_failed} failed)")
+    print(f"  /analyze/batch:      {batch:7.2f} s  {n / batch:6.2f} studies/s  ({summary['failed']} failed), "
+          f"first result after {first * 1000:.0f} ms")
+    print(f"  speed-up: {sequential / batch:.2f}x")
+    if rss_before is not None and rss_after is not None:
+        print(f"  service RSS: {rss_before:.0f} MB -> {rss_after:.0f} MB during the batch")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare one /analyze call per study with one streamed /analyze/batch")
+    parser.add_argument("--workload", choices=["slices", "volume"], default="slices")
+    parser.add_argument("--studies", type=int, default=32, help="Distinct synthetic studies")
+    parser.add_argument("--concurrency", type=int, help="Batch concurrency (default: the service's BATCH_CONCURRENCY)")
+    parser.add_argument("--frames", type=int, default=32, help="Frames per synthetic volume")
+    parser.add_argument("--size", type=int, default=256, help="Rows/columns of the synthetic slices")
+    parser.add_argument("--storage-latency", type=float, default=0.0, help="Seconds the storage stand-in waits per file")
+    parser.add_argument("--defer-heatmap", action="store_true", help="Send deferHeatmap=true")
+    parser.add_argument("--cache", action="store_true", help="Keep the service's result and slice caches on")
+    parser.add_argument("--url", help="Benchmark a running service instead of starting uvicorn main:app")
+    parser.add_argument("--port", type=int, default=5079)
+    parser.add_argument("--timeout", type=float, default=600, help="Request timeout (s)")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    sys.exit(main(parser.parse_args()))
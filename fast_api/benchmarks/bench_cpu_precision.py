@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+CPU Precision Benchmark
+Times the fused engine on the CPU in each CPU_PRECISION mode (fp32 NCHW,
+channels_last, channels_last + bf16 autocast) and compares its probabilities
+with fp32 on sample studies: every 3-slice window of synthetic multi-frame
+volumes, or of the DICOM files in --dicom-dir.
+
+Usage:
+    python benchmarks/bench_cpu_precision.py --batch-sizes 1 4 --iterations 10
+    python benchmarks/bench_cpu_precision.py --dicom-dir data/eval
+"""
+
+import argparse
+import copy
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_fused_inference import load_models  # noqa: E402
+from cpu_precision import (  # noqa: E402
+    CPU_PRECISIONS, bf16_supported, precision_autocast, prepare_input, to_channels_last, uses_channels_last,
+)
+from fused_inference import FusedMRNet  # noqa: E402
+from local_dicom_server import make_dicom_volume  # noqa: E402
+from preprocessing import open_volume, volume_frame_count  # noqa: E402
+from quantization import load_calibration_inputs  # noqa: E402
+from volume_inference import load_chunk  # noqa: E402
+
+
+def sample_windows(args):
+    if args.dicom_dir:
+        return load_calibration_inputs(args.dicom_dir, args.max_samples)
+    windows = []
+    for seed in range(args.studies):
+        ds = open_volume(make_dicom_volume(args.frames, 256, 256, seed=seed))
+        windows.append(load_chunk(ds, 0, volume_frame_count(ds)))
+    return torch.cat(windows)[:args.max_samples]
+
+
+def probabilities(engine, windows, precision, device, batch_size=8):
+    with torch.no_grad(), precision_autocast(precision, device):
+        logits = torch.cat([
+            engine(prepare_input(windows[i:i + batch_size], precision))
+            for i in range(0, len(windows), batch_size)
+        ])
+    return torch.sigmoid(logits.float())
+
+
+def time_forward(engine, x, precision, device, iterations):
+    x = prepare_input(x, precision)
+    with torch.no_grad(), precision_autocast(precision, device):
+        engine(x)  # warm-up (oneDNN primitive creation)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            engine(x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main(args):
+    device = torch.device("cpu")
+    fused = FusedMRNet(load_models(args.random_weights, device)).eval()
+    windows = sample_windows(args)
+
+    engines = {"fp32": fused}
+    channels_last = copy.deepcopy(fused)
+    to_channels_last([channels_last])
+    for precision in CPU_PRECISIONS:
+        if uses_channels_last(precision):
+            engines[precision] = channels_last
+    modes = [p for p in CPU_PRECISIONS if p != "bf16" or bf16_supported()]
+
+    print("=" * 78)
+    print("🧮 CPU PRECISION BENCHMARK")
+    print("=" * 78)
+    print(f"Threads: {torch.get_num_threads()}, native bf16: {bf16_supported()}, "
+          f"sample windows: {len(windows)} ({args.dicom_dir or 'synthetic volumes'})")
+    if "bf16" not in modes:
+        print("⚠️  No native bf16 on this CPU, skipping bf16 (the service falls back to channels_last)")
+
+    reference = probabilities(fused, windows, "fp32", device)
+    header = f"{'mode':14s} " + " ".join(f"{f'ms (B={b})':>11s}" for b in args.batch_sizes)
+    print(f"\n{header} {'speedup':>8s} {'max Δp':>8s} {'mean Δp':>8s} {'flips':>6s}")
+    baseline = None
+    for precision in modes:
+        engine = engines[precision]
+        times = [time_forward(engine, torch.rand(b, 3, 256, 256), precision, device, args.iterations)
+                 for b in args.batch_sizes]
+        baseline = baseline or times
+        probs = probabilities(engine, windows, precision, device)
+        delta = (probs - reference).abs()
+        flips = int(((probs > 0.5) != (reference > 0.5)).sum())
+        print(f"{precision:14s} " + " ".join(f"{t:11.1f}" for t in times) +
+              f" {baseline[-1] / times[-1]:7.2f}x {delta.max().item():8.4f} {delta.mean().item():8.5f} {flips:6d}")
+
+    print("\nspeedup is at the largest batch size; Δp and flips (crossing 0.5) are vs fp32 over")
+    print("every window and task.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU precision modes (fp32 / channels_last / bf16)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--dicom-dir", help="Folder of DICOM volumes or slices (default: synthetic volumes)")
+    parser.add_argument("--studies", type=int, default=4, help="Synthetic volumes")
+    parser.add_argument("--frames", type=int, default=16, help="Frames per synthetic volume")
+    parser.add_argument("--max-samples", type=int, default=64)
+    parser.add_argument("--random-weights", action="store_true", help="Skip loading checkpoints")
+    main(parser.parse_args())
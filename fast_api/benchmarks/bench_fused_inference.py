@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Fused Inference Benchmark
+Compares running ACL / meniscus / abnormal models one by one (three forwards,
+three .item() syncs) against the fused grouped-convolution engine.
+
+Usage:
+    python benchmarks/bench_fused_inference.py --iterations 20
+    python benchmarks/bench_fused_inference.py --random-weights   # no checkpoints needed
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fused_inference import FusedMRNet  # noqa: E402
+from mrnet import MRNetModel  # noqa: E402
+
+MODEL_DIR = Path(__file__).resolve().parent.parent / "models"
+TASKS = ["acl", "meniscus", "abnormal"]
+
+
+def load_models(random_weights, device):
+    models = {}
+    for task in TASKS:
+        model = MRNetModel()
+        if not random_weights:
+            path = MODEL_DIR / f"{task}_model.pth"
+            model.load_state_dict(torch.load(path, map_location="cpu", weights_only=True))
+        models[task] = model.to(device).eval()
+    return models
+
+
+def time_it(fn, iterations):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(args):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    models = load_models(args.random_weights, device)
+    fused = FusedMRNet(models).to(device).eval()
+    x = torch.rand(1, 3, 256, 256, device=device)
+
+    def per_model():
+        return {task: torch.sigmoid(m(x)).item() for task, m in models.items()}
+
+    print("=" * 60)
+    print("🧠 FUSED INFERENCE BENCHMARK")
+    print("=" * 60)
+    print(f"Device: {device}, threads: {torch.get_num_threads()}, iterations: {args.iterations}")
+
+    with torch.no_grad():
+        reference = per_model()
+        fused_probs = fused.predict(x)
+        per_model_time = time_it(per_model, args.iterations)
+        fused_time = time_it(lambda: fused.predict(x), args.iterations)
+
+    max_delta = max(abs(reference[t] - fused_probs[t]) for t in TASKS)
+    print(f"\n📊 Per-model (3 forwards, 3 syncs): {per_model_time * 1000:8.1f} ms")
+    print(f"📊 Fused (1 forward, 1 sync):       {fused_time * 1000:8.1f} ms")
+    print(f"🚀 Speedup: {per_model_time / fused_time:.2f}x")
+    print(f"🎯 Max probability delta: {max_delta:.2e}")
+    for task in TASKS:
+        print(f"   {task:9s} per-model={reference[task]:.6f} fused={fused_probs[task]:.6f}")
+
+    if max_delta > args.atol:
+        print(f"❌ Outputs differ by more than {args.atol}")
+        sys.exit(1)
+    print("✅ Outputs match within tolerance")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fused vs per-model inference")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--random-weights", action="store_true", help="Use untrained weights instead of models/*.pth")
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Heatmap Method Benchmark
+Compares Grad-CAM (extra forward + backward per request) with class
+activation maps computed from the layer4 features of the inference pass.
+
+Usage:
+    python benchmarks/bench_heatmap.py --iterations 10
+    python benchmarks/bench_heatmap.py --random-weights   # no checkpoints needed
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from explainability import compute_cams, grad_cam, upsample_cam  # noqa: E402
+from mrnet import MRNetModel  # noqa: E402
+
+MODEL_DIR = Path(__file__).resolve().parent.parent / "models"
+
+
+def time_it(fn, iterations):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) / iterations, result
+
+
+def main(args):
+    model = MRNetModel()
+    if not args.random_weights:
+        path = MODEL_DIR / f"{args.task}_model.pth"
+        model.load_state_dict(torch.load(path, map_location="cpu", weights_only=True))
+    model.eval()
+    x = torch.rand(1, 3, 256, 256)
+
+    def inference_only():
+        with torch.no_grad():
+            return torch.sigmoid(model(x)).item()
+
+    def inference_with_cam():
+        with torch.no_grad():
+            logits, features = model.forward_features(x)
+            cam = compute_cams(features[:, None], model.backbone.fc[-1].weight)[0, 0].numpy()
+        return upsample_cam(cam, (256, 256))
+
+    print("=" * 60)
+    print("🔥 HEATMAP METHOD BENCHMARK")
+    print("=" * 60)
+    print(f"Task: {args.task}, threads: {torch.get_num_threads()}, iterations: {args.iterations}")
+
+    base_time, _ = time_it(inference_only, args.iterations)
+    cam_time, cam_map = time_it(inference_with_cam, args.iterations)
+    gradcam_time, gradcam_map = time_it(lambda: grad_cam(model, x), args.iterations)
+
+    print(f"\n📊 Inference only:                  {base_time * 1000:8.1f} ms")
+    print(f"📊 Inference + CAM (same pass):      {cam_time * 1000:8.1f} ms  (+{(cam_time - base_time) * 1000:.1f} ms)")
+    print(f"📊 Inference + Grad-CAM (separate):  {(base_time + gradcam_time) * 1000:8.1f} ms  (+{gradcam_time * 1000:.1f} ms)")
+    print(f"🚀 Heatmap stage speedup: {gradcam_time / max(cam_time - base_time, 1e-6):.1f}x")
+    print(f"🎯 Max pixel difference CAM vs Grad-CAM: {np.abs(cam_map - gradcam_map).max():.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CAM vs Grad-CAM heatmaps")
+    parser.add_argument("--task", default="acl", choices=["acl", "meniscus", "abnormal"])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--random-weights", action="store_true", help="Use untrained weights instead of models/*.pth")
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Heatmap Encoding Benchmark
+Compares encode time and bytes on the wire for each heatmap format, encoder
+and compression setting, including the base64-in-JSON overhead of the
+current /analyze response.
+
+Usage:
+    python benchmarks/bench_heatmap_encoding.py --iterations 20
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from pytorch_grad_cam.utils.image import show_cam_on_image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from heatmap_encoding import encode_heatmap  # noqa: E402
+
+CASES = [
+    ("png", 1), ("png", 3), ("png", 6), ("png", 9),
+    ("jpeg", 75), ("jpeg", 90),
+    ("webp", 75), ("webp", 90),
+]
+
+
+def make_overlay(seed=0):
+    """Synthetic knee-like phantom with a smooth CAM overlay (256x256 RGB)."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:256, 0:256].astype(np.float32)
+    phantom = np.exp(-((xx - 128) ** 2 + (yy - 140) ** 2) / (2 * 60 ** 2))
+    phantom += 0.5 * np.exp(-((xx - 100) ** 2 + (yy - 90) ** 2) / (2 * 25 ** 2))
+    phantom += 0.05 * rng.standard_normal((256, 256)).astype(np.float32)
+    phantom = np.clip(phantom / phantom.max(), 0, 1)
+
+    cam = rng.random((8, 8)).astype(np.float32)
+    cam = cv2.resize(cam, (256, 256))
+    cam = (cam - cam.min()) / (cam.max() - cam.min())
+    return show_cam_on_image(np.stack([phantom] * 3, axis=-1), cam, use_rgb=True)
+
+
+def main(args):
+    overlay = make_overlay()
+    print("=" * 78)
+    print("🖼️  HEATMAP ENCODING BENCHMARK")
+    print("=" * 78)
+    print(f"Image: {overlay.shape}, raw size: {overlay.nbytes} bytes, iterations: {args.iterations}\n")
+    print(f"{'encoder':8s} {'format':6s} {'level':>5s} {'encode ms':>10s} {'binary B':>10s} {'base64 B':>10s} {'json ms':>8s}")
+
+    for encoder in ("cv2", "pil"):
+        for fmt, level in CASES:
+            encode_heatmap(overlay, fmt, level, encoder)  # warm-up
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                data = encode_heatmap(overlay, fmt, level, encoder)
+            encode_ms = (time.perf_counter() - start) / args.iterations * 1000
+
+            b64 = base64.b64encode(data).decode("utf-8")
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                json.dumps({"heatmap": [b64]})
+            json_ms = (time.perf_counter() - start) / args.iterations * 1000
+
+            print(f"{encoder:8s} {fmt:6s} {level:5d} {encode_ms:10.2f} {len(data):10d} {len(b64):10d} {json_ms:8.2f}")
+
+    print("\n'binary B' is what GET /heatmap/{id}/image sends; 'base64 B' + 'json ms' is the")
+    print("inline /analyze cost (base64 PNG at PIL's default level 6 is the legacy setting).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark heatmap encoders and formats")
+    parser.add_argument("--iterations", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Load Benchmark
+Drives /analyze with synthetic studies served from a local HTTP stand-in for
+Supabase storage (no network needed), at fixed concurrency (closed loop) or
+at a fixed arrival rate (open loop, Poisson arrivals), and reports:
+
+- throughput and end-to-end latency p50/p95/p99 as seen by the client
+- latency p50/p95/p99 per analysis stage and per model forward, estimated
+  from the service's /metrics histograms (scraped before and after each run)
+- failed requests and the service's RSS after the run
+
+Workloads: 'slices' (3 slice URLs), 'volume' (one multi-frame volume, middle
+slices) and 'full-volume' (every slice of the volume). Studies are mock
+series built by dicom_related/create_mock_dicom.py, one distinct study
+per --studies; the service runs with its result and slice caches off unless
+--cache is given, so every request does the full work.
+
+Results are written as JSON (service config from /health, git commit,
+parameters, per-run numbers) so runs can be compared across commits and
+backends with --compare.
+
+Usage:
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --workloads slices volume --concurrency 1 4 8 --duration 30
+    python benchmarks/bench_load.py --rate 1 2 4 --duration 30
+    INFERENCE_BACKEND=onnx python benchmarks/bench_load.py --label onnx
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000   # an already running service
+    python benchmarks/bench_load.py --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_dicom_server import LocalDicomServer, make_dicom_slice, make_dicom_volume  # noqa: E402
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+WORKLOADS = ("slices", "volume", "full-volume")
+PERCENTILES = (50, 95, 99)
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# --- SYNTHETIC STUDIES ---
+def make_files(workloads, studies, frames, size):
+    """URL path -> DICOM bytes for every study of every workload."""
+    files = {}
+    if "slices" in workloads:
+        for i in range(studies):
+            for j in range(3):
+                files[f"/slices/{i}/slice_{j}.dcm"] = make_dicom_slice(size, size, seed=i * 3 + j)
+    if "volume" in workloads or "full-volume" in workloads:
+        for i in range(studies):
+            files[f"/volumes/{i}.dcm"] = make_dicom_volume(frames, size, size, seed=10_000 + i)
+    return files
+
+
+def make_payloads(workload, server, studies, defer_heatmap):
+    """One /analyze body per study."""
+    payloads = []
+    for i in range(studies):
+        if workload == "slices":
+            payload = {"dicomUrls": [server.url(f"/slices/{i}/slice_{j}.dcm") for j in range(3)]}
+        else:
+            payload = {"volumeUrl": server.url(f"/volumes/{i}.dcm")}
+            if workload == "full-volume":
+                payload["fullVolume"] = True
+        if defer_heatmap and workload != "full-volume":
+            payload["deferHeatmap"] = True
+        payloads.append(payload)
+    return payloads
+
+
+# --- METRICS ---
+def parse_histograms(text, names):
+    """
+    Histogram series from a Prometheus text scrape, keyed by (name, labels)
+    (without le/worker): {"buckets": {le: count}, "count": n, "sum": s}.
+    """
+    series = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match is None:
+            continue
+        sample, labels_text, value = match.groups()
+        name = next((n for n in names if sample in (f"{n}_bucket", f"{n}_count", f"{n}_sum")), None)
+        if name is None:
+            continue
+        labels = dict(_LABEL.findall(labels_text or ""))
+        le = labels.pop("le", None)
+        labels.pop("worker", None)
+        entry = series.setdefault((name, tuple(sorted(labels.items()))), {"buckets": {}, "count": 0.0, "sum": 0.0})
+        if sample.endswith("_bucket"):
+            entry["buckets"][float(le)] = float(value)
+        elif sample.endswith("_count"):
+            entry["count"] = float(value)
+        else:
+            entry["sum"] = float(value)
+    return series
+
+
+def parse_gauge(text, name):
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match is not None and match.group(1) == name:
+            return float(match.group(3))
+    return None
+
+
+def histogram_quantile(q, buckets):
+    """Same estimate as PromQL histogram_quantile: linear within the bucket holding the rank."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if total <= 0:
+        return None
+    rank = q * total
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return lower  # Beyond the largest finite bucket
+            return lower + (bound - lower) * ((rank - below) / (count - below) if count > below else 0)
+        lower, below = bound, count
+    return lower
+
+
+def histogram_delta(before, after):
+    """Per-series histogram of the observations made between two scrapes."""
+    delta = {}
+    for key, entry in after.items():
+        previous = before.get(key, {"buckets": {}, "count": 0.0, "sum": 0.0})
+        count = entry["count"] - previous["count"]
+        if count <= 0:
+            continue
+        delta[key] = {
+            "buckets": {le: n - previous["buckets"].get(le, 0.0) for le, n in entry["buckets"].items()},
+            "count": count,
+            "sum": entry["sum"] - previous["sum"],
+        }
+    return delta
+
+
+def summarize_histograms(delta, name, label):
+    """{label value: count, mean and percentiles in ms} for one histogram."""
+    summary = {}
+    for (series_name, labels), entry in sorted(delta.items()):
+        if series_name != name:
+            continue
+        labels = dict(labels)
+        key = labels[label] if label in labels else ",".join(labels.values())
+        if "backend" in labels and label != "backend":
+            key = f"{key} ({labels['backend']})"
+        row = {"count": int(entry["count"]), "mean_ms": round(entry["sum"] / entry["count"] * 1000, 2)}
+        for p in PERCENTILES:
+            value = histogram_quantile(p / 100, entry["buckets"])
+            row[f"p{p}_ms"] = round(value * 1000, 2) if value is not None else None
+        summary[key] = row
+    return summary
+
+
+# --- LOAD GENERATION ---
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def send(client, base, payload, records):
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"{base}/analyze", json=payload)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    records.append((started, time.perf_counter() - started, status))
+
+
+async def closed_loop(client, base, payloads, concurrency, duration, records):
+    """concurrency clients, each sending its next request as soon as the last one returns."""
+    deadline = time.perf_counter() + duration
+    counter = itertools.count()
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            await send(client, base, payloads[next(counter) % len(payloads)], records)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+
+async def open_loop(client, base, payloads, rate, duration, max_outstanding, records, rng):
+    """Poisson arrivals at rate req/s whatever the latency; arrivals over max_outstanding are dropped."""
+    started = time.perf_counter()
+    tasks, dropped, i = set(), 0, 0
+    next_arrival = started
+    while next_arrival < started + duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if len(tasks) >= max_outstanding:
+            dropped += 1
+        else:
+            task = asyncio.create_task(send(client, base, payloads[i % len(payloads)], records))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            i += 1
+        next_arrival += rng.expovariate(rate)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return dropped
+
+
+async def run_load(base, payloads, mode, level, args):
+    """One load point: warm-up requests, metrics scrape, load, metrics scrape."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for payload in payloads[:args.warmup_requests]:
+            (await client.post(f"{base}/analyze", json=payload)).raise_for_status()
+        before = (await client.get(f"{base}/metrics")).text
+
+        records, dropped = [], 0
+        started = time.perf_counter()
+        if mode == "closed":
+            await closed_loop(client, base, payloads, level, args.duration, records)
+        else:
+            dropped = await open_loop(client, base, payloads, level, args.duration, args.max_outstanding,
+                                      records, random.Random(args.seed))
+        elapsed = time.perf_counter() - started
+        after = (await client.get(f"{base}/metrics")).text
+
+    ok = [latency * 1000 for _, latency, status in records if status == 200]
+    errors = {}
+    for _, _, status in records:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    names = ("cdss_stage_duration_seconds", "cdss_model_forward_seconds")
+    delta = histogram_delta(parse_histograms(before, names), parse_histograms(after, names))
+    rss = parse_gauge(after, "cdss_process_resident_memory_bytes")
+    return {
+        "mode": mode,
+        "concurrency" if mode == "closed" else "rate_rps": level,
+        "duration_s": round(elapsed, 2),
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": errors,
+        "dropped": dropped,
+        "throughput_rps": round(len(ok) / elapsed, 3),
+        "latency_ms": {
+            "mean": round(sum(ok) / len(ok), 2) if ok else None,
+            **{f"p{p}": round(percentile(ok, p), 2) if ok else None for p in PERCENTILES},
+            "max": round(max(ok), 2) if ok else None,
+        },
+        "stages": summarize_histograms(delta, "cdss_stage_duration_seconds", "stage"),
+        "model_forwards": summarize_histograms(delta, "cdss_model_forward_seconds", "model"),
+        "service_rss_mb": round(rss / 1e6, 1) if rss is not None else None,
+    }
+
+
+# --- SERVICE ---
+def start_service(args):
+    env = {**os.environ}
+    if not args.cache:
+        env.update({"RESULT_CACHE_MAX_MB": "0", "SLICE_CACHE_MAX_MB": "0"})
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base, timeout):
+    deadline = time.perf_counter() + timeout
+    with httpx.Client(timeout=10) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if client.get(f"{base}/ready").status_code == 200:
+                    return client.get(f"{base}/health").json()
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+    raise TimeoutError("Service did not become ready")
+
+
+def service_config(health):
+    """The parts of /health that make runs comparable."""
+    return {
+        "device": health.get("device"),
+        "inference_backend": (health.get("inference_backend") or {}).get("name"),
+        "cpu_precision": (health.get("cpu_precision") or {}).get("mode"),
+        "micro_batching": health.get("inference_scheduler") is not None,
+        "slice_cache": health.get("slice_cache") is not None,
+        "result_cache": health.get("result_cache") is not None,
+        "intra_op_threads": (health.get("worker") or {}).get("intra_op_threads"),
+        "workers": (health.get("worker") or {}).get("workers"),
+        "model_versions": health.get("model_versions"),
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SERVICE_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+# --- REPORTING ---
+def print_run(workload, run):
+    level = f"c={run['concurrency']}" if run["mode"] == "closed" else f"{run['rate_rps']}/s"
+    latency = run["latency_ms"]
+    failed = sum(run["errors"].values())
+    print(f"{workload:12s} {level:>7s} {run['ok']:6d} {failed:5d} {run['dropped']:5d} {run['throughput_rps']:8.2f} "
+          + " ".join(f"{latency[f'p{p}'] or float('nan'):9.0f}" for p in PERCENTILES))
+
+
+def print_stages(run):
+    rows = [("stage", name, row) for name, row in run["stages"].items()]
+    rows += [("forward", name, row) for name, row in run["model_forwards"].items()]
+    for kind, name, row in rows:
+        print(f"    {kind:7s} {name:22s} {row['count']:6d} {row['mean_ms']:9.1f} "
+              + " ".join(f"{row[f'p{p}_ms'] if row[f'p{p}_ms'] is not None else float('nan'):9.1f}" for p in PERCENTILES))
+
+
+def compare(paths):
+    """Side-by-side throughput and latency of saved runs; deltas are against the first file."""
+    results = [json.loads(Path(path).read_text()) for path in paths]
+    print("=" * 100)
+    print("📊 LOAD BENCHMARK COMPARISON (deltas vs the first file)")
+    print("=" * 100)
+    for index, (path, result) in enumerate(zip(paths, results)):
+        service = result["service"]
+        print(f"[{index}] {Path(path).name}: {result.get('label') or '-'}, commit {result.get('git_commit')}"
+              f"{' (dirty)' if result.get('git_dirty') else ''}, {service.get('inference_backend')}/"
+              f"{service.get('cpu_precision')} on {service.get('device')}")
+
+    def key(run):
+        return run["workload"], run["mode"], run.get("concurrency", run.get("rate_rps"))
+
+    baseline = {key(run): run for run in results[0]["runs"]}
+    print(f"\n{'#':2s} {'workload':12s} {'load':>7s} {'rps':>8s} {'Δ':>7s} {'p50 ms':>9s} {'Δ':>7s} "
+          f"{'p95 ms':>9s} {'Δ':>7s} {'p99 ms':>9s} {'Δ':>7s}")
+    for index, result in enumerate(results):
+        for run in result["runs"]:
+            base = baseline.get(key(run)) if index > 0 else None
+            level = f"c={run['concurrency']}" if run["mode"] == "closed" else f"{run['rate_rps']}/s"
+            cells = [f"{run['throughput_rps']:8.2f} {change(run['throughput_rps'], base and base['throughput_rps'])}"]
+            for p in PERCENTILES:
+                value = run["latency_ms"][f"p{p}"]
+                cells.append(f"{value or float('nan'):9.0f} {change(value, base and base['latency_ms'][f'p{p}'])}")
+            print(f"{index:<2d} {run['workload']:12s} {level:>7s} " + " ".join(cells))
+
+    print("\nStage p95 (ms):")
+    stages = sorted({name for result in results for run in result["runs"] for name in run["stages"]})
+    for run_key in baseline:
+        print(f"  {run_key[0]} {run_key[1]} {run_key[2]}")
+        for name in stages:
+            values = []
+            for result in results:
+                run = next((r for r in result["runs"] if key(r) == run_key), None)
+                row = run["stages"].get(name) if run else None
+                values.append(row["p95_ms"] if row and row["p95_ms"] is not None else None)
+            if any(value is not None for value in values):
+                print(f"    {name:18s} " + " ".join(f"{value:9.1f}" if value is not None else f"{'-':>9s}" for value in values))
+
+
+def change(value, base):
+    if value is None or not base:
+        return f"{'':>7s}"
+    return f"{(value - base) / base * 100:+6.0f}%"
+
+
+def main(args):
+    if args.compare:
+        compare(args.compare)
+        return
+
+    files = make_files(args.workloads, args.studies, args.frames, args.size)
+    load_points = [("closed", c) for c in args.concurrency] if not args.rate else [("open", r) for r in args.rate]
+    commit, dirty = git_revision()
+
+    print("=" * 100)
+    print("🚦 LOAD BENCHMARK")
+    print("=" * 100)
+    print(f"{args.studies} synthetic studies per workload ({args.size}x{args.size}, volumes of {args.frames} frames), "
+          f"{args.duration:.0f}s per load point, caches {'on' if args.cache else 'off'}")
+
+    process = None
+    base = args.url or f"http://127.0.0.1:{args.port}"
+    try:
+        if args.url is None:
+            process = start_service(args)
+        health = wait_ready(base, args.startup_timeout)
+        service = service_config(health)
+        print(f"Service: {service['inference_backend']}/{service['cpu_precision']} on {service['device']}, "
+              f"micro-batching {'on' if service['micro_batching'] else 'off'}, {service['workers']} worker(s)\n")
+        print(f"{'workload':12s} {'load':>7s} {'ok':>6s} {'fail':>5s} {'drop':>5s} {'rps':>8s} "
+              + " ".join(f"{f'p{p} ms':>9s}" for p in PERCENTILES))
+
+        runs = []
+        with LocalDicomServer(files, latency=args.storage_latency) as server:
+            for workload in args.workloads:
+                payloads = make_payloads(workload, server, args.studies, args.defer_heatmap)
+                for mode, level in load_points:
+                    run = asyncio.run(run_load(base, payloads, mode, level, args))
+                    run["workload"] = workload
+                    runs.append(run)
+                    print_run(workload, run)
+                    if args.stages:
+                        print_stages(run)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    result = {
+        "benchmark": "load",
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "git_dirty": dirty,
+        "service": service,
+        "parameters": {
+            "workloads": args.workloads, "studies": args.studies, "frames": args.frames, "size": args.size,
+            "duration_s": args.duration, "warmup_requests": args.warmup_requests, "cache": args.cache,
+            "defer_heatmap": args.defer_heatmap, "storage_latency_s": args.storage_latency,
+            "max_outstanding": args.max_outstanding, "url": args.url,
+        },
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"load-{args.label or service['inference_backend']}-{commit or 'nogit'}-"
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print("\nStage and forward percentiles are estimated from /metrics histogram buckets (--stages to print them).")
+    print(f"💾 Results: {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive /analyze with synthetic load and record throughput and latency")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=["slices", "volume"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4], help="Closed-loop client counts")
+    parser.add_argument("--rate", nargs="+", type=float, help="Open-loop arrival rates (req/s) instead of --concurrency")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per load point")
+    parser.add_argument("--studies", type=int, default=16, help="Distinct synthetic studies per workload")
+    parser.add_argument("--frames", type=int, default=32, help="Frames per synthetic volume")
+    parser.add_argument("--size", type=int, default=256, help="Rows/columns of the synthetic slices")
+    parser.add_argument("--warmup-requests", type=int, default=2, help="Unmeasured requests before each load point")
+    parser.add_argument("--max-outstanding", type=int, default=64, help="Open loop: arrivals over this are dropped")
+    parser.add_argument("--storage-latency", type=float, default=0.0, help="Seconds the storage stand-in waits per file")
+    parser.add_argument("--defer-heatmap", action="store_true", help="Send deferHeatmap=true")
+    parser.add_argument("--cache", action="store_true", help="Keep the service's result and slice caches on")
+    parser.add_argument("--stages", action="store_true", help="Print per-stage and per-forward percentiles")
+    parser.add_argument("--seed", type=int, default=0, help="Open-loop arrival seed")
+    parser.add_argument("--label", help="Name of this run in the results (default: the inference backend)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/load-<label>-<commit>-<time>.json)")
+    parser.add_argument("--url", help="Benchmark a running service instead of starting uvicorn main:app")
+    parser.add_argument("--port", type=int, default=5079)
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout (s)")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS_JSON", help="Compare saved results instead of running")
+    main(parser.parse_args())
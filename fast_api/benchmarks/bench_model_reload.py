@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Model Reload Benchmark
+Starts the service (uvicorn main:app), keeps a closed loop of /analyze
+requests running against it, then hot-reloads the abnormal model to a new
+checkpoint (a perturbed copy written under models/bench_reload/) and (with
+MODEL_KEEP_PREVIOUS=1) rolls it back. Reports:
+
+- reload latency and its phases (load_weights, fuse, backend, warmup) as
+  measured by the service (POST /models/reload report)
+- memory overlap: RSS before the reload, with both versions resident, and
+  after the swap (MODEL_KEEP_PREVIOUS=0 frees the old set, =1 keeps it)
+- request latency p50/p95 before, during and after the reload, failed
+  requests (should be 0) and the model versions seen in responses
+
+Usage:
+    python benchmarks/bench_model_reload.py
+    python benchmarks/bench_model_reload.py --configs keep-previous --concurrency 8
+"""
+
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_dicom_server import LocalDicomServer, make_dicom_slice  # noqa: E402
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+NEW_CHECKPOINT = "models/bench_reload/abnormal_model.pth"
+
+CONFIGS = {
+    "keep-previous": {"MODEL_KEEP_PREVIOUS": "1"},
+    "drop-previous": {"MODEL_KEEP_PREVIOUS": "0"},
+}
+
+
+def write_new_version(source: Path, target: Path) -> None:
+    """A 'retrained' checkpoint: the same weights with a little noise."""
+    state_dict = torch.load(source, map_location="cpu", weights_only=True)
+    generator = torch.Generator().manual_seed(0)
+    state_dict = {
+        key: value + 0.01 * torch.randn(value.shape, generator=generator) if value.is_floating_point() else value
+        for key, value in state_dict.items()
+    }
+    target.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(state_dict, target)
+
+
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class LoadLoop:
+    """Closed-loop /analyze traffic; records (start, latency, status, abnormal version)."""
+
+    def __init__(self, base, urls, concurrency):
+        self.base, self.urls = base, urls
+        self.records = []
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(concurrency)]
+
+    def _run(self):
+        with httpx.Client(timeout=120) as client:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                try:
+                    response = client.post(f"{self.base}/analyze", json={"dicomUrls": self.urls})
+                    status = response.status_code
+                    version = response.json()["metadata"]["model_versions"]["abnormal"] if status == 200 else None
+                except httpx.HTTPError:
+                    status, version = None, None
+                self.records.append((started, time.perf_counter() - started, status, version))
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def latency_row(records, start, end):
+    latencies = [latency * 1000 for started, latency, _, _ in records if start <= started < end]
+    return len(latencies), percentile(latencies, 50), percentile(latencies, 95)
+
+
+def measure(config, args, urls):
+    admin_token = secrets.token_hex(16)
+    env = {**os.environ, **CONFIGS[config], "RESULT_CACHE_MAX_MB": "0", "SLICE_CACHE_MAX_MB": "0",
+           "MODEL_ADMIN_TOKEN": admin_token}
+    base = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=args.timeout, headers={"X-Admin-Token": admin_token}) as client:
+            deadline = time.perf_counter() + args.timeout
+            while True:
+                try:
+                    if client.get(f"{base}/ready").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("Service did not become ready")
+                time.sleep(0.2)
+
+            with LoadLoop(base, urls, args.concurrency) as load:
+                time.sleep(args.phase_seconds)
+                reload_start = time.perf_counter()
+                reload = client.post(f"{base}/models/reload", json={
+                    "models": {"abnormal": {"path": NEW_CHECKPOINT, "version": "bench-v2"}}
+                }).raise_for_status().json()
+                reload_end = time.perf_counter()
+                time.sleep(args.phase_seconds)
+                rollback = None
+                if CONFIGS[config]["MODEL_KEEP_PREVIOUS"] == "1":
+                    rollback = client.post(f"{base}/models/rollback").raise_for_status().json()
+                    time.sleep(args.phase_seconds / 2)
+            records = load.records
+    finally:
+        process.terminate()
+        process.wait()
+
+    report = reload["report"]
+    first = min(started for started, *_ in records)
+    last = max(started for started, *_ in records)
+    return {
+        "report": report,
+        "rollback_ms": rollback["report"]["total_ms"] if rollback else None,
+        "before": latency_row(records, first, reload_start),
+        "during": latency_row(records, reload_start, reload_end),
+        "after": latency_row(records, reload_end, last + 1),
+        "failed": sum(1 for *_, status, _ in records if status != 200),
+        "versions": sorted({version for *_, version in records if version}),
+    }
+
+
+def main(args):
+    target = SERVICE_DIR / NEW_CHECKPOINT
+    write_new_version(SERVICE_DIR / "models/abnormal_model.pth", target)
+    files = {f"/slice_{i}.dcm": make_dicom_slice(seed=i) for i in range(3)}
+    print("=" * 78)
+    print("🔄 MODEL RELOAD BENCHMARK")
+    print("=" * 78)
+    print(f"{args.concurrency} concurrent /analyze clients, abnormal model reloaded to {NEW_CHECKPOINT}\n")
+    try:
+        with LocalDicomServer(files) as server:
+            urls = [server.url(path) for path in files]
+            for config in args.configs:
+                result = measure(config, args, urls)
+                report = result["report"]
+                memory = report["memory_mb"]
+                phases = ", ".join(f"{name} {ms:.0f}" for name, ms in report["phases_ms"].items())
+                print(f"[{config}]")
+                print(f"  reload: {report['total_ms']:.0f} ms ({phases}); reused: {', '.join(report['reused'])}")
+                if result["rollback_ms"] is not None:
+                    print(f"  rollback: {result['rollback_ms']:.1f} ms")
+                print(f"  RSS MB: before {memory.get('rss_before')}, both resident {memory.get('rss_peak')} "
+                      f"(overlap {memory.get('overlap')}), after swap {memory.get('rss_after')}")
+                for name in ("before", "during", "after"):
+                    count, p50, p95 = result[name]
+                    print(f"  requests {name:6s}: {count:4d}  p50 {p50:7.0f} ms  p95 {p95:7.0f} ms")
+                print(f"  failed requests: {result['failed']}; abnormal versions served: {', '.join(result['versions'])}\n")
+    finally:
+        target.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure hot model reload latency, memory overlap and request impact")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--phase-seconds", type=float, default=5.0, help="Traffic before the reload and after it")
+    parser.add_argument("--port", type=int, default=5078)
+    parser.add_argument("--timeout", type=float, default=300)
+    main(parser.parse_args())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Starts the service in a fresh process (uvicorn main:app) for each startup
+configuration and measures, from process launch:
+
+- time-to-up: first successful GET /health (the server accepts requests)
+- time-to-models: models loaded (reported in /health, from process start)
+- time-to-ready: GET /ready returns 200 (models loaded and warm-up finished)
+- time-to-first-prediction: first POST /analyze answered (3 local DICOM slices),
+  sent once /ready is 200
+- latency of that first /analyze and of the second one: without warm-up the
+  first request is the outlier
+
+It also prints the startup phase breakdown the service reports in /health.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 3 --configs no-warmup default
+    HEATMAP_METHOD=gradcam python benchmarks/bench_startup.py --configs no-warmup default
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_dicom_server import LocalDicomServer, make_dicom_slice  # noqa: E402
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+CONFIGS = {
+    "no-mmap": {"MMAP_WEIGHTS": "0", "LAZY_STARTUP": "0", "WARMUP": "1"},
+    "no-warmup": {"MMAP_WEIGHTS": "1", "LAZY_STARTUP": "0", "WARMUP": "0"},
+    "default": {"MMAP_WEIGHTS": "1", "LAZY_STARTUP": "0", "WARMUP": "1"},
+    "lazy": {"MMAP_WEIGHTS": "1", "LAZY_STARTUP": "1", "WARMUP": "1"},
+}
+
+
+def wait_for(predicate, deadline, interval=0.02):
+    while time.perf_counter() < deadline:
+        try:
+            result = predicate()
+            if result is not None:
+                return result
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    raise TimeoutError("Service did not come up in time")
+
+
+def measure(config, port, urls, timeout):
+    env = {**os.environ, **CONFIGS[config], "INFERENCE_BATCHING": "0", "RESULT_CACHE_MAX_MB": "0"}
+    base = f"http://127.0.0.1:{port}"
+    launched = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = launched + timeout
+        with httpx.Client(timeout=timeout) as client:
+            wait_for(lambda: client.get(f"{base}/health").raise_for_status(), deadline)
+            up = time.perf_counter() - launched
+            wait_for(lambda: client.get(f"{base}/ready").raise_for_status(), deadline)
+            ready = time.perf_counter() - launched
+            latencies = []
+            for _ in range(2):
+                started = time.perf_counter()
+                client.post(f"{base}/analyze", json={"dicomUrls": urls}).raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                if len(latencies) == 1:
+                    first_prediction = time.perf_counter() - launched
+            health = client.get(f"{base}/health").json()
+    finally:
+        process.terminate()
+        process.wait()
+    startup = health["startup"]
+    return {
+        "up": up,
+        "models": startup["milestones_s"].get("models_ready"),
+        "ready": ready,
+        "first_prediction": first_prediction,
+        "first_ms": latencies[0] * 1000,
+        "second_ms": latencies[1] * 1000,
+        "phases": startup["phases_ms"],
+    }
+
+
+def main(args):
+    files = {f"/slice_{i}.dcm": make_dicom_slice(seed=i) for i in range(3)}
+    print("=" * 78)
+    print("⏱️  STARTUP BENCHMARK")
+    print("=" * 78)
+    print("Seconds from process launch; 'models' is from process start, as reported in /health.\n")
+    print(f"{'config':10s} {'up s':>6s} {'models s':>9s} {'ready s':>8s} {'1st pred s':>11s} "
+          f"{'1st req ms':>11s} {'2nd req ms':>11s}   phases (ms)")
+    with LocalDicomServer(files) as server:
+        urls = [server.url(path) for path in files]
+        for config in args.configs:
+            runs = [measure(config, args.port, urls, args.timeout) for _ in range(args.runs)]
+            median = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key != "phases"}
+            phases = ", ".join(f"{name} {ms:.0f}" for name, ms in runs[-1]["phases"].items())
+            print(f"{config:10s} {median['up']:6.2f} {median['models']:9.2f} {median['ready']:8.2f} "
+                  f"{median['first_prediction']:11.2f} {median['first_ms']:11.0f} {median['second_ms']:11.0f}   {phases}")
+    print("\n'up' is when /health first answers, 'ready' when /ready does (after warm-up). With")
+    print("LAZY_STARTUP=1 the server is up before the models are loaded.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure service time-to-ready and time-to-first-prediction")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--runs", type=int, default=1, help="Runs per configuration (median reported)")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--timeout", type=float, default=300)
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Full-Volume Inference Benchmark
+Runs synthetic multi-frame volumes of increasing length through the chunked
+full-volume path (volume_inference.py) and reports slices/second and peak
+process memory. Chunked runs go first: their peak RSS should stay flat as the
+series grows, while a single unchunked pass (chunk size = series length)
+grows with it.
+
+Usage:
+    python benchmarks/bench_volume_inference.py --frames 16 32 64 --chunk-size 8
+    python benchmarks/bench_volume_inference.py --pooling mean
+"""
+
+import argparse
+import resource
+import sys
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_fused_inference import load_models  # noqa: E402
+from fused_inference import FusedMRNet  # noqa: E402
+from local_dicom_server import make_dicom_volume  # noqa: E402
+from preprocessing import open_volume  # noqa: E402
+from volume_inference import run_volume  # noqa: E402
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def main(args):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    fused = FusedMRNet(load_models(args.random_weights, device)).to(device).eval()
+
+    def predict_logits(windows):
+        with torch.no_grad():
+            return fused(windows)
+
+    volumes = {n: make_dicom_volume(n, args.size, args.size, seed=n) for n in args.frames}
+
+    print("=" * 78)
+    print("🧊 FULL-VOLUME INFERENCE BENCHMARK")
+    print("=" * 78)
+    print(f"Device: {device}, threads: {torch.get_num_threads()}, slice size: {args.size}x{args.size}, "
+          f"pooling: {args.pooling}")
+    # Warm-up so one-time allocations do not count against the first run
+    run_volume(open_volume(volumes[args.frames[0]]), predict_logits, fused.tasks,
+               chunk_size=args.chunk_size, pooling=args.pooling, device=device)
+    print(f"Baseline peak RSS after warm-up: {peak_rss_mb():.0f} MB\n")
+    print(f"{'frames':>6s} {'chunk':>6s} {'chunks':>6s} {'slices/s':>9s} {'decode ms':>10s} "
+          f"{'infer ms':>9s} {'total ms':>9s} {'peak RSS MB':>12s}")
+
+    runs = [(n, args.chunk_size) for n in args.frames]
+    if not args.skip_unchunked:
+        runs += [(n, n) for n in args.frames]
+    for n, chunk_size in runs:
+        result = run_volume(open_volume(volumes[n]), predict_logits, fused.tasks,
+                            chunk_size=chunk_size, pooling=args.pooling, device=device)
+        print(f"{n:6d} {chunk_size:6d} {result.num_chunks:6d} {result.slices_per_second:9.2f} "
+              f"{result.decode_seconds * 1000:10.1f} {result.inference_seconds * 1000:9.1f} "
+              f"{result.total_seconds * 1000:9.1f} {peak_rss_mb():12.0f}")
+
+    print("\nPeak RSS is a high-water mark: with chunking it should not rise with the number")
+    print("of frames. 'decode ms' overlaps 'infer ms' (the next chunk decodes during inference).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chunked full-volume inference")
+    parser.add_argument("--frames", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--chunk-size", type=int, default=8)
+    parser.add_argument("--size", type=int, default=256, help="Slice height/width")
+    parser.add_argument("--pooling", choices=["max", "mean"], default="max")
+    parser.add_argument("--skip-unchunked", action="store_true", help="Only run the chunked passes")
+    parser.add_argument("--random-weights", action="store_true", help="Skip loading checkpoints")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Preprocessing Compatibility Check
+Verifies that the batched preprocessing (preprocessing.py) produces exactly
+the same model tensors and visual images as the original per-slice
+process_dicom, then times both for a 3-slice request.
+
+Usage:
+    python benchmarks/check_preprocessing.py --iterations 50
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pydicom
+import torch
+from torchvision import transforms
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_dicom_server import make_dicom_slice  # noqa: E402
+from preprocessing import preprocess_slices  # noqa: E402
+
+
+def legacy_process_dicom(file_bytes):
+    """Reference copy of the original per-slice process_dicom (CPU)."""
+    ds = pydicom.dcmread(io.BytesIO(file_bytes))
+    pixel_array = ds.pixel_array
+    if len(pixel_array.shape) != 2:
+        raise ValueError(f"Expected 2D DICOM slice, got shape: {pixel_array.shape}")
+
+    # --- PATH A: FOR AI MODEL (High Precision) ---
+    slice_data = pixel_array.astype(np.float32)
+    tensor = torch.from_numpy(slice_data).float()
+    min_val = tensor.min()
+    max_val = tensor.max()
+    if max_val - min_val > 0:
+        tensor = (tensor - min_val) / (max_val - min_val)
+    else:
+        tensor = torch.zeros_like(tensor)
+    tensor = tensor.unsqueeze(0)
+    tensor = transforms.Resize((256, 256), antialias=True)(tensor)
+    input_tensor = tensor.unsqueeze(0)
+
+    # --- PATH B: FOR HEATMAP (Visual only) ---
+    visual_img_array = pixel_array.astype(np.float32)
+    min_v = visual_img_array.min()
+    max_v = visual_img_array.max()
+    if max_v - min_v > 0:
+        visual_img_array = (visual_img_array - min_v) / (max_v - min_v)
+    else:
+        visual_img_array = np.zeros_like(visual_img_array)
+    visual_img_array = np.uint8(visual_img_array * 255.0)
+    return input_tensor, visual_img_array
+
+
+def constant_slice(height, width, value):
+    ds = pydicom.dcmread(io.BytesIO(make_dicom_slice(height, width, seed=0)))
+    ds.PixelData = np.full((height, width), value, dtype=np.uint16).tobytes()
+    buff = io.BytesIO()
+    ds.save_as(buff)
+    return buff.getvalue()
+
+
+def check(name, slices):
+    tensor, visuals = preprocess_slices(slices)
+    for i, file_bytes in enumerate(slices):
+        ref_tensor, ref_visual = legacy_process_dicom(file_bytes)
+        if not torch.equal(tensor[i], ref_tensor[0, 0]):
+            delta = (tensor[i] - ref_tensor[0, 0]).abs().max().item()
+            raise SystemExit(f"❌ {name}: tensor mismatch on slice {i} (max delta {delta:.3e})")
+        if not np.array_equal(visuals[i], ref_visual):
+            raise SystemExit(f"❌ {name}: visual image mismatch on slice {i}")
+    print(f"✅ {name}: {len(slices)} slice(s) bit-identical")
+
+
+def bench(slices, iterations):
+    for fn_name, fn in (
+        ("legacy per-slice", lambda: torch.cat([legacy_process_dicom(s)[0] for s in slices], dim=1)),
+        ("batched", lambda: preprocess_slices(slices)[0].unsqueeze(0)),
+    ):
+        fn()  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        ms = (time.perf_counter() - start) / iterations * 1000
+        print(f"   {fn_name:18s} {ms:8.2f} ms / request")
+
+
+def main(args):
+    print("=" * 70)
+    print("🔬 PREPROCESSING COMPATIBILITY CHECK")
+    print("=" * 70)
+    check("256x256 study", [make_dicom_slice(256, 256, seed=i) for i in range(3)])
+    check("512x512 study", [make_dicom_slice(512, 512, seed=i) for i in range(3)])
+    check("non-square study", [make_dicom_slice(320, 288, seed=i) for i in range(3)])
+    check("mixed shapes", [make_dicom_slice(256, 256, seed=1), make_dicom_slice(384, 384, seed=2),
+                           make_dicom_slice(256, 256, seed=3)])
+    check("constant slice", [make_dicom_slice(256, 256, seed=1), constant_slice(256, 256, 700),
+                             constant_slice(256, 256, 0)])
+    check("repeat call (reused buffers)", [make_dicom_slice(256, 256, seed=i + 10) for i in range(3)])
+
+    for size in (256, 512):
+        slices = [make_dicom_slice(size, size, seed=i) for i in range(3)]
+        print(f"\n⏱️  3 x {size}x{size} slices, {args.iterations} iterations")
+        bench(slices, args.iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark batched DICOM preprocessing")
+    parser.add_argument("--iterations", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Event Loop Responsiveness Check
+Starts the service (or targets --url), saturates /analyze with synthetic
+studies (closed loop, caches off, inline heatmaps) and meanwhile probes
+GET /health at a fixed interval. The probe latency under load is compared
+with the idle probe latency; the check fails (exit code 1) when the loaded
+p95 exceeds --max-probe-ms, i.e. when CPU-bound analysis work holds up the
+event loop instead of running on the CPU executor.
+
+Usage:
+    python benchmarks/check_responsiveness.py
+    python benchmarks/check_responsiveness.py --concurrency 8 --duration 30 --max-probe-ms 100
+    INFERENCE_BATCHING=0 HEATMAP_METHOD=gradcam python benchmarks/check_responsiveness.py
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from bench_load import make_files, make_payloads, percentile, start_service, wait_ready
+from local_dicom_server import LocalDicomServer
+
+
+async def probe(client, base, interval, stop, latencies):
+    """GET /health every interval seconds until stop is set."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        (await client.get(f"{base}/health")).raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def saturate(client, base, payloads, concurrency, stop, counts):
+    """concurrency clients sending /analyze back to back until stop is set."""
+    async def client_loop(offset):
+        i = offset
+        while not stop.is_set():
+            response = await client.post(f"{base}/analyze", json=payloads[i % len(payloads)])
+            counts[response.status_code] = counts.get(response.status_code, 0) + 1
+            i += concurrency
+
+    await asyncio.gather(*(client_loop(offset) for offset in range(concurrency)))
+
+
+async def measure(base, payloads, args, load):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        stop, latencies, counts = asyncio.Event(), [], {}
+        tasks = [asyncio.create_task(probe(client, base, args.probe_interval, stop, latencies))]
+        if load:
+            tasks.append(asyncio.create_task(saturate(client, base, payloads, args.concurrency, stop, counts)))
+            await asyncio.sleep(1.0)  # Let the load ramp up before sampling
+            latencies.clear()
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies, counts, time.perf_counter() - started
+
+
+def summary(latencies):
+    return "  ".join(f"p{q} {percentile(latencies, q):7.1f}" for q in (50, 95, 99)) + f"  max {max(latencies):7.1f} ms"
+
+
+def main(args):
+    files = make_files(["slices"], args.studies, frames=32, size=args.size)
+    process = None
+    base = args.url
+    if base is None:
+        process = start_service(args)
+        base = f"http://127.0.0.1:{args.port}"
+    try:
+        health = wait_ready(base, args.startup_timeout)
+        print(f"Service: {health['device']}, batching "
+              f"{'on' if health.get('inference_scheduler') else 'off'}, "
+              f"CPU executor {health.get('cpu_executor', {}).get('max_workers', '-')} thread(s)")
+        with LocalDicomServer(files) as server:
+            payloads = make_payloads("slices", server, args.studies, defer_heatmap=False)
+            idle, _, _ = asyncio.run(measure(base, payloads, args, load=False))
+            loaded, counts, elapsed = asyncio.run(measure(base, payloads, args, load=True))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    analyzed = counts.get(200, 0)
+    print(f"/health idle:                {summary(idle)}  ({len(idle)} probes)")
+    print(f"/health, {args.concurrency} /analyze clients: {summary(loaded)}  ({len(loaded)} probes)")
+    print(f"/analyze under load: {analyzed} ok ({analyzed / elapsed:.2f} req/s), other statuses: "
+          f"{ {status: n for status, n in counts.items() if status != 200} or 'none'}")
+    p95 = percentile(loaded, 95)
+    if p95 > args.max_probe_ms:
+        print(f"❌ /health p95 under load {p95:.1f} ms > {args.max_probe_ms} ms: the event loop is blocked")
+        return 1
+    print(f"✅ /health p95 under load {p95:.1f} ms <= {args.max_probe_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that /health stays responsive while /analyze saturates the CPU")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent /analyze clients")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds measured, idle and under load")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="Seconds between /health probes")
+    parser.add_argument("--max-probe-ms", type=float, default=100.0, help="Fail above this /health p95 under load")
+    parser.add_argument("--studies", type=int, default=16, help="Distinct synthetic studies")
+    parser.add_argument("--size", type=int, default=256, help="Rows/columns of the synthetic slices")
+    parser.add_argument("--cache", action="store_true", help="Keep the service's result and slice caches on")
+    parser.add_argument("--url", help="Check a running service instead of starting uvicorn main:app")
+    parser.add_argument("--port", type=int, default=5079)
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout (s)")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-in for Supabase storage.
+Serves in-memory DICOM files with configurable latency and injected failures,
+so the AI service can be exercised and benchmarked without the network.
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dicom_related.create_mock_dicom import mock_dicom_bytes  # noqa: E402
+
+
+def make_dicom_slice(height=256, width=256, seed=None):
+    """Create a synthetic 2D DICOM slice and return its file bytes."""
+    return mock_dicom_bytes(np.random.default_rng(seed).integers(0, 4096, (height, width), dtype=np.uint16))
+
+
+def make_dicom_volume(num_frames=32, height=256, width=256, seed=None):
+    """Create a synthetic multi-frame DICOM volume and return its file bytes."""
+    rng = np.random.default_rng(seed)
+    return mock_dicom_bytes(rng.integers(0, 4096, (num_frames, height, width), dtype=np.uint16))
+
+
+class LocalDicomServer:
+    """
+    Threaded HTTP server serving files from a dict of path -> bytes.
+
+    Args:
+        files: Mapping of URL path (e.g. "/slice_1.dcm") to file bytes
+        latency: Seconds to sleep before answering each request
+        fail_first: Number of 503 responses to return per path before succeeding
+
+    Usage:
+        with LocalDicomServer({"/a.dcm": data}, latency=0.05) as server:
+            url = server.url("/a.dcm")
+    """
+
+    def __init__(self, files, latency=0.0, fail_first=0):
+        self.files = dict(files)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.request_count = 0
+        self.connection_count = 0
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connection_count += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                    failures = server._failures.get(self.path, 0)
+                    should_fail = failures < server.fail_first
+                    if should_fail:
+                        server._failures[self.path] = failures + 1
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                body = server.files.get(self.path)
+                if should_fail or body is None:
+                    status = 503 if should_fail else 404
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/dicom")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", f'"{hashlib.sha1(body).hexdigest()}"')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def url(self, path):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve synthetic DICOM slices locally")
+    parser.add_argument("--slices", type=int, default=3, help="Number of slices to serve")
+    parser.add_argument("--latency", type=float, default=0.0, help="Per-request latency in seconds")
+    args = parser.parse_args()
+
+    files = {f"/slice_{i + 1}.dcm": make_dicom_slice(seed=i) for i in range(args.slices)}
+    with LocalDicomServer(files, latency=args.latency) as server:
+        print("🚀 Serving synthetic DICOM slices:")
+        for path in files:
+            print(f"   {server.url(path)}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n👋 Stopped")
@@ -0,0 +1,202 @@
+"""
+In-Process Caches
+Memory-bounded LRU caches used to skip repeated work for identical DICOM
+content (clinician re-runs, Express retries).
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest of raw file bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _nbytes(value: Any) -> int:
+    """Approximate memory footprint of a cached value."""
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return 64
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by total memory, with optional expiry.
+
+    Args:
+        max_bytes: Memory budget; least recently used entries are evicted
+            once the total size of cached values exceeds it
+        ttl_seconds: Entries older than this are treated as missing (None = never expire)
+        name: Label used in log messages
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float] = None, name: str = "cache"):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                del self._entries[key]
+                self.current_bytes -= entry[1]
+                self.expirations += 1
+                entry = None
+                logger.debug(f"⏰ {self.name}: entry expired after {self.ttl_seconds:.0f} s")
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return  # Larger than the whole budget, never cache
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else float("inf")
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size, expires_at)
+            self.current_bytes += size
+            evicted = 0
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+                evicted += 1
+        if evicted:
+            logger.debug(f"🗑️ {self.name}: evicted {evicted} LRU entries to stay within {self.max_bytes / 1e6:.0f} MB")
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Like get(), but not counted as a lookup and without refreshing the entry's LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                return None
+            return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether key is cached and not expired (not counted as a lookup)."""
+        return self.peek(key) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": round(self.current_bytes / 1e6, 2),
+            "max_size_mb": round(self.max_bytes / 1e6, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SliceCache(LRUCache):
+    """
+    Preprocessed DICOM slices keyed by a hash of the slice bytes.
+
+    Each entry holds the normalized model tensor (1, 1, 256, 256) and the
+    uint8 visual image used for heatmaps. Cached values are shared between
+    requests and must not be modified in place.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes, name="slice cache")
+
+
+def study_fingerprint(slice_hashes: list[str]) -> str:
+    """Order-sensitive fingerprint of a study from its slice content hashes."""
+    return content_hash("|".join(slice_hashes).encode())
+
+
+class ResultCache(LRUCache):
+    """
+    Complete analysis results keyed by study fingerprint, with TTL and a
+    memory budget (heatmap strings dominate the entry size).
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        super().__init__(max_bytes, ttl_seconds=ttl_seconds, name="result cache")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one computation.
+
+    The first caller for a key starts the work; callers arriving while it
+    is still running await the same result (or exception). The shared work
+    is shielded, so one caller disconnecting does not cancel it for others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per key at a time.
+
+        Returns:
+            tuple: (result, shared) - shared is True if this caller joined
+            a computation started by another request
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
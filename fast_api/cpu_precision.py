@@ -0,0 +1,107 @@
+"""
+CPU Precision Modes
+How the eager task models run on the CPU:
+
+- 'fp32': plain fp32, NCHW (the default)
+- 'channels_last': fp32 with weights and inputs in channels-last (NHWC)
+  memory format, which oneDNN convolutions run without layout reorders
+- 'bf16': channels-last plus CPU bfloat16 autocast. Convs and matmuls run in
+  bf16, which is fast only on CPUs with native bf16 (AVX512-BF16 or AMX); on
+  other CPUs it falls back to 'channels_last'
+
+On CUDA devices none of this applies; the existing fp16 CUDA autocast is used.
+"""
+
+import contextlib
+import logging
+from typing import Dict, Iterable
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+CPU_PRECISIONS = ("fp32", "channels_last", "bf16")
+
+
+def bf16_supported() -> bool:
+    """Whether oneDNN has native bf16 kernels on this CPU."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def resolve_precision(requested: str, device: torch.device) -> str:
+    """
+    The precision mode that will actually run.
+
+    Returns:
+        'fp32' on non-CPU devices, 'channels_last' for 'bf16' without native
+        bf16 support, otherwise the requested mode
+    """
+    if requested not in CPU_PRECISIONS:
+        raise ValueError(f"Unknown CPU precision '{requested}'. Use one of: {', '.join(CPU_PRECISIONS)}")
+    if device.type != "cpu":
+        return "fp32"
+    if requested == "bf16" and not bf16_supported():
+        logger.warning("⚠️  CPU has no native bf16 support, using channels_last fp32")
+        return "channels_last"
+    return requested
+
+
+def uses_channels_last(precision: str) -> bool:
+    return precision in ("channels_last", "bf16")
+
+
+def to_channels_last(modules: Iterable[nn.Module]) -> None:
+    """Convert the 4D conv weights of each module to channels-last in place."""
+    for module in modules:
+        module.to(memory_format=torch.channels_last)
+
+
+def prepare_input(x: torch.Tensor, precision: str) -> torch.Tensor:
+    """Lay a (B, 3, H, W) batch out for the precision mode (inputs stay fp32)."""
+    if uses_channels_last(precision):
+        return x.contiguous(memory_format=torch.channels_last)
+    return x
+
+
+def precision_autocast(precision: str, device: torch.device):
+    """Autocast context for a forward pass: fp16 on CUDA, bf16 on CPU in 'bf16' mode."""
+    if device.type == "cuda":
+        return torch.autocast("cuda", dtype=torch.float16)
+    if precision == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def precision_info(requested: str, precision: str) -> Dict[str, object]:
+    return {
+        "requested": requested,
+        "mode": precision,
+        "channels_last": uses_channels_last(precision),
+        "bf16_autocast": precision == "bf16",
+        "bf16_supported": bf16_supported(),
+    }
+
+
+def verify_precision(engine: nn.Module, precision: str, device: torch.device, atol: float = 0.02) -> float:
+    """
+    Compare the engine under the precision mode with plain fp32 on a random batch.
+
+    Returns:
+        Maximum absolute probability difference across tasks
+
+    Raises:
+        RuntimeError: If probabilities differ by more than atol
+    """
+    x = torch.rand(2, 3, 256, 256, device=device)
+    with torch.no_grad():
+        ref_logits = engine.forward_features(x)[0]
+        with precision_autocast(precision, device):
+            logits = engine.forward_features(prepare_input(x, precision))[0]
+    max_delta = (torch.sigmoid(logits.float()) - torch.sigmoid(ref_logits.float())).abs().max().item()
+    if max_delta > atol:
+        raise RuntimeError(f"{precision} differs from fp32 by {max_delta:.2e} (atol {atol:.0e})")
+    return max_delta
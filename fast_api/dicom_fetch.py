@@ -0,0 +1,191 @@
+"""
+Async DICOM Fetch Layer
+Downloads DICOM files over a shared keep-alive connection pool so that all
+slices of a study are fetched concurrently without blocking the event loop.
+"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying (transient storage / gateway errors)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Transient transport failures (timeouts are handled separately)
+RETRYABLE_ERRORS = (httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+@dataclass
+class FetchedDicom:
+    """Raw bytes of a downloaded DICOM file."""
+    url: str
+    content: bytes
+
+
+class DicomFetchError(Exception):
+    """Raised when a DICOM file could not be downloaded."""
+
+    def __init__(self, url: str, message: str, index: Optional[int] = None,
+                 status_code: Optional[int] = None, timeout: bool = False, too_large: bool = False):
+        super().__init__(message)
+        self.url = url
+        self.index = index
+        self.status_code = status_code
+        self.timeout = timeout
+        self.too_large = too_large
+
+
+class DicomFetcher:
+    """
+    Concurrent DICOM downloader backed by a single httpx.AsyncClient.
+
+    Connections are kept alive between requests, each host gets its own
+    concurrency limit, and transient failures are retried with exponential
+    backoff and jitter. Bodies are streamed and abandoned once they exceed
+    max_bytes.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 16,
+        per_host_limit: int = 6,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        max_bytes: Optional[int] = None,
+    ):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_bytes = max_bytes
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def start(self) -> None:
+        """Open the shared connection pool."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=self.limits,
+                follow_redirects=True,
+            )
+            logger.info(f"✅ DICOM fetcher ready (per-host limit: {self.per_host_limit}, retries: {self.max_retries})")
+
+    async def close(self) -> None:
+        """Close the shared connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    async def fetch(self, url: str, index: Optional[int] = None) -> FetchedDicom:
+        """
+        Download a single DICOM file.
+
+        Args:
+            url: DICOM file URL
+            index: Position of the file in the request (used in error messages)
+
+        Returns:
+            FetchedDicom with the response body
+
+        Raises:
+            DicomFetchError: If the download fails after all retries
+        """
+        await self.start()
+        label = f"DICOM {index + 1}" if index is not None else "DICOM"
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                # Per attempt, so a URL backing off does not hold a slot of its host
+                async with self._host_semaphore(url):
+                    status_code, content = await self._get(url, label, index)
+            except httpx.TimeoutException as e:
+                if last_attempt:
+                    raise DicomFetchError(url, f"Timeout downloading {label}", index=index, timeout=True) from e
+                logger.warning(f"⚠️  Timeout downloading {label}, retrying ({attempt + 1}/{self.max_retries})")
+            except RETRYABLE_ERRORS as e:
+                if last_attempt:
+                    raise DicomFetchError(url, f"Failed to download {label}: {str(e)}", index=index) from e
+                logger.warning(f"⚠️  Error downloading {label}: {str(e)}, retrying ({attempt + 1}/{self.max_retries})")
+            except (httpx.HTTPError, httpx.InvalidURL) as e:
+                # Bad URL, unsupported scheme, redirect loop...: retrying cannot help
+                raise DicomFetchError(url, f"Failed to download {label}: {str(e)}", index=index) from e
+            else:
+                if status_code == 200:
+                    return FetchedDicom(url=url, content=content)
+                if last_attempt or status_code not in RETRYABLE_STATUS_CODES:
+                    raise DicomFetchError(
+                        url,
+                        f"Failed to download {label}. Status: {status_code}",
+                        index=index,
+                        status_code=status_code,
+                    )
+                logger.warning(f"⚠️  {label} returned {status_code}, retrying ({attempt + 1}/{self.max_retries})")
+
+            await asyncio.sleep(self._backoff_delay(attempt))
+
+    async def _get(self, url: str, label: str, index: Optional[int]) -> Tuple[int, bytes]:
+        """
+        One GET attempt.
+
+        Returns:
+            tuple: (status_code, body) - the body is only read for a 200
+
+        Raises:
+            DicomFetchError: If the body (or its Content-Length) exceeds max_bytes
+        """
+        async with self._client.stream("GET", url) as response:
+            if response.status_code != 200:
+                return response.status_code, b""
+            too_large = DicomFetchError(
+                url, f"{label} is larger than {self.max_bytes} bytes", index=index, too_large=True
+            )
+            declared = response.headers.get("content-length", "")
+            if self.max_bytes is not None and declared.isdigit() and int(declared) > self.max_bytes:
+                raise too_large
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if self.max_bytes is not None and len(body) > self.max_bytes:
+                    raise too_large
+            return 200, bytes(body)
+
+    async def fetch_all(self, urls: list[str]) -> list[FetchedDicom]:
+        """
+        Download several DICOM files concurrently, preserving order.
+
+        If any download fails the remaining ones are cancelled and the
+        first error is raised.
+        """
+        tasks = [asyncio.ensure_future(self.fetch(url, index=i)) for i, url in enumerate(urls)]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 """
 Create a mock 3D DICOM file for testing the slice extractor.
+mock_dicom_bytes() builds the same file in memory (the benchmarks serve
+its slices and volumes from a local storage stand-in).
 """
 
+import io
 import pydicom
 import numpy as np
 import os
@@ -13,6 +16,25 @@ def create_mock_3d_dicom(filename, num_slices=10, height=256, width=256):
     # Create random 3D volume
     volume = np.random.randint(0, 4096, (num_slices, height, width), dtype=np.uint16)
 
+    with open(filename, 'wb') as f:
+        f.write(mock_dicom_bytes(volume))
+    print(f"✅ Created mock 3D DICOM: {filename}")
+    print(f"   Shape: {volume.shape}")
+    print(f"   Size: {os.path.getsize(filename)} bytes")
+
+def mock_dicom_bytes(pixels):
+    """
+    Build a mock DICOM file in memory.
+
+    Args:
+        pixels: uint16 array, (frames, height, width) for a multi-frame
+            volume or (height, width) for a single slice
+
+    Returns:
+        bytes: The DICOM file, with preamble
+    """
+    height, width = pixels.shape[-2:]
+
     # Create a basic DICOM dataset
     ds = pydicom.Dataset()
 
@@ -36,6 +58,8 @@ def create_mock_3d_dicom(filename, num_slices=10, height=256, width=256):
     ds.StudyDescription = 'CDSS Testing Study'
 
     # Image dimensions
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = pixels.shape[0]
     ds.Rows = height
     ds.Columns = width
     ds.BitsAllocated = 16
@@ -46,13 +70,12 @@ def create_mock_3d_dicom(filename, num_slices=10, height=256, width=256):
     ds.PhotometricInterpretation = 'MONOCHROME2'
 
     # Pixel data
-    ds.PixelData = volume.tobytes()
+    ds.PixelData = pixels.tobytes()
 
     # Save with proper preamble
-    ds.save_as(filename, write_like_original=False)
-    print(f"✅ Created mock 3D DICOM: {filename}")
-    print(f"   Shape: {volume.shape}")
-    print(f"   Size: {os.path.getsize(filename)} bytes")
+    buff = io.BytesIO()
+    ds.save_as(buff, write_like_original=False)
+    return buff.getvalue()
 
 if __name__ == "__main__":
     create_mock_3d_dicom("test_3d_dicom.dcm", num_slices=8)
\ No newline at end of file
@@ -10,6 +10,11 @@ import os
 import sys
 import argparse
 
+def middle_slice_indices(num_slices):
+    """Indices of the 3 middle slices of a volume (middle slice ± 1)."""
+    mid = num_slices // 2
+    return [max(0, mid-1), mid, min(num_slices-1, mid+1)]
+
 def extract_middle_slices(dicom_path, output_prefix=None):
     """Extract 3 middle slices from a 3D DICOM file."""
 
@@ -42,8 +47,7 @@ def extract_middle_slices(dicom_path, output_prefix=None):
             return
 
         # Get middle 3 slices
-        mid = num_slices // 2
-        indices = [max(0, mid-1), mid, min(num_slices-1, mid+1)]
+        indices = middle_slice_indices(num_slices)
 
         print(f"🎯 Extracting slices: {indices}")
 
@@ -0,0 +1,100 @@
+"""
+Heatmap Explainability
+Class activation maps for MRNetModel.
+
+MRNetModel's head is global average pooling followed by a single
+Linear(512, 1), so the gradient of the logit with respect to each layer4
+activation is just the fc weight divided by h*w. Grad-CAM therefore reduces
+to a plain CAM (fc-weighted sum of layer4 features), which can be computed
+from activations captured during the normal no-grad inference pass without
+an extra forward and backward.
+
+pytorch_grad_cam (which pulls in scikit-learn) is only imported the first
+time the Grad-CAM path runs; overlay_cam reproduces its show_cam_on_image.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+HEATMAP_METHODS = ("cam", "gradcam")
+
+# GradCAM hooks the shared model, so two Grad-CAMs running in different
+# threads would record each other's activations and gradients
+_grad_cam_lock = threading.Lock()
+
+
+def compute_cams(features: torch.Tensor, fc_weight: torch.Tensor) -> torch.Tensor:
+    """
+    Class activation maps from layer4 features and fc weights.
+
+    Args:
+        features: layer4 activations (B, T, C, h, w) for T tasks
+        fc_weight: Per-task fc weights (T, C)
+
+    Returns:
+        Non-negative coarse maps (B, T, h, w)
+    """
+    cams = torch.einsum("btchw,tc->bthw", features.float(), fc_weight.float())
+    return torch.relu(cams)
+
+
+def _scale(cam: np.ndarray, target_size=None) -> np.ndarray:
+    cam = cam - np.min(cam)
+    cam = cam / (1e-7 + np.max(cam))
+    if target_size is not None:
+        cam = cv2.resize(cam, target_size)
+    return np.float32(cam)
+
+
+def upsample_cam(cam: np.ndarray, target_size=(256, 256)) -> np.ndarray:
+    """
+    Scale a coarse (h, w) map to [0, 1] at the input resolution, using the
+    same normalization as pytorch_grad_cam so both methods are comparable.
+    """
+    cam = np.maximum(cam, 0)
+    return _scale(_scale(cam, target_size))
+
+
+def grad_cam(model: nn.Module, tensor: torch.Tensor) -> np.ndarray:
+    """
+    Original Grad-CAM path (extra forward + backward through the model).
+
+    Returns:
+        Grayscale CAM (H, W) in [0, 1]
+    """
+    from pytorch_grad_cam import GradCAM
+    from pytorch_grad_cam.utils.model_targets import ClassifierOutputTarget
+
+    target_layers = [model.backbone.layer4[-1]]
+    with _grad_cam_lock:
+        cam = GradCAM(model=model, target_layers=target_layers)
+        try:
+            return cam(input_tensor=tensor, targets=[ClassifierOutputTarget(0)])[0, :]
+        finally:
+            cam.activations_and_grads.release()
+
+
+def overlay_cam(img: np.ndarray, mask: np.ndarray, image_weight: float = 0.5) -> np.ndarray:
+    """
+    Blend a JET-colored CAM over an RGB image, like pytorch_grad_cam's
+    show_cam_on_image(img, mask, use_rgb=True).
+
+    Args:
+        img: RGB float32 image (H, W, 3) in [0, 1]
+        mask: Grayscale CAM (H, W) in [0, 1]
+        image_weight: Weight of the image in the blend
+
+    Returns:
+        RGB uint8 overlay (H, W, 3)
+    """
+    heatmap = cv2.applyColorMap(np.uint8(255 * mask), cv2.COLORMAP_JET)
+    heatmap = np.float32(cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)) / 255
+    if np.max(img) > 1:
+        raise ValueError("The input image should be float32 in the range [0, 1]")
+    cam = (1 - image_weight) * heatmap + image_weight * img
+    cam = cam / np.max(cam)
+    return np.uint8(255 * cam)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Inference Backend Exporter
+Builds the TorchScript (.ts) and ONNX (.onnx) artifacts for the ACL, meniscus
+and abnormal checkpoints in models/, checks each against eager PyTorch, and
+times every backend on the CPU.
+
+The service picks the artifact up with INFERENCE_BACKEND=torchscript or
+INFERENCE_BACKEND=onnx. torch.compile has no artifact (it compiles when the
+service starts), but it can still be checked and timed here.
+
+Usage:
+    python export_backends.py                         # torchscript + onnx
+    python export_backends.py --backend onnx --iterations 50
+    python export_backends.py --backend compile --no-export
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import torch
+
+from fused_inference import FusedMRNet, TaskEnsemble
+from inference_backends import (
+    ARTIFACT_SUFFIXES, BACKENDS, checkpoint_fingerprint, export_artifact, load_backend, verify_backend,
+)
+from mrnet import MRNetModel
+
+TASKS = ["acl", "meniscus", "abnormal"]
+
+
+def load_engine(models_dir, fuse, device):
+    models, paths = {}, []
+    for task in TASKS:
+        path = Path(models_dir) / f"{task}_model.pth"
+        if not path.exists():
+            print(f"⚠️  Skipping {task}: {path} not found")
+            continue
+        model = MRNetModel()
+        model.load_state_dict(torch.load(path, map_location="cpu", weights_only=True))
+        models[task] = model.to(device).eval()
+        paths.append(str(path))
+    if not models:
+        raise SystemExit(f"❌ No checkpoints found in {models_dir}")
+    engine = FusedMRNet(models) if fuse and len(models) > 1 else TaskEnsemble(models)
+    return engine.to(device).eval(), paths
+
+
+def time_backend(backend, iterations, batch_size, device):
+    x = torch.rand(batch_size, 3, 256, 256, device=device)
+    with torch.no_grad():
+        backend.forward_features(x)  # warm-up (and compilation for torch.compile)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            backend.forward_features(x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main(args):
+    device = torch.device("cpu")
+    engine, paths = load_engine(args.models_dir, not args.no_fuse, device)
+    fingerprint = checkpoint_fingerprint(paths)
+
+    print("=" * 70)
+    print("📦 INFERENCE BACKEND EXPORT")
+    print("=" * 70)
+    print(f"Engine: {type(engine).__name__} ({'/'.join(engine.tasks)}), threads: {torch.get_num_threads()}")
+
+    for name in args.backend:
+        if name in ARTIFACT_SUFFIXES and not args.no_export:
+            path = export_artifact(name, engine, engine.tasks, args.models_dir, fingerprint, device)
+            print(f"✅ Exported {name}: {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+    print(f"\n{'backend':12s} {'artifact':34s} {'max prob delta':>15s} {'ms/batch':>9s}")
+    eager_ms = None
+    for name in ["eager"] + [b for b in args.backend if b != "eager"]:
+        try:
+            started = time.perf_counter()
+            backend = load_backend(name, engine, device, models_dir=args.models_dir, checkpoint_paths=paths)
+            delta = verify_backend(backend, engine, device, atol=args.atol)
+            build_s = time.perf_counter() - started
+            ms = time_backend(backend, args.iterations, args.batch_size, device)
+        except Exception as e:
+            print(f"{name:12s} ❌ {str(e)}")
+            continue
+        eager_ms = eager_ms or ms
+        artifact = Path(backend.artifact).name if backend.artifact else "(in memory)"
+        print(f"{name:12s} {artifact:34s} {delta:15.2e} {ms:9.1f}  x{eager_ms / ms:.2f}  (ready in {build_s:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and check CPU inference backends")
+    parser.add_argument("--backend", nargs="+", choices=[b for b in BACKENDS if b != "eager"],
+                        default=["torchscript", "onnx"])
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--no-fuse", action="store_true", help="Export the per-model path instead of the fused engine")
+    parser.add_argument("--no-export", action="store_true", help="Only check and time existing artifacts")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--atol", type=float,
+                        help="Probability tolerance vs eager (default: CHECK_ATOL, INT8_CHECK_ATOL for int8)")
+    main(parser.parse_args())
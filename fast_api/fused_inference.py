@@ -0,0 +1,186 @@
+"""
+Fused Multi-Task Inference
+Runs several MRNetModel checkpoints (ACL, meniscus, abnormal) as a single
+ResNet18 whose convolutions are grouped per task, so all tasks are evaluated
+in one forward pass with one host sync.
+"""
+
+import copy
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from mrnet import MRNetModel
+
+logger = logging.getLogger(__name__)
+
+
+def _set_submodule(root: nn.Module, name: str, module: nn.Module) -> None:
+    parent_name, _, child_name = name.rpartition(".")
+    parent = root.get_submodule(parent_name) if parent_name else root
+    setattr(parent, child_name, module)
+
+
+def _fuse_conv(convs: list[nn.Conv2d]) -> nn.Conv2d:
+    """Stack T convolutions into one conv with T times as many groups."""
+    ref = convs[0]
+    num_tasks = len(convs)
+    fused = nn.Conv2d(
+        ref.in_channels * num_tasks,
+        ref.out_channels * num_tasks,
+        kernel_size=ref.kernel_size,
+        stride=ref.stride,
+        padding=ref.padding,
+        dilation=ref.dilation,
+        groups=ref.groups * num_tasks,
+        bias=ref.bias is not None,
+    )
+    fused.weight.data.copy_(torch.cat([c.weight.data for c in convs]))
+    if ref.bias is not None:
+        fused.bias.data.copy_(torch.cat([c.bias.data for c in convs]))
+    return fused
+
+
+def _fuse_batchnorm(bns: list[nn.BatchNorm2d]) -> nn.BatchNorm2d:
+    """Concatenate T batch norms channel-wise (eval-mode statistics)."""
+    ref = bns[0]
+    fused = nn.BatchNorm2d(ref.num_features * len(bns), eps=ref.eps, momentum=ref.momentum)
+    for attr in ("weight", "bias", "running_mean", "running_var"):
+        getattr(fused, attr).data.copy_(torch.cat([getattr(bn, attr).data for bn in bns]))
+    return fused
+
+
+class FusedMRNet(nn.Module):
+    """
+    Several MRNetModels evaluated as one grouped-convolution network.
+
+    Task t owns channel group t of every layer, so the per-task networks never
+    mix: the input is replicated once per task, each grouped conv applies the
+    stacked per-task kernels, and the per-task fc heads are applied to the
+    pooled features with a single batched multiply.
+
+    Args:
+        models: Mapping of task name -> loaded MRNetModel (all on the same device)
+    """
+
+    def __init__(self, models: Dict[str, MRNetModel]):
+        super().__init__()
+        if not models:
+            raise ValueError("FusedMRNet needs at least one model")
+
+        self.tasks = list(models.keys())
+        sources = [dict(m.backbone.named_modules()) for m in models.values()]
+        num_tasks = len(self.tasks)
+
+        backbone = copy.deepcopy(next(iter(models.values())).backbone)
+        for name, module in list(backbone.named_modules()):
+            if isinstance(module, nn.Conv2d):
+                _set_submodule(backbone, name, _fuse_conv([s[name] for s in sources]))
+            elif isinstance(module, nn.BatchNorm2d):
+                _set_submodule(backbone, name, _fuse_batchnorm([s[name] for s in sources]))
+        backbone.fc = nn.Identity()
+        self.backbone = backbone
+
+        # Per-task fc heads: Linear(512, 1) -> stacked (T, 512) weights, (T,) bias
+        heads = [m.backbone.fc[-1] for m in models.values()]
+        self.register_buffer("fc_weight", torch.stack([h.weight.data[0] for h in heads]))
+        self.register_buffer("fc_bias", torch.cat([h.bias.data for h in heads]))
+        self.num_tasks = num_tasks
+        self.to(self.fc_weight.device)
+
+    def forward_features(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            x: Input batch (B, 3, H, W)
+
+        Returns:
+            tuple: (logits, features)
+                - logits: (B, T) one logit per task
+                - features: (B, T, 512, h, w) layer4 activations per task
+        """
+        b = self.backbone
+        x = x.repeat(1, self.num_tasks, 1, 1)
+        x = b.maxpool(b.relu(b.bn1(b.conv1(x))))
+        x = b.layer4(b.layer3(b.layer2(b.layer1(x))))
+        features = x.view(x.shape[0], self.num_tasks, -1, x.shape[-2], x.shape[-1])
+        pooled = features.mean(dim=(-2, -1))  # (B, T, 512)
+        logits = (pooled * self.fc_weight).sum(dim=-1) + self.fc_bias
+        return logits, features
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.forward_features(x)[0]
+
+    @torch.no_grad()
+    def predict_batch(self, x: torch.Tensor) -> List[Dict[str, float]]:
+        """Return one {task: probability} dict per study with one host sync."""
+        probs = torch.sigmoid(self(x).float()).tolist()
+        return [dict(zip(self.tasks, row)) for row in probs]
+
+    def predict(self, x: torch.Tensor) -> Dict[str, float]:
+        """Return {task: probability} for a single study."""
+        return self.predict_batch(x)[0]
+
+
+class TaskEnsemble(nn.Module):
+    """
+    The per-model path (one forward per task) behind FusedMRNet's interface,
+    used when fusion is disabled or only one model is loaded.
+
+    Args:
+        models: Mapping of task name -> loaded MRNetModel
+    """
+
+    def __init__(self, models: Dict[str, MRNetModel]):
+        super().__init__()
+        if not models:
+            raise ValueError("TaskEnsemble needs at least one model")
+        self.tasks = list(models.keys())
+        self.models = nn.ModuleList(models.values())
+        heads = [m.backbone.fc[-1] for m in models.values()]
+        self.register_buffer("fc_weight", torch.stack([h.weight.data[0] for h in heads]))
+        # Called with (task, seconds) after each model's forward, e.g. for metrics;
+        # on CUDA this is launch time unless the caller synchronizes
+        self.on_forward: Optional[Callable[[str, float], None]] = None
+
+    def forward_features(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Same outputs as FusedMRNet.forward_features."""
+        if self.on_forward is None:
+            outputs = [model.forward_features(x) for model in self.models]
+        else:
+            outputs = []
+            for task, model in zip(self.tasks, self.models):
+                started = time.perf_counter()
+                outputs.append(model.forward_features(x))
+                self.on_forward(task, time.perf_counter() - started)
+        logits = torch.cat([task_logits for task_logits, _ in outputs], dim=1)
+        features = torch.stack([task_features for _, task_features in outputs], dim=1)
+        return logits, features
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.forward_features(x)[0]
+
+
+def verify_fused_model(fused: FusedMRNet, models: Dict[str, MRNetModel], device: torch.device,
+                       atol: float = 1e-4) -> float:
+    """
+    Compare fused outputs with the per-model path on a random input.
+
+    Returns:
+        Maximum absolute probability difference across tasks
+
+    Raises:
+        RuntimeError: If any task differs by more than atol
+    """
+    x = torch.rand(1, 3, 256, 256, device=device)
+    with torch.no_grad():
+        fused_probs = fused.predict(x)
+        max_delta = 0.0
+        for task, model in models.items():
+            ref = torch.sigmoid(model(x)).item()
+            max_delta = max(max_delta, abs(ref - fused_probs[task]))
+    if max_delta > atol:
+        raise RuntimeError(f"Fused model differs from per-model path by {max_delta:.2e} (atol {atol:.0e})")
+    return max_delta
@@ -0,0 +1,73 @@
+"""
+Heatmap Image Encoding
+Encodes RGB heatmap overlays as PNG, JPEG or WebP with either OpenCV or PIL,
+with a configurable PNG compression level or lossy quality.
+"""
+
+import io
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+HEATMAP_MEDIA_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+HEATMAP_ENCODERS = ("cv2", "pil")
+
+DEFAULT_PNG_COMPRESSION = 6  # PIL's default, what the service always used
+DEFAULT_QUALITY = 85
+
+
+def encode_heatmap(rgb: np.ndarray, fmt: str = "png", quality: Optional[int] = None,
+                   encoder: str = "cv2") -> bytes:
+    """
+    Encode an RGB uint8 image.
+
+    Args:
+        rgb: Image array (H, W, 3), RGB order
+        fmt: 'png', 'jpeg' or 'webp'
+        quality: PNG compression level (0-9) for PNG, quality (1-100) for JPEG/WebP.
+            None uses the defaults above.
+        encoder: 'cv2' or 'pil'
+
+    Returns:
+        Encoded image bytes
+
+    Raises:
+        ValueError: On an unknown format or encoder
+    """
+    fmt = fmt.lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in HEATMAP_MEDIA_TYPES:
+        raise ValueError(f"Unsupported heatmap format: {fmt}")
+    if encoder not in HEATMAP_ENCODERS:
+        raise ValueError(f"Unsupported heatmap encoder: {encoder}")
+
+    if fmt == "png":
+        level = DEFAULT_PNG_COMPRESSION if quality is None else int(np.clip(quality, 0, 9))
+    else:
+        level = DEFAULT_QUALITY if quality is None else int(np.clip(quality, 1, 100))
+
+    if encoder == "cv2":
+        params = {
+            "png": [cv2.IMWRITE_PNG_COMPRESSION, level],
+            "jpeg": [cv2.IMWRITE_JPEG_QUALITY, level],
+            "webp": [cv2.IMWRITE_WEBP_QUALITY, level],
+        }[fmt]
+        ok, buff = cv2.imencode(f".{'jpg' if fmt == 'jpeg' else fmt}", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), params)
+        if not ok:
+            raise ValueError(f"OpenCV failed to encode heatmap as {fmt}")
+        return buff.tobytes()
+
+    buff = io.BytesIO()
+    img = Image.fromarray(rgb)
+    if fmt == "png":
+        img.save(buff, format="PNG", compress_level=level)
+    else:
+        img.save(buff, format=fmt.upper(), quality=level)
+    return buff.getvalue()
@@ -0,0 +1,151 @@
+"""
+Deferred Heatmap Store
+Keeps what is needed to render a heatmap after /analyze has already
+returned, so the diagnosis path does not wait for heatmap rendering and
+encoding. Heatmaps are rendered by a background worker or on demand when
+GET /heatmap/{id} asks for one first, with bounded retention.
+"""
+
+import asyncio
+import logging
+import uuid
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import torch
+
+from caching import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HeatmapJob:
+    """Inputs needed to render one heatmap, plus its rendered result."""
+    task: str
+    original_img: np.ndarray
+    cam: Optional[np.ndarray] = None  # Coarse CAM from the inference pass
+    input_tensor: Optional[torch.Tensor] = None  # Only kept for Grad-CAM
+    model: Optional[Any] = field(default=None, repr=False)  # Model version that produced the CAM (Grad-CAM runs it)
+    result: Optional[Any] = None
+    _future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+    @property
+    def nbytes(self) -> int:
+        size = self.original_img.nbytes
+        if self.cam is not None:
+            size += self.cam.nbytes
+        if self.input_tensor is not None:
+            size += self.input_tensor.element_size() * self.input_tensor.nelement()
+        if self.result is not None:
+            size += self.result.nbytes if isinstance(self.result, np.ndarray) else len(self.result)
+        return size
+
+
+class HeatmapStore:
+    """
+    Bounded store of pending and rendered heatmaps.
+
+    Args:
+        render: Function turning a HeatmapJob into the rendered heatmap
+        max_bytes: Memory budget for stored jobs (LRU eviction)
+        ttl_seconds: How long a heatmap stays retrievable
+        precompute: Render every submitted job in the background
+        executor: Executor rendering runs on (None = default thread pool)
+    """
+
+    def __init__(
+        self,
+        render: Callable[[HeatmapJob], Any],
+        max_bytes: int,
+        ttl_seconds: float,
+        precompute: bool = True,
+        executor: Optional[Executor] = None,
+    ):
+        self.render = render
+        self.precompute = precompute
+        self.executor = executor
+        self._jobs = LRUCache(max_bytes, ttl_seconds=ttl_seconds, name="heatmap store")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.rendered = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        if self.precompute and self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def submit(self, job: HeatmapJob) -> str:
+        """Store a job and return its heatmap id."""
+        heatmap_id = uuid.uuid4().hex
+        self._jobs.put(heatmap_id, job)
+        if self._queue is not None:
+            self._queue.put_nowait(heatmap_id)
+        return heatmap_id
+
+    def __contains__(self, heatmap_id: str) -> bool:
+        """Whether heatmap_id can still be retrieved (not evicted or expired)."""
+        return heatmap_id in self._jobs
+
+    def _ensure_render(self, heatmap_id: str, job: HeatmapJob) -> asyncio.Future:
+        if job._future is None:
+            loop = asyncio.get_running_loop()
+            job._future = asyncio.ensure_future(self._render(heatmap_id, job, loop))
+        return job._future
+
+    async def _render(self, heatmap_id: str, job: HeatmapJob, loop: asyncio.AbstractEventLoop) -> Any:
+        try:
+            result = await loop.run_in_executor(self.executor, self.render, job)
+        except Exception:
+            self.failed += 1
+            raise
+        job.result = result
+        # Release render inputs and re-account the entry at its rendered size
+        job.cam = None
+        job.input_tensor = None
+        self._jobs.put(heatmap_id, job)
+        self.rendered += 1
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            heatmap_id = await self._queue.get()
+            job = self._jobs.peek(heatmap_id)  # Internal check: not a client lookup
+            if job is None or job.result is not None:
+                continue  # Expired, evicted or already served on demand
+            try:
+                await asyncio.shield(self._ensure_render(heatmap_id, job))
+            except Exception as e:
+                logger.error(f"❌ Background heatmap rendering failed: {str(e)}")
+
+    async def get(self, heatmap_id: str) -> Optional[HeatmapJob]:
+        """
+        Return the rendered job for heatmap_id, rendering it now if the
+        background worker has not done so yet. None if unknown or expired.
+        """
+        job = self._jobs.get(heatmap_id)
+        if job is None:
+            return None
+        if job.result is None:
+            await asyncio.shield(self._ensure_render(heatmap_id, job))
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._jobs.stats(),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "rendered": self.rendered,
+            "failed": self.failed,
+        }
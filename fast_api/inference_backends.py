@@ -0,0 +1,326 @@
+"""
+Inference Backends
+Interchangeable runtimes for the task models' forward pass: eager PyTorch,
+TorchScript (traced and frozen), torch.compile, an exported ONNX graph
+run with ONNX Runtime, and INT8 quantized models (quantization.py). Every backend exposes the FusedMRNet interface,
+forward_features(x) -> (logits (B, T), layer4 features (B, T, 512, h, w)),
+so probabilities and CAMs are computed the same way whichever backend runs.
+
+TorchScript and ONNX artifacts are written by export_backends.py next to
+the .pth checkpoints, with a sidecar .json recording the checkpoints they
+were built from. A missing or stale artifact is rebuilt in memory at startup.
+INT8 artifacts need calibration data, so they are only built offline by
+quantize_models.py; a missing or stale one makes the int8 backend unavailable.
+"""
+
+import hashlib
+import inspect
+import io
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "torchscript", "compile", "onnx", "int8")
+ARTIFACT_SUFFIXES = {"torchscript": ".ts", "onnx": ".onnx"}
+ONNX_OPSET = 17
+# Startup self-check vs eager: probability atol and layer4 feature rtol (of their range).
+# INT8 rounds every activation, so its check is looser.
+CHECK_ATOL, CHECK_FEATURE_RTOL = 1e-4, 1e-3
+INT8_CHECK_ATOL, INT8_CHECK_FEATURE_RTOL = 0.05, 0.1
+
+
+class FeaturesModule(nn.Module):
+    """Exposes engine.forward_features as forward() for tracing and export."""
+
+    def __init__(self, engine: nn.Module):
+        super().__init__()
+        self.engine = engine
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        return self.engine.forward_features(x)
+
+
+def checkpoint_fingerprint(paths: Sequence[str]) -> str:
+    """SHA-256 over the checkpoint files, in task order."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_path(models_dir: str, backend: str, tasks: Sequence[str], engine: str) -> Path:
+    """
+    e.g. models/mrnet_acl-meniscus-abnormal.FusedMRNet.onnx (engine: the
+    eager engine's class name, so fused and per-model exports do not collide)
+    """
+    return Path(models_dir) / f"mrnet_{'-'.join(tasks)}.{engine}{ARTIFACT_SUFFIXES[backend]}"
+
+
+def _sidecar(path: Path) -> Path:
+    return path.with_name(path.name + ".json")
+
+
+def read_artifact_info(path: Path) -> Optional[Dict]:
+    try:
+        return json.loads(_sidecar(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _example_input(device: torch.device) -> torch.Tensor:
+    return torch.rand(1, 3, 256, 256, device=device)
+
+
+def trace_torchscript(engine: nn.Module, device: torch.device) -> torch.jit.ScriptModule:
+    """Trace and freeze the engine (folds BatchNorm into convs, inlines weights)."""
+    with torch.no_grad():
+        traced = torch.jit.trace(FeaturesModule(engine).eval(), _example_input(device), check_trace=False)
+    return torch.jit.freeze(traced)
+
+
+def export_onnx_bytes(engine: nn.Module, device: torch.device) -> bytes:
+    """Export the engine as an ONNX graph with a dynamic batch dimension."""
+    buff = io.BytesIO()
+    options = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        options["dynamo"] = False  # Newer torch defaults to the dynamo exporter
+    with torch.no_grad():
+        torch.onnx.export(
+            FeaturesModule(engine).eval(),
+            (_example_input(device),),
+            buff,
+            input_names=["input"],
+            output_names=["logits", "features"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}, "features": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            **options,
+        )
+    return buff.getvalue()
+
+
+def export_artifact(backend: str, engine: nn.Module, tasks: Sequence[str], models_dir: str,
+                    fingerprint: str, device: torch.device) -> Path:
+    """
+    Write the TorchScript or ONNX artifact for a backend, plus its sidecar.
+
+    Returns:
+        Path of the written artifact
+    """
+    path = artifact_path(models_dir, backend, tasks, type(engine).__name__)
+    if backend == "torchscript":
+        torch.jit.save(trace_torchscript(engine, device), str(path))
+    elif backend == "onnx":
+        path.write_bytes(export_onnx_bytes(engine, device))
+    else:
+        raise ValueError(f"Backend '{backend}' has no exportable artifact")
+    _sidecar(path).write_text(json.dumps({
+        "backend": backend,
+        "tasks": list(tasks),
+        "checkpoint_sha256": fingerprint,
+        "engine": type(engine).__name__,
+        "torch_version": torch.__version__,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, indent=2))
+    return path
+
+
+class InferenceBackend:
+    """
+    A runtime for the task models' forward pass.
+
+    Attributes:
+        name: Backend name (one of BACKENDS)
+        tasks: Task name for each logit column
+        fc_weight: Per-task fc weights (T, 512) used for CAMs
+        artifact: Artifact file the backend runs from, if any
+    """
+
+    def __init__(self, name: str, tasks: List[str], fc_weight: torch.Tensor, artifact: Optional[str] = None):
+        self.name = name
+        self.tasks = tasks
+        self.fc_weight = fc_weight
+        self.artifact = artifact
+
+    def forward_features(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        raise NotImplementedError
+
+    def info(self) -> Dict[str, Optional[str]]:
+        return {"name": self.name, "artifact": self.artifact}
+
+    def set_num_threads(self, num_threads: int) -> None:
+        """Backends with their own thread pool resize it here (torch ones follow torch.set_num_threads)."""
+
+
+class ModuleBackend(InferenceBackend):
+    """Eager, TorchScript and torch.compile: a callable returning (logits, features)."""
+
+    def __init__(self, name: str, module, tasks: List[str], fc_weight: torch.Tensor, artifact: Optional[str] = None):
+        super().__init__(name, tasks, fc_weight, artifact)
+        self.module = module
+
+    def forward_features(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        return self.module(x)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """Runs an exported ONNX graph on the CPU with ONNX Runtime."""
+
+    def __init__(self, model: bytes, tasks: List[str], fc_weight: torch.Tensor, device: torch.device,
+                 artifact: Optional[str] = None, num_threads: Optional[int] = None):
+        super().__init__("onnx", tasks, fc_weight, artifact)
+        self.model = model
+        self.device = device
+        self.set_num_threads(num_threads or torch.get_num_threads())
+
+    def set_num_threads(self, num_threads: int) -> None:
+        """(Re)create the session; also gives a forked worker a live thread pool."""
+        import onnxruntime as ort  # Optional dependency, only needed for this backend
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(self.model, options, providers=["CPUExecutionProvider"])
+
+    def forward_features(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        inputs = {"input": x.detach().float().cpu().contiguous().numpy()}
+        logits, features = self.session.run(["logits", "features"], inputs)
+        return torch.from_numpy(logits).to(self.device), torch.from_numpy(features).to(self.device)
+
+
+class Int8Backend(InferenceBackend):
+    """Runs the per-task INT8 models (one quantized ResNet18 each) on the CPU."""
+
+    def __init__(self, modules: List[torch.jit.ScriptModule], tasks: List[str], fc_weight: torch.Tensor,
+                 device: torch.device, artifact: Optional[str] = None):
+        super().__init__("int8", tasks, fc_weight, artifact)
+        self.modules = modules
+        self.device = device
+
+    def forward_features(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        outputs = [module(x.float().cpu()) for module in self.modules]
+        logits = torch.cat([out[0] for out in outputs], dim=1)
+        features = torch.stack([out[1] for out in outputs], dim=1)
+        return logits.to(self.device), features.to(self.device)
+
+
+def _load_artifact(backend: str, tasks: Sequence[str], engine: str, models_dir: str,
+                   fingerprint: Optional[str]) -> Optional[Path]:
+    """Path of an up-to-date artifact, or None if missing or built from another engine or checkpoints."""
+    path = artifact_path(models_dir, backend, tasks, engine)
+    if not path.exists():
+        logger.info(f"ℹ️  No {backend} artifact at {path}, building it in memory")
+        return None
+    info = read_artifact_info(path)
+    if info is None or info.get("engine") != engine:
+        logger.warning(f"⚠️  {path} was not exported from a {engine} engine, rebuilding it in memory "
+                       f"(re-run export_backends.py)")
+        return None
+    if fingerprint is not None and (info is None or info.get("checkpoint_sha256") != fingerprint):
+        logger.warning(f"⚠️  {path} was exported from different checkpoints, rebuilding it in memory "
+                       f"(re-run export_backends.py)")
+        return None
+    return path
+
+
+def load_backend(name: str, engine: nn.Module, device: torch.device, models_dir: str = "models",
+                 checkpoint_paths: Optional[Sequence[str]] = None) -> InferenceBackend:
+    """
+    Build the requested backend around an eager engine (FusedMRNet or TaskEnsemble).
+
+    Args:
+        name: One of BACKENDS
+        engine: Eager engine; the reference for the self-check and the
+            source for in-memory export when no artifact is available
+        device: Device inputs and outputs live on
+        models_dir: Directory holding exported artifacts
+        checkpoint_paths: Checkpoints the engine was loaded from (artifact staleness check)
+
+    Raises:
+        ValueError: On an unknown backend
+        RuntimeError: If the backend cannot run here (e.g. ONNX Runtime not
+            installed, or no up-to-date INT8 artifacts)
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Use one of: {', '.join(BACKENDS)}")
+    tasks = list(engine.tasks)
+    fc_weight = engine.fc_weight
+
+    if name == "eager":
+        return ModuleBackend("eager", engine.forward_features, tasks, fc_weight)
+
+    if name == "compile":
+        compiled = torch.compile(FeaturesModule(engine).eval(), dynamic=True)
+        return ModuleBackend("compile", compiled, tasks, fc_weight)
+
+    if name == "int8":
+        from quantization import int8_artifact_path, load_int8_artifact
+
+        if device.type != "cpu":
+            raise RuntimeError("The int8 backend runs on CPU only")
+        if not checkpoint_paths or len(checkpoint_paths) != len(tasks):
+            raise RuntimeError("The int8 backend needs one checkpoint path per task")
+        modules = [load_int8_artifact(path) for path in checkpoint_paths]
+        artifacts = ", ".join(str(int8_artifact_path(path)) for path in checkpoint_paths)
+        return Int8Backend(modules, tasks, fc_weight, device, artifacts)
+
+    fingerprint = checkpoint_fingerprint(checkpoint_paths) if checkpoint_paths else None
+    path = _load_artifact(name, tasks, type(engine).__name__, models_dir, fingerprint)
+
+    if name == "torchscript":
+        if path is not None:
+            module = torch.jit.load(str(path), map_location=device)
+        else:
+            module = trace_torchscript(engine, device)
+        return ModuleBackend("torchscript", module, tasks, fc_weight, str(path) if path else None)
+
+    if device.type != "cpu":
+        raise RuntimeError("The onnx backend runs on CPU only")
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+    model = path.read_bytes() if path is not None else export_onnx_bytes(engine, device)
+    return OnnxRuntimeBackend(model, tasks, fc_weight, device, str(path) if path else None)
+
+
+def verify_backend(backend: InferenceBackend, engine: nn.Module, device: torch.device,
+                   atol: Optional[float] = None, feature_rtol: Optional[float] = None) -> float:
+    """
+    Compare a backend against the eager engine on a random batch.
+
+    atol and feature_rtol default to CHECK_ATOL and CHECK_FEATURE_RTOL, or
+    their INT8_ counterparts for the int8 backend.
+
+    Returns:
+        Maximum absolute probability difference across tasks
+
+    Raises:
+        RuntimeError: If probabilities differ by more than atol, or layer4
+            features (and so CAMs) by more than feature_rtol of their range
+    """
+    int8 = backend.name == "int8"
+    if atol is None:
+        atol = INT8_CHECK_ATOL if int8 else CHECK_ATOL
+    if feature_rtol is None:
+        feature_rtol = INT8_CHECK_FEATURE_RTOL if int8 else CHECK_FEATURE_RTOL
+    x = torch.rand(2, 3, 256, 256, device=device)
+    with torch.no_grad():
+        ref_logits, ref_features = engine.forward_features(x)
+        logits, features = backend.forward_features(x)
+    max_delta = (torch.sigmoid(logits.float()) - torch.sigmoid(ref_logits.float())).abs().max().item()
+    feature_delta = (features.float() - ref_features.float()).abs().max().item()
+    feature_scale = ref_features.float().abs().max().item() or 1.0
+    if max_delta > atol:
+        raise RuntimeError(f"{backend.name} backend differs from eager by {max_delta:.2e} (atol {atol:.0e})")
+    if feature_delta > feature_rtol * feature_scale:
+        raise RuntimeError(f"{backend.name} backend features differ from eager by {feature_delta:.2e}")
+    return max_delta
@@ -0,0 +1,184 @@
+"""
+Dynamic Micro-Batching Scheduler
+Collects input tensors from concurrent /analyze requests into batches (up to
+a maximum size or wait time), runs one forward per batch, and hands each
+request back its own row of the result.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of a list of samples (0.0 if empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100.0 * len(ordered)) - 1)]
+
+
+@dataclass
+class _PendingRequest:
+    tensor: torch.Tensor
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatchScheduler:
+    """
+    Batches single-study inference calls across concurrent requests.
+
+    Args:
+        run_batch: Function taking a (B, 3, H, W) tensor and returning a list
+            of B per-study results (e.g. {task: probability} dicts)
+        max_batch_size: Maximum number of studies per forward pass
+        max_wait_ms: How long the first request in a batch may wait for others
+        executor: Executor the forward pass runs on (defaults to a private
+            single-thread pool so batches run one at a time off the event loop)
+        stats_window: Number of recent samples kept for wait-time percentiles
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[torch.Tensor], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None,
+        stats_window: int = 2048,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batch_size_counts: Counter = Counter()
+        self.total_requests = 0
+        self.total_batches = 0
+        self._queue_waits: deque = deque(maxlen=stats_window)
+        self._batch_latencies: deque = deque(maxlen=stats_window)
+
+    async def start(self) -> None:
+        if self._worker is not None:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference-batch")
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"✅ Micro-batching enabled (max batch: {self.max_batch_size}, max wait: {self.max_wait * 1000:.1f} ms)")
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Inference scheduler stopped"))
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, tensor: torch.Tensor) -> Any:
+        """
+        Queue one study for inference and wait for its result.
+
+        Args:
+            tensor: Single-study input (1, 3, H, W)
+
+        Returns:
+            This study's entry from run_batch's result list
+        """
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(tensor=tensor, future=future))
+        return await future
+
+    async def _collect_batch(self) -> List[_PendingRequest]:
+        first = await self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # Still take whatever is already queued, without waiting
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            batch = [p for p in batch if not p.future.cancelled()]
+            if not batch:
+                continue
+
+            dispatched_at = time.perf_counter()
+            for pending in batch:
+                self._queue_waits.append(dispatched_at - pending.enqueued_at)
+            self.batch_size_counts[len(batch)] += 1
+            self.total_batches += 1
+            self.total_requests += len(batch)
+
+            try:
+                inputs = torch.cat([p.tensor for p in batch], dim=0)
+                results = await loop.run_in_executor(self._executor, self.run_batch, inputs)
+            except Exception as e:
+                logger.error(f"❌ Batched inference failed: {str(e)}")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+            self._batch_latencies.append(time.perf_counter() - dispatched_at)
+
+            for pending, result in zip(batch, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size distribution and queue-wait / batch-latency percentiles."""
+        waits = list(self._queue_waits)
+        latencies = list(self._batch_latencies)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "mean_batch_size": round(self.total_requests / self.total_batches, 3) if self.total_batches else 0.0,
+            "batch_size_counts": {str(size): count for size, count in sorted(self.batch_size_counts.items())},
+            "queue_wait_ms": {
+                "p50": round(percentile(waits, 50) * 1000, 3),
+                "p95": round(percentile(waits, 95) * 1000, 3),
+                "p99": round(percentile(waits, 99) * 1000, 3),
+            },
+            "batch_latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 3),
+                "p95": round(percentile(latencies, 95) * 1000, 3),
+                "p99": round(percentile(latencies, 99) * 1000, 3),
+            },
+        }
@@ -1,22 +1,56 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
 import torch
 import torch.nn as nn
-from torchvision import models, transforms
 import pydicom
 import numpy as np
-from PIL import Image
-import io
-import requests
+import os
+import asyncio
+import functools
+import hmac
 import base64
+import json
 import cv2
-from pytorch_grad_cam import GradCAM
-from pytorch_grad_cam.utils.image import show_cam_on_image
-from pytorch_grad_cam.utils.model_targets import ClassifierOutputTarget
 import logging
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, Awaitable, Callable
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+import contextvars
+from dataclasses import dataclass, field
+
+from admission import AdmissionController, AdmissionRejected, current_ticket, deadline_remaining, reset_ticket, set_ticket
+from caching import ResultCache, SingleFlight, SliceCache, content_hash, study_fingerprint
+from cpu_precision import (
+    CPU_PRECISIONS, precision_autocast, precision_info, prepare_input, resolve_precision, to_channels_last,
+    uses_channels_last, verify_precision,
+)
+from dicom_fetch import DicomFetcher, DicomFetchError
+from explainability import HEATMAP_METHODS, compute_cams, grad_cam, overlay_cam, upsample_cam
+from heatmap_encoding import HEATMAP_ENCODERS, HEATMAP_MEDIA_TYPES, encode_heatmap
+from heatmap_store import HeatmapJob, HeatmapStore
+from fused_inference import FusedMRNet, TaskEnsemble, verify_fused_model
+from inference_backends import CHECK_ATOL, INT8_CHECK_ATOL, load_backend, verify_backend
+from inference_scheduler import MicroBatchScheduler
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, RequestMetricsMiddleware
+from model_registry import ModelRegistry, ModelSet, ModelSpec, RegistryBusyError, model_spec, read_manifest, resolve_specs
+from mrnet import load_mrnet
+from preprocessing import (
+    SliceDecoder, describe_dicom, open_volume, preprocess_arrays, slice_decoder, volume_decoder,
+    volume_frame_count, volume_slice_indices,
+)
+from profiling import RequestProfile, current_profile, profile_forward, profile_stage
+from upload_stream import UploadError, read_multipart
+from startup import StartupPhases
+from volume_inference import POOLING_METHODS, run_volume
+from workers import current as worker_identity, recent_process_memory, worker_info
+
+startup_phases = StartupPhases()
+startup_phases.since_last("imports")  # Since process start
 
 # --- LOGGING SETUP ---
 logging.basicConfig(
@@ -40,6 +74,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- METRICS ---
+# Served by GET /metrics in the Prometheus text format (see metrics.py)
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.counter("cdss_http_requests_total", "HTTP requests by route and status", ("method", "endpoint", "status"))
+HTTP_LATENCY = metrics.histogram("cdss_http_request_duration_seconds", "Time to response headers by route", ("endpoint",))
+HTTP_IN_FLIGHT = metrics.gauge("cdss_http_requests_in_flight", "Requests being handled")
+STAGE_LATENCY = metrics.histogram(
+    "cdss_stage_duration_seconds",
+    "Analysis stage latency: download, upload, dicom_parse, dicom_read, preprocess, inference, cam, cam_upsample, "
+    "gradcam, heatmap_overlay, heatmap_encode",
+    ("stage",)
+)
+STAGE_ERRORS = metrics.counter("cdss_stage_errors_total", "Analysis stages that raised", ("stage",))
+MODEL_FORWARD = metrics.histogram(
+    "cdss_model_forward_seconds",
+    "One forward pass: model is the task, or 'fused' for the fused engine and 'ensemble' for a "
+    "non-eager per-task engine",
+    ("model", "backend")
+)
+ANALYSES = metrics.counter("cdss_analyses_total", "Analysis responses by result cache status", ("cache",))
+DOWNLOADED_BYTES = metrics.counter("cdss_downloaded_bytes_total", "DICOM bytes downloaded from storage URLs")
+UPLOADED_BYTES = metrics.counter("cdss_uploaded_bytes_total", "DICOM bytes received in request bodies")
+HEATMAP_BYTES = metrics.counter("cdss_heatmap_bytes_total", "Encoded heatmap bytes sent, by format", ("format",))
+MODEL_RELOADS = metrics.counter("cdss_model_reloads_total", "Model reloads and rollbacks by result", ("action", "result"))
+ADMISSION_REJECTIONS = metrics.counter("cdss_admission_rejections_total", "Analysis requests turned away by admission control", ("reason",))
+BATCH_STUDIES = metrics.counter("cdss_batch_studies_total", "Studies analyzed through /analyze/batch by result", ("result",))
+ADMISSION_QUEUE_WAIT = metrics.histogram("cdss_admission_queue_wait_seconds", "Time admitted analysis requests waited for a slot")
+app.add_middleware(RequestMetricsMiddleware, requests=HTTP_REQUESTS, latency=HTTP_LATENCY, in_flight=HTTP_IN_FLIGHT)
+
+@contextmanager
+def stage(name: str):
+    """
+    Times one analysis stage into cdss_stage_duration_seconds (and the
+    request's profile, if it is profiled); failures also count in
+    cdss_stage_errors_total.
+    """
+    started = time.perf_counter()
+    try:
+        with profile_stage(name):
+            yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=name)
+
 # --- CONFIG ---
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 logger.info(f"🔧 Using device: {device}")
@@ -54,106 +134,334 @@ if torch.cuda.is_available():
 else:
     logger.warning("⚠️  CUDA not available - Running on CPU (slower inference)")
 
-# --- MODEL DEFINITION ---
-class MRNetModel(nn.Module):
-    def __init__(self):
-        super().__init__()
-        self.backbone = models.resnet18(pretrained=False)
-        self.backbone.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(512, 1))
-    def forward(self, x):
-        return self.backbone(x)
+# DICOM download settings (shared keep-alive pool, see dicom_fetch.py)
+DICOM_FETCH_TIMEOUT = float(os.getenv("DICOM_FETCH_TIMEOUT", "30"))
+DICOM_FETCH_PER_HOST_LIMIT = int(os.getenv("DICOM_FETCH_PER_HOST_LIMIT", "6"))
+DICOM_FETCH_MAX_RETRIES = int(os.getenv("DICOM_FETCH_MAX_RETRIES", "2"))
+DICOM_FETCH_MAX_MB = float(os.getenv("DICOM_FETCH_MAX_MB", "256"))
+
+# Run all task models as one grouped-convolution network (see fused_inference.py)
+FUSED_INFERENCE = os.getenv("FUSED_INFERENCE", "1") == "1"
+
+# Inference runtime: eager, torchscript, compile, onnx or int8 (see inference_backends.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager").lower()
+BACKEND_CHECK_ATOL = float(os.getenv("BACKEND_CHECK_ATOL", INT8_CHECK_ATOL if INFERENCE_BACKEND == "int8" else CHECK_ATOL))
+
+# CPU precision: fp32, channels_last or bf16 (see cpu_precision.py); ignored on CUDA
+CPU_PRECISION = os.getenv("CPU_PRECISION", "fp32").lower()
+if CPU_PRECISION not in CPU_PRECISIONS:
+    logger.warning(f"⚠️  Unknown CPU_PRECISION '{CPU_PRECISION}', using 'fp32'")
+    CPU_PRECISION = "fp32"
+PRECISION_CHECK_ATOL = float(os.getenv("PRECISION_CHECK_ATOL", "0.02"))
+
+# Startup: map checkpoints instead of reading them (CPU), and optionally load
+# the models in the background after the server is up (requests wait for them)
+MMAP_WEIGHTS = os.getenv("MMAP_WEIGHTS", "1") == "1"
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0") == "1"
+
+# Warm-up before /ready reports ready: synthetic studies through preprocessing,
+# the models (at each batch size) and the heatmap path
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "2"))
+WARMUP_BATCH_SIZES = [int(b) for b in os.getenv("WARMUP_BATCH_SIZES", "1").split(",") if b.strip()]
+
+# Model versions: JSON manifest of task -> checkpoint (re-read by POST /models/reload),
+# whether the replaced version stays loaded for rollback, and the token the
+# /models admin endpoints require (empty = the endpoints are disabled)
+MODEL_MANIFEST = os.getenv("MODEL_MANIFEST", "models/manifest.json")
+MODEL_KEEP_PREVIOUS = os.getenv("MODEL_KEEP_PREVIOUS", "1") == "1"
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+
+# Per-request profiling ({"profile": true} on /analyze, see profiling.py): allowed
+# for every caller with PROFILING=1 (debug deployments), otherwise only with an
+# X-Profile-Token matching PROFILING_TOKEN (empty = nobody)
+PROFILING = os.getenv("PROFILING", "0") == "1"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_TOP_OPS = int(os.getenv("PROFILING_TOP_OPS", "15"))
+
+# Admission control in front of the analysis endpoints (see admission.py): studies
+# analyzed at once (0 = no limit), studies allowed to wait for a slot (more get
+# 429), and the request deadline in seconds, which callers can shorten with an
+# X-Request-Timeout header (no slot by then: 503). Limits apply per worker.
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_DEADLINE_SECONDS = float(os.getenv("ADMISSION_DEADLINE_SECONDS", "60"))
+admission = (
+    AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE)
+    if ADMISSION_MAX_CONCURRENT > 0 else None
+)
+
+# POST /analyze/batch: most studies per request, studies of one batch analyzed at
+# once (they share the download pool and micro-batches like separate requests),
+# and how often a study retries admission after a 429/503 before it is reported failed
+BATCH_MAX_STUDIES = int(os.getenv("BATCH_MAX_STUDIES", "500"))
+BATCH_CONCURRENCY = max(1, int(os.getenv("BATCH_CONCURRENCY", "4")))
+BATCH_ADMISSION_RETRIES = int(os.getenv("BATCH_ADMISSION_RETRIES", "3"))
+
+# Heatmap method: 'cam' (from the inference pass, no extra forward/backward) or 'gradcam'
+HEATMAP_METHOD = os.getenv("HEATMAP_METHOD", "cam").lower()
+if HEATMAP_METHOD not in HEATMAP_METHODS:
+    logger.warning(f"⚠️  Unknown HEATMAP_METHOD '{HEATMAP_METHOD}', using 'cam'")
+    HEATMAP_METHOD = "cam"
+
+# Heatmap encoding: inline /analyze heatmaps stay base64 PNG (what the frontend
+# renders); GET /heatmap/{id}/image serves raw PNG/JPEG/WebP bytes
+HEATMAP_ENCODER = os.getenv("HEATMAP_ENCODER", "cv2").lower()
+if HEATMAP_ENCODER not in HEATMAP_ENCODERS:
+    logger.warning(f"⚠️  Unknown HEATMAP_ENCODER '{HEATMAP_ENCODER}', using 'cv2'")
+    HEATMAP_ENCODER = "cv2"
+HEATMAP_PNG_COMPRESSION = int(os.getenv("HEATMAP_PNG_COMPRESSION", "6"))
+HEATMAP_IMAGE_FORMAT = os.getenv("HEATMAP_IMAGE_FORMAT", "png").lower()
+HEATMAP_IMAGE_QUALITY = int(os.getenv("HEATMAP_IMAGE_QUALITY", "85"))
+
+# Deferred heatmaps served from /heatmap/{id}
+HEATMAP_STORE_MAX_MB = float(os.getenv("HEATMAP_STORE_MAX_MB", "128"))
+HEATMAP_STORE_TTL_SECONDS = float(os.getenv("HEATMAP_STORE_TTL_SECONDS", "900"))
+HEATMAP_PRECOMPUTE = os.getenv("HEATMAP_PRECOMPUTE", "1") == "1"
+
+# Micro-batching across concurrent requests (see inference_scheduler.py)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "1") == "1"
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+
+# CPU-bound request stages (DICOM parsing and decoding, preprocessing, unbatched
+# forwards, heatmap rendering and encoding) run on this many threads, never on the
+# event loop; micro-batched forwards keep their own thread (inference_scheduler.py)
+CPU_EXECUTOR_WORKERS = max(1, int(os.getenv("CPU_EXECUTOR_WORKERS", "2")))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu-stage")
+
+# Largest accepted multipart upload for /analyze/upload
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "256"))
+
+# Full-volume mode: slices per forward pass and logit pooling (see volume_inference.py)
+VOLUME_CHUNK_SIZE = int(os.getenv("VOLUME_CHUNK_SIZE", "16"))
+VOLUME_POOLING = os.getenv("VOLUME_POOLING", "max").lower()
+if VOLUME_POOLING not in POOLING_METHODS:
+    logger.warning(f"⚠️  Unknown VOLUME_POOLING '{VOLUME_POOLING}', using 'max'")
+    VOLUME_POOLING = "max"
+
+# Preprocessed slice cache, keyed by slice content hash (0 disables)
+SLICE_CACHE_MAX_MB = float(os.getenv("SLICE_CACHE_MAX_MB", "256"))
+slice_cache = SliceCache(int(SLICE_CACHE_MAX_MB * 1e6)) if SLICE_CACHE_MAX_MB > 0 else None
+
+# Full analysis result cache keyed by study fingerprint (0 disables)
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "600"))
+result_cache = (
+    ResultCache(int(RESULT_CACHE_MAX_MB * 1e6), ttl_seconds=RESULT_CACHE_TTL_SECONDS)
+    if RESULT_CACHE_MAX_MB > 0 else None
+)
+# Concurrent identical studies share one computation
+study_flights = SingleFlight()
+
+dicom_fetcher = DicomFetcher(
+    timeout=DICOM_FETCH_TIMEOUT,
+    per_host_limit=DICOM_FETCH_PER_HOST_LIMIT,
+    max_retries=DICOM_FETCH_MAX_RETRIES,
+    max_bytes=int(DICOM_FETCH_MAX_MB * 1e6),
+)
 
 # --- LOAD MODELS ---
-models_dict = {}
+# Default checkpoints; a MODEL_MANIFEST file overrides them (see model_registry.py).
+# The first set is built by load_inference_engine(): at import time, or in the
+# background once the server is up with LAZY_STARTUP=1
 MODEL_PATHS = {
     'acl': 'models/acl_model.pth',
     'meniscus': 'models/meniscus_model.pth',
     'abnormal': 'models/abnormal_model.pth'
 }
+MODELS_DIR = "models"
+engine_loaded = False
+models_loading: Optional[asyncio.Future] = None  # Background load (LAZY_STARTUP=1)
+_engine_lock = threading.Lock()
 
-for task, path in MODEL_PATHS.items():
+def read_model_specs() -> Dict[str, ModelSpec]:
+    """Task checkpoints and versions from MODEL_MANIFEST, or MODEL_PATHS without one."""
     try:
-        model = MRNetModel().to(device)
-        model.load_state_dict(torch.load(path, map_location=device, weights_only=True))
-        model.eval()
-        # Ensure model stays on correct device
-        model = model.to(device)
-        models_dict[task] = model
-        logger.info(f"✅ Loaded {task} model from {path} → {device}")
-    except FileNotFoundError:
-        logger.warning(f"⚠️  Model file not found: {path}")
+        entries = read_manifest(MODEL_MANIFEST, MODEL_PATHS)
+    except ValueError as e:
+        logger.error(f"❌ {str(e)}, using the default model paths")
+        entries = MODEL_PATHS
+    return resolve_specs(entries)
+
+def load_models(specs: Dict[str, ModelSpec], reuse: Optional[ModelSet] = None) -> Dict[str, nn.Module]:
+    """
+    Loads the task checkpoints. Models whose spec matches the one in reuse
+    (the active set, on reload) are carried over instead of loaded again.
+    """
+    models = {}
+    for task, spec in specs.items():
+        if reuse is not None and reuse.specs.get(task) == spec and task in reuse.models:
+            models[task] = reuse.models[task]
+            logger.info(f"♻️  Keeping {task} model {spec.version}")
+            continue
+        try:
+            models[task] = load_mrnet(spec.path, device, mmap=MMAP_WEIGHTS)
+            logger.info(f"✅ Loaded {task} model {spec.version} from {spec.path} → {device}")
+        except FileNotFoundError:
+            logger.warning(f"⚠️  Model file not found: {spec.path}")
+        except Exception as e:
+            logger.error(f"❌ Failed to load {task} model: {str(e)}")
+
+    if not models:
+        logger.error("❌ No models loaded! AI service will not function properly.")
+    else:
+        logger.info(f"✅ Successfully loaded {len(models)} model(s)")
+        if torch.cuda.is_available():
+            allocated = torch.cuda.memory_allocated(0) / 1e6
+            cached = torch.cuda.memory_reserved(0) / 1e6
+            logger.info(f"💾 GPU Memory: {allocated:.1f} MB allocated, {cached:.1f} MB cached")
+    return models
+
+# --- FUSED MULTI-TASK ENGINE ---
+def build_fused_model(models: Dict[str, nn.Module]) -> Optional[FusedMRNet]:
+    if not (FUSED_INFERENCE and len(models) > 1):
+        return None
+    try:
+        fused_model = FusedMRNet(models).to(device).eval()
+        max_delta = verify_fused_model(fused_model, models, device)
+        logger.info(f"✅ Fused {len(models)} models into one pass (max prob delta: {max_delta:.2e})")
+        return fused_model
     except Exception as e:
-        logger.error(f"❌ Failed to load {task} model: {str(e)}")
+        logger.error(f"❌ Fused model disabled, falling back to per-model inference: {str(e)}")
+        return None
 
-if not models_dict:
-    logger.error("❌ No models loaded! AI service will not function properly.")
-else:
-    logger.info(f"✅ Successfully loaded {len(models_dict)} model(s)")
-    if torch.cuda.is_available():
-        allocated = torch.cuda.memory_allocated(0) / 1e6
-        cached = torch.cuda.memory_reserved(0) / 1e6
-        logger.info(f"💾 GPU Memory: {allocated:.1f} MB allocated, {cached:.1f} MB cached")
+# --- INFERENCE BACKEND ---
+def build_inference_backend(model_set: ModelSet):
+    """Sets the eager engine and the INFERENCE_BACKEND backend (self-checked) of a model set."""
+    model_set.engine = model_set.fused if model_set.fused is not None else TaskEnsemble(model_set.models).eval()
+    engine = model_set.engine
+    if uses_channels_last(model_set.precision):
+        # Before load_backend, so backends built in memory (compile, or a trace/export
+        # when no artifact is found) pick up the NHWC weights; artifacts loaded from
+        # disk keep the layout they were exported with
+        to_channels_last([engine, *model_set.models.values()])
+    checkpoint_paths = [model_set.specs[task].path for task in engine.tasks]
+    try:
+        backend = load_backend(
+            INFERENCE_BACKEND, engine, device, models_dir=MODELS_DIR, checkpoint_paths=checkpoint_paths
+        )
+        if backend.name != "eager":
+            # Self-check against eager PyTorch
+            model_set.backend_check_delta = verify_backend(backend, engine, device, atol=BACKEND_CHECK_ATOL)
+            logger.info(f"✅ {backend.name} backend matches eager (max prob delta: {model_set.backend_check_delta:.2e})")
+    except Exception as e:
+        logger.error(f"❌ {INFERENCE_BACKEND} backend unavailable, falling back to eager: {str(e)}")
+        backend = load_backend("eager", engine, device)
+    if backend.name == "eager" and isinstance(engine, TaskEnsemble):
+        engine.on_forward = observe_task_forward  # Per-task forward times for /metrics
+    if worker_identity.count > 1:
+        backend.set_num_threads(torch.get_num_threads())  # Reloaded inside a serve.py worker
+    model_set.backend = backend
+    logger.info(f"⚙️  Inference backend: {backend.name}")
 
-# --- HELPER: PROCESS SINGLE DICOM SLICE ---
-def process_dicom(file_bytes: bytes) -> tuple:
+def check_cpu_precision(model_set: ModelSet):
+    backend_name = model_set.backend.name
+    if model_set.precision == "bf16" and backend_name not in ("eager", "compile"):
+        logger.warning(f"⚠️  bf16 autocast does not apply to the {backend_name} backend, using channels_last")
+        model_set.precision = "channels_last"
+    if model_set.precision == "bf16":
+        try:
+            model_set.precision_check_delta = verify_precision(
+                model_set.engine, model_set.precision, device, atol=PRECISION_CHECK_ATOL
+            )
+            logger.info(f"✅ bf16 matches fp32 (max prob delta: {model_set.precision_check_delta:.2e})")
+        except Exception as e:
+            logger.error(f"❌ bf16 disabled, using channels_last fp32: {str(e)}")
+            model_set.precision = "channels_last"
+    if device.type == "cpu":
+        logger.info(f"⚙️  CPU precision: {model_set.precision}")
+
+def build_model_set(specs: Dict[str, ModelSpec], reuse: Optional[ModelSet], phases: StartupPhases) -> ModelSet:
+    """
+    Loads the checkpoints, then builds the fused engine and the inference
+    backend, timing each phase in phases.
+    
+    Args:
+        specs: Task checkpoints and versions
+        reuse: Set to carry unchanged task models over from (reloads)
+        phases: Where the load_weights/fuse/backend/precision_check times go
     """
-    Reads DICOM bytes for a single sagittal slice, converts to 1-channel tensor.
+    with phases.phase("load_weights"):
+        models = load_models(specs, reuse)
+    model_set = ModelSet(
+        specs={task: specs[task] for task in models},
+        models=models,
+        precision=resolve_precision(CPU_PRECISION, device)
+    )
+    if models:
+        with phases.phase("fuse"):
+            model_set.fused = build_fused_model(models)
+        with phases.phase("backend"):
+            build_inference_backend(model_set)
+        with phases.phase("precision_check"):
+            check_cpu_precision(model_set)
+    return model_set
+
+def load_inference_engine():
+    """
+    Builds and installs the first model set, timing each phase in
+    startup_phases. Runs once; later calls return immediately (new versions
+    go through model_registry.reload).
+    """
+    global engine_loaded
+    with _engine_lock:
+        if engine_loaded:
+            return
+        model_registry.load(read_model_specs(), startup_phases)
+        engine_loaded = True
+        startup_phases.mark("models_ready")
+
+def active_models() -> Optional[ModelSet]:
+    """The live model set. Read it once per request and use that reference throughout."""
+    return model_registry.active
+
+# --- CPU EXECUTOR ---
+cpu_tasks = 0  # Stages queued or running on cpu_executor (only touched on the event loop)
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Runs a CPU-bound stage on cpu_executor and awaits it, so the event loop
+    keeps serving other requests meanwhile. The stage runs in a copy of the
+    caller's context (profile, deadline).
+    """
+    global cpu_tasks
+    cpu_tasks += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            cpu_executor, contextvars.copy_context().run, functools.partial(func, *args, **kwargs)
+        )
+    finally:
+        cpu_tasks -= 1
+
+# --- HELPER: PROCESS DICOM SLICES ---
+def process_dicom_slices(decode: SliceDecoder, positions: list[int]) -> tuple:
+    """
+    Decodes the sagittal slices of a study at the given positions and
+    converts them to model tensors in one batched pass (see preprocessing.py).
     Uses the same preprocessing pipeline as training for maximum accuracy.
     
     Args:
-        file_bytes: Raw DICOM file bytes
+        decode: Returns the raw 2D pixel arrays for a list of positions
+            (slice_decoder for 2D slice files, volume_decoder for a volume)
+        positions: Positions of the slices within the study
         
     Returns:
-        tuple: (input_tensor, visual_img_array)
-            - input_tensor: Float32 tensor for AI model (1, 1, 256, 256)
-            - visual_img_array: Uint8 array for heatmap visualization (H, W)
+        tuple: (tensor, visual_imgs)
+            - tensor: Float32 tensor for AI model (1, N, 256, 256) on device
+            - visual_imgs: Uint8 arrays for heatmap visualization (H, W)
         
     Raises:
         HTTPException: If DICOM processing fails
     """
     try:
-        ds = pydicom.dcmread(io.BytesIO(file_bytes))
-        # 1. Keep as FLOAT32 (Crucial for precision - matches training)
-        pixel_array = ds.pixel_array.astype(np.float32)
-        
-        logger.info(f"📊 DICOM shape: {pixel_array.shape}, dtype: {pixel_array.dtype}")
-        
-        # 2. Expect 2D DICOM (single slice)
-        if len(pixel_array.shape) != 2:
-            raise ValueError(f"Expected 2D DICOM slice, got shape: {pixel_array.shape}")
-        
-        # --- PATH A: FOR AI MODEL (High Precision) ---
-        # Convert directly to Tensor without rounding to 0-255 uint8
-        tensor = torch.from_numpy(pixel_array)
-        
-        # Add channel dimension: (H, W) -> (1, H, W)
-        tensor = tensor.unsqueeze(0)
-        
-        # Exact Normalization from Training: (x - min) / (max - min)
-        if tensor.max() > tensor.min():
-            tensor = (tensor - tensor.min()) / (tensor.max() - tensor.min())
-        else:
-            tensor = torch.zeros_like(tensor)
-
-        # Resize using Tensor method (preserves float precision)
-        # Note: We use antialias=True to match modern PIL resizing
-        resize_transform = transforms.Resize((256, 256), antialias=True)
-        tensor = resize_transform(tensor).unsqueeze(0).to(device)  # (1, 1, 256, 256)
-        
-        logger.info(f"✅ Tensor shape: {tensor.shape}, device: {tensor.device}, dtype: {tensor.dtype}")
-
-        # --- PATH B: FOR HEATMAP (Visual only) ---
-        # Create uint8 version just for heatmap generation
-        img_min, img_max = pixel_array.min(), pixel_array.max()
-        if img_max > img_min:
-            img_visual = ((pixel_array - img_min) / (img_max - img_min)) * 255.0
-        else:
-            img_visual = np.zeros_like(pixel_array)
-        img_visual = np.uint8(img_visual)
-        
-        logger.info(f"✅ Visual image range: [{img_visual.min()}, {img_visual.max()}]")
-
-        return tensor, img_visual
+        with stage("dicom_read"):
+            pixel_arrays = decode(positions)
+        with stage("preprocess"):
+            tensor, visual_imgs = preprocess_arrays(pixel_arrays)
+            tensor = tensor.unsqueeze(0).to(device)  # (1, N, 256, 256)
+        logger.info(f"✅ Preprocessed {len(positions)} slice(s): {tensor.shape}, device: {tensor.device}")
+        return tensor, visual_imgs
         
     except pydicom.errors.InvalidDicomError as e:
         logger.error(f"❌ Invalid DICOM file: {str(e)}")
@@ -162,26 +470,96 @@ def process_dicom(file_bytes: bytes) -> tuple:
         logger.error(f"❌ DICOM processing error: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"DICOM processing failed: {str(e)}")
 
+def process_dicom(file_bytes: bytes) -> tuple:
+    """
+    Single-slice variant of process_dicom_slices.
+    
+    Returns:
+        tuple: (input_tensor (1, 1, 256, 256), visual_img_array (H, W))
+    """
+    tensor, visual_imgs = process_dicom_slices(slice_decoder([file_bytes]), [0])
+    return tensor, visual_imgs[0]
+
+def open_dicom_volume(file_bytes: bytes) -> tuple:
+    """
+    Parses a multi-frame DICOM volume and picks the slices to analyze
+    (middle slice ± 1), without decoding any pixel data yet.
+    
+    Returns:
+        tuple: (dataset, slice_indices)
+        
+    Raises:
+        HTTPException: 400 if the file is not a usable DICOM volume
+    """
+    try:
+        with stage("dicom_parse"):
+            ds = open_volume(file_bytes)
+    except (pydicom.errors.InvalidDicomError, ValueError) as e:
+        logger.error(f"❌ Invalid DICOM volume: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid DICOM volume: {str(e)}")
+    indices = volume_slice_indices(ds)
+    logger.info(f"🎯 Volume with {volume_frame_count(ds)} frames, analyzing slices: {indices}")
+    return ds, indices
+
+# --- HELPER: LOAD SLICES (CACHED) ---
+def load_slices(decode: SliceDecoder, slice_keys: list[str]) -> tuple:
+    """
+    Returns the stacked model tensor (1, N, 256, 256) and visual images for
+    a study, decoding and preprocessing only the slices missing from the
+    slice cache (all of them together) and caching the new ones.
+    
+    Args:
+        decode: Returns the raw 2D pixel arrays for a list of positions
+        slice_keys: Cache key of each slice (content hash, or volume hash + frame)
+    """
+    positions = list(range(len(slice_keys)))
+    if slice_cache is None or current_profile() is not None:  # A profile measures the decode
+        return process_dicom_slices(decode, positions)
+    
+    cached = [slice_cache.get(key) for key in slice_keys]
+    missing = [i for i, entry in enumerate(cached) if entry is None]
+    if len(missing) < len(slice_keys):
+        logger.info(f"♻️  Slice cache hits: {len(slice_keys) - len(missing)}/{len(slice_keys)}")
+    
+    if missing:
+        tensor, visual_imgs = process_dicom_slices(decode, missing)
+        if len(missing) == len(slice_keys):
+            for i in missing:
+                # Own copy per slice, so the entry's size matches what it keeps alive
+                slice_cache.put(slice_keys[i], (tensor[:, i:i + 1].clone(), visual_imgs[i]))
+            return tensor, visual_imgs
+        for j, i in enumerate(missing):
+            cached[i] = (tensor[:, j:j + 1].clone(), visual_imgs[j])
+            slice_cache.put(slice_keys[i], cached[i])
+    
+    input_tensor = torch.cat([entry[0] for entry in cached], dim=1)
+    return input_tensor, [entry[1] for entry in cached]
+
 # --- HELPER: GENERATE HEATMAP ---
-def generate_heatmap(model: nn.Module, tensor: torch.Tensor, original_img: np.ndarray) -> str:
+def render_heatmap(model: nn.Module, tensor: Optional[torch.Tensor], original_img: np.ndarray,
+                   cam: Optional[np.ndarray] = None) -> np.ndarray:
     """
-    Generates Grad-CAM heatmap visualization.
+    Renders a class activation heatmap overlay.
     
     Args:
         model: PyTorch model
-        tensor: Input tensor (1, 3, 256, 256)
+        tensor: Input tensor (1, 3, 256, 256), only needed for Grad-CAM
         original_img: Original image array (H, W) grayscale
+        cam: Coarse CAM (h, w) captured during inference. If None, falls
+            back to Grad-CAM (extra forward + backward through the model)
         
     Returns:
-        Base64 encoded PNG image string
+        RGB uint8 overlay (256, 256, 3)
     """
-    try:
-        target_layers = [model.backbone.layer4[-1]]
-        cam = GradCAM(model=model, target_layers=target_layers)
-        
-        # Generate CAM
-        grayscale_cam = cam(input_tensor=tensor, targets=[ClassifierOutputTarget(0)])[0, :]
-        
+    # Generate CAM
+    if cam is not None:
+        with stage("cam_upsample"):
+            grayscale_cam = upsample_cam(cam, (256, 256))
+    else:
+        with stage("gradcam"):
+            grayscale_cam = grad_cam(model, tensor)
+    
+    with stage("heatmap_overlay"):
         # Resize original image to match tensor size (256x256) and convert to RGB
         original_resized = cv2.resize(original_img, (256, 256))
         
@@ -192,13 +570,37 @@ def generate_heatmap(model: nn.Module, tensor: torch.Tensor, original_img: np.nd
         original_normalized = original_rgb.astype(np.float32) / 255.0
         
         # Overlay heatmap on original image
-        visualization = show_cam_on_image(original_normalized, grayscale_cam, use_rgb=True)
+        return overlay_cam(original_normalized, grayscale_cam)
+
+def encode_heatmap_base64(visualization: np.ndarray) -> str:
+    """Encodes an overlay as the base64 PNG string the frontend expects."""
+    with stage("heatmap_encode"):
+        png_bytes = encode_heatmap(
+            visualization, "png", quality=HEATMAP_PNG_COMPRESSION, encoder=HEATMAP_ENCODER
+        )
+        base64_str = base64.b64encode(png_bytes).decode("utf-8")
+    HEATMAP_BYTES.inc(len(base64_str), format="png_base64")
+    return base64_str
+
+def generate_heatmap(model: nn.Module, tensor: Optional[torch.Tensor], original_img: np.ndarray,
+                     cam: Optional[np.ndarray] = None) -> str:
+    """
+    Generates a class activation heatmap visualization.
+    
+    Args:
+        model: PyTorch model
+        tensor: Input tensor (1, 3, 256, 256), only needed for Grad-CAM
+        original_img: Original image array (H, W) grayscale
+        cam: Coarse CAM (h, w) captured during inference (None = Grad-CAM)
+        
+    Returns:
+        Base64 encoded PNG image string
+    """
+    try:
+        visualization = render_heatmap(model, tensor, original_img, cam)
         
         # Convert to Base64 string to send to Frontend
-        img = Image.fromarray(visualization)
-        buff = io.BytesIO()
-        img.save(buff, format="PNG")
-        base64_str = base64.b64encode(buff.getvalue()).decode("utf-8")
+        base64_str = encode_heatmap_base64(visualization)
         
         logger.info(f"✅ Generated heatmap (size: {len(base64_str)} chars)")
         
@@ -208,9 +610,133 @@ def generate_heatmap(model: nn.Module, tensor: torch.Tensor, original_img: np.nd
         logger.error(f"❌ Heatmap generation failed: {str(e)}")
         return ""  # Return empty string instead of crashing
 
+# --- HELPER: RUN MODELS ---
+@dataclass
+class ModelOutputs:
+    """Per-study inference results."""
+    probabilities: Dict[str, float]
+    cams: Optional[Dict[str, np.ndarray]] = None  # Coarse (h, w) CAM per task
+    model_set: Optional[ModelSet] = field(default=None, repr=False)  # Version that produced them
+
+def run_models(input_tensor: torch.Tensor, model_set: Optional[ModelSet] = None) -> list[ModelOutputs]:
+    """
+    Runs every loaded task model on a batch of stacked inputs.
+    
+    Runs on the configured inference backend (INFERENCE_BACKEND) around the
+    fused engine (one forward pass, one host sync) when available, otherwise
+    one forward per model over the whole batch. With HEATMAP_METHOD='cam',
+    layer4 activations from the same pass are turned into class activation
+    maps for every task.
+    
+    Args:
+        input_tensor: Stacked slices (B, 3, 256, 256)
+        model_set: Models to run (default: the active set)
+        
+    Returns:
+        One ModelOutputs per study
+    """
+    model_set = model_set or active_models()
+    backend, precision = model_set.backend, model_set.precision
+    with_cams = HEATMAP_METHOD == "cam"
+    batch_size = input_tensor.shape[0]
+    tasks = backend.tasks
+    with torch.no_grad():
+        logger.info(f"🧠 Running {'/'.join(tasks)} ({backend.name}) on {device} (batch: {batch_size})...")
+        with stage("inference"):
+            started = time.perf_counter()
+            with profile_forward(forward_label(model_set), backend.name):
+                with precision_autocast(precision, device):
+                    logits, features = backend.forward_features(prepare_input(input_tensor, precision))  # (B, T), (B, T, 512, h, w)
+                probs = torch.sigmoid(logits.float()).tolist()  # Host sync, so the forward has finished
+            observe_forward(model_set, time.perf_counter() - started)
+        # CAMs in fp32, outside autocast
+        fc_weight = backend.fc_weight
+        if with_cams:
+            with stage("cam"):
+                cams = compute_cams(features, fc_weight).cpu().numpy()
+        else:
+            cams = None
+    
+    return [
+        ModelOutputs(
+            probabilities=dict(zip(tasks, probs[i])),
+            cams=dict(zip(tasks, cams[i])) if cams is not None else None,
+            model_set=model_set
+        )
+        for i in range(batch_size)
+    ]
+
+def forward_label(model_set: ModelSet) -> str:
+    return "fused" if model_set.fused is not None else "ensemble"
+
+def observe_forward(model_set: ModelSet, seconds: float):
+    """Whole-engine forward time; the eager per-task engine reports each task itself (see build_inference_backend)."""
+    if model_set.fused is not None or model_set.backend.name != "eager":
+        MODEL_FORWARD.observe(seconds, model=forward_label(model_set), backend=model_set.backend.name)
+
+def observe_task_forward(task: str, seconds: float):
+    MODEL_FORWARD.observe(seconds, model=task, backend="eager")
+    profile = current_profile()
+    if profile is not None:
+        profile.task_forward(task, seconds)
+
+def model_logits(input_tensor: torch.Tensor, model_set: ModelSet) -> torch.Tensor:
+    """
+    Logits (B, T) of every task model of a set, without CAMs (full-volume
+    mode, one call per chunk). Columns follow model_set.backend.tasks.
+    Timed like run_models: an 'inference' stage and a model forward.
+    """
+    with torch.no_grad(), stage("inference"):
+        started = time.perf_counter()
+        with profile_forward(forward_label(model_set), model_set.backend.name):
+            with precision_autocast(model_set.precision, device):
+                logits = model_set.backend.forward_features(prepare_input(input_tensor, model_set.precision))[0]
+            logits = logits.float().cpu()  # Host sync, so the forward has finished
+        observe_forward(model_set, time.perf_counter() - started)
+    return logits
+
+# --- DEFERRED HEATMAPS ---
+def render_heatmap_job(job: HeatmapJob) -> np.ndarray:
+    """Renders a deferred heatmap overlay (runs on the heatmap store's executor)."""
+    model = job.model if job.model is not None else active_models().models[job.task]
+    return render_heatmap(model, job.input_tensor, job.original_img, job.cam)
+
+heatmap_store = HeatmapStore(
+    render_heatmap_job,
+    max_bytes=int(HEATMAP_STORE_MAX_MB * 1e6),
+    ttl_seconds=HEATMAP_STORE_TTL_SECONDS,
+    precompute=HEATMAP_PRECOMPUTE,
+    executor=cpu_executor,
+)
+
+inference_scheduler = None
+if INFERENCE_BATCHING:
+    inference_scheduler = MicroBatchScheduler(
+        run_models,
+        max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    )
+
 # --- REQUEST/RESPONSE MODELS ---
 class AnalysisRequest(BaseModel):
-    dicomUrls: list[str]  # Exactly 3 URLs for sagittal slices
+    dicomUrls: Optional[list[str]] = None  # Exactly 3 URLs for sagittal slices
+    volumeUrl: Optional[str] = None  # Or one multi-frame volume (middle slices are analyzed)
+    fullVolume: bool = False  # With volumeUrl: run every slice and pool the logits
+    pooling: Optional[str] = None  # Full-volume pooling, 'max' or 'mean' (default VOLUME_POOLING)
+    deferHeatmap: bool = False  # Return heatmap_id now, fetch from /heatmap/{id} later
+    profile: bool = False  # Add a per-stage/per-operator profile to metadata (PROFILING / X-Profile-Token)
+
+class BatchStudy(AnalysisRequest):
+    id: Optional[str] = None  # Caller's reference (e.g. case id), echoed on the study's result line
+
+class BatchAnalysisRequest(BaseModel):
+    studies: list[BatchStudy]
+    concurrency: Optional[int] = None  # Studies in flight at once (capped at BATCH_CONCURRENCY)
+
+class HeatmapResponse(BaseModel):
+    heatmap_id: str
+    model: str
+    heatmap: str  # Base64 encoded PNG
 
 class PredictionResult(BaseModel):
     probability: float
@@ -220,12 +746,29 @@ class AnalysisResponse(BaseModel):
     success: bool
     diagnosis: Optional[Dict[str, PredictionResult]] = None
     heatmap: Optional[list[str]] = None
+    heatmap_id: Optional[str] = None  # Set when the heatmap was deferred
     abnormal_detected: bool
     abnormal_probability: float
     threshold: float = 0.5
     metadata: Optional[Dict[str, Any]] = None
     message: Optional[str] = None
 
+def abnormal_probability(model_probabilities: Dict[str, float]) -> float:
+    """Abnormal model probability, or the max of ACL and Meniscus if it is not loaded."""
+    if 'abnormal' in model_probabilities:
+        return model_probabilities['abnormal']
+    # Fallback: use max of ACL and Meniscus if abnormal model not available
+    if 'acl' in model_probabilities and 'meniscus' in model_probabilities:
+        return max(
+            model_probabilities['acl'],
+            model_probabilities['meniscus']
+        )
+    elif 'acl' in model_probabilities:
+        return model_probabilities['acl']
+    elif 'meniscus' in model_probabilities:
+        return model_probabilities['meniscus']
+    return 0.0
+
 def get_confidence_level(probability: float) -> str:
     """Categorize prediction confidence."""
     if probability >= 0.8:
@@ -235,6 +778,119 @@ def get_confidence_level(probability: float) -> str:
     else:
         return "low"
 
+# --- WARM-UP ---
+@dataclass
+class WarmupStatus:
+    state: str  # pending, running, done, failed or disabled
+    duration_ms: Optional[float] = None
+    iteration_ms: list[float] = field(default_factory=list)  # Full synthetic study, per iteration
+    error: Optional[str] = None
+
+warmup_status = WarmupStatus(state="pending" if WARMUP else "disabled")
+warmup_task: Optional[asyncio.Task] = None
+
+def warm_up(model_set: ModelSet) -> list[float]:
+    """
+    Runs synthetic studies through the whole analysis path: batched
+    preprocessing, the inference backend at every WARMUP_BATCH_SIZES batch
+    size, and the heatmap render + encode for every task (Grad-CAM hooks
+    with HEATMAP_METHOD=gradcam). Allocator growth, cuDNN autotuning and
+    lazy kernel/library init happen here instead of on the first request.
+    Also run on every reloaded model set before it goes live.
+    
+    Returns:
+        Duration of each iteration (ms)
+    """
+    iteration_ms = []
+    rng = np.random.default_rng(0)
+    slices = [rng.integers(0, 4096, (256, 256), dtype=np.uint16) for _ in range(3)]
+    with metrics.pause():  # Synthetic studies stay out of /metrics
+        for _ in range(WARMUP_ITERATIONS):
+            started = time.perf_counter()
+            input_tensor, visual_imgs = preprocess_arrays(slices)
+            input_tensor = input_tensor.unsqueeze(0).to(device)
+            outputs = run_models(input_tensor, model_set)[0]
+            for batch_size in WARMUP_BATCH_SIZES:
+                if batch_size > 1:
+                    run_models(input_tensor.expand(batch_size, -1, -1, -1).contiguous(), model_set)
+            for task, model in model_set.models.items():
+                cam = outputs.cams.get(task) if outputs.cams else None
+                visualization = render_heatmap(model, input_tensor, visual_imgs[1], cam)
+                encode_heatmap_base64(visualization)
+                encode_heatmap(visualization, HEATMAP_IMAGE_FORMAT, quality=HEATMAP_IMAGE_QUALITY, encoder=HEATMAP_ENCODER)
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            iteration_ms.append(round((time.perf_counter() - started) * 1000, 1))
+    return iteration_ms
+
+async def run_warmup():
+    """Waits for the models (LAZY_STARTUP), then warms up on the default executor."""
+    if models_loading is not None:
+        await models_loading
+    model_set = active_models()
+    if model_set is None or not model_set.models:
+        warmup_status.state = "failed"
+        warmup_status.error = "No models loaded"
+        return
+    warmup_status.state = "running"
+    started = time.perf_counter()
+    try:
+        with startup_phases.phase("warmup"):
+            warmup_status.iteration_ms = await asyncio.get_running_loop().run_in_executor(None, warm_up, model_set)
+        warmup_status.state = "done"
+        logger.info(f"🔥 Warm-up done in {(time.perf_counter() - started):.2f}s "
+                    f"(per iteration: {', '.join(f'{ms:.0f} ms' for ms in warmup_status.iteration_ms)})")
+    except Exception as e:
+        # Serve anyway: a failed warm-up only means a slower first request
+        warmup_status.state = "failed"
+        warmup_status.error = str(e)
+        logger.error(f"❌ Warm-up failed: {str(e)}\n{traceback.format_exc()}")
+    warmup_status.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    startup_phases.mark("warm")
+
+def readiness() -> tuple[bool, str]:
+    """(ready, phase): ready once the models are loaded and warm-up has finished."""
+    if not engine_loaded:
+        return False, "loading"
+    if not active_models().models:
+        return False, "no_models"
+    if warmup_status.state in ("pending", "running"):
+        return False, "warming_up"
+    return True, "ready"
+
+# --- MODEL REGISTRY ---
+model_registry = ModelRegistry(
+    build_model_set,
+    warm_up=warm_up if WARMUP else None,
+    keep_previous=MODEL_KEEP_PREVIOUS,
+)
+
+if not LAZY_STARTUP:
+    load_inference_engine()
+
+# --- LIFECYCLE ---
+@app.on_event("startup")
+async def startup():
+    global models_loading, warmup_task
+    if LAZY_STARTUP and not engine_loaded:
+        models_loading = asyncio.get_running_loop().run_in_executor(None, load_inference_engine)
+    if WARMUP:
+        warmup_task = asyncio.create_task(run_warmup())
+    startup_phases.mark("server_ready")
+    await dicom_fetcher.start()
+    await heatmap_store.start()
+    if inference_scheduler is not None:
+        await inference_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await dicom_fetcher.close()
+    await heatmap_store.stop()
+    if inference_scheduler is not None:
+        await inference_scheduler.stop()
+
 # --- HEALTH CHECK ---
 @app.get("/")
 async def root():
@@ -243,180 +899,914 @@ async def root():
         "service": "CDSS AI Service",
         "status": "running",
         "device": str(device),
-        "models_loaded": list(models_dict.keys()),
+        "models_loaded": list(active_models().models) if active_models() is not None else [],
         "version": "1.0.0"
     }
 
 @app.get("/health")
 async def health_check():
     """Detailed health check."""
+    model_set = active_models()
+    models = model_set.models if model_set is not None else {}
+    backend = model_set.backend if model_set is not None else None
     return {
-        "status": "healthy" if models_dict else "degraded",
+        "status": "loading" if not engine_loaded else "healthy" if models else "degraded",
         "models": {
-            task: "loaded" for task in models_dict.keys()
+            task: "loaded" for task in models
         },
+        "model_versions": model_set.versions if model_set is not None else {},
         "device": str(device),
-        "cuda_available": torch.cuda.is_available()
+        "cuda_available": torch.cuda.is_available(),
+        "inference_backend": {
+            **backend.info(),
+            "requested": INFERENCE_BACKEND,
+            "self_check_max_delta": model_set.backend_check_delta
+        } if backend is not None else None,
+        "cpu_precision": {
+            **precision_info(CPU_PRECISION, model_set.precision if model_set is not None
+                             else resolve_precision(CPU_PRECISION, device)),
+            "self_check_max_delta": model_set.precision_check_delta if model_set is not None else None
+        } if device.type == "cpu" else None,
+        "admission": admission.stats() if admission is not None else None,
+        "cpu_executor": {"max_workers": CPU_EXECUTOR_WORKERS, "tasks": cpu_tasks},
+        "inference_scheduler": inference_scheduler.stats() if inference_scheduler is not None else None,
+        "slice_cache": slice_cache.stats() if slice_cache is not None else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "coalescing": study_flights.stats(),
+        "heatmap_store": heatmap_store.stats(),
+        "worker": worker_info(),
+        "startup": {
+            **startup_phases.as_dict(),
+            "lazy": LAZY_STARTUP,
+            "mmap_weights": MMAP_WEIGHTS
+        },
+        "warmup": warmup_info()
+    }
+
+def warmup_info() -> Dict[str, Any]:
+    return {
+        "state": warmup_status.state,
+        "duration_ms": warmup_status.duration_ms,
+        "iteration_ms": warmup_status.iteration_ms,
+        "batch_sizes": WARMUP_BATCH_SIZES,
+        "error": warmup_status.error
     }
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """
+    Readiness probe: 503 until the models are loaded and warm-up has
+    finished, then 200. Point the orchestrator's readiness check here and
+    its liveness check at /health.
+    """
+    ready, phase = readiness()
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "phase": phase, "warmup": warmup_info()}
+
+def _mb_to_bytes(megabytes: Optional[float]) -> Optional[float]:
+    return round(megabytes * 1e6) if megabytes is not None else None
+
+def _last_reload(key: str) -> Optional[float]:
+    reloads = [report for report in model_registry.history if report.action == "reload"]
+    if not reloads:
+        return None
+    if key == "overlap":
+        return _mb_to_bytes(reloads[-1].memory_mb.get("overlap"))
+    return round(reloads[-1].total_ms / 1000, 4)
+
+metrics.gauge("cdss_process_resident_memory_bytes", "Resident set size",
+              function=lambda: _mb_to_bytes(recent_process_memory().get("rss_mb")))
+metrics.gauge("cdss_process_proportional_memory_bytes", "Proportional set size (shared pages split between workers)",
+              function=lambda: _mb_to_bytes(recent_process_memory().get("pss_mb")))
+if torch.cuda.is_available():
+    metrics.gauge("cdss_cuda_memory_allocated_bytes", "CUDA memory allocated by tensors",
+                  function=lambda: torch.cuda.memory_allocated())
+metrics.gauge("cdss_admission_active", "Analysis requests holding an admission slot",
+              function=lambda: admission.active if admission is not None else None)
+metrics.gauge("cdss_admission_queue_depth", "Analysis requests waiting for an admission slot",
+              function=lambda: admission.queued if admission is not None else None)
+metrics.gauge("cdss_cpu_executor_tasks", "CPU-bound request stages queued or running on the CPU executor",
+              function=lambda: cpu_tasks)
+metrics.gauge("cdss_ready", "1 once /ready returns 200", function=lambda: float(readiness()[0]))
+metrics.gauge("cdss_warmup_duration_seconds", "Duration of the startup warm-up",
+              function=lambda: round(warmup_status.duration_ms / 1000, 4) if warmup_status.duration_ms is not None else None)
+metrics.gauge("cdss_startup_phase_seconds", "Startup phase durations", ("phase",),
+              function=lambda: {(name,): round(ms / 1000, 4) for name, ms in startup_phases.as_dict()["phases_ms"].items()})
+metrics.gauge("cdss_model_info", "Active model version per task (value is always 1)", ("task", "version"),
+              function=lambda: {(task, version): 1.0 for task, version in active_models().versions.items()}
+              if active_models() is not None else {})
+metrics.gauge("cdss_model_generation", "Generation of the active model set (increments on every reload)",
+              function=lambda: active_models().generation if active_models() is not None else None)
+metrics.gauge("cdss_model_reload_duration_seconds", "Duration of the last model reload, warm-up included",
+              function=lambda: _last_reload("duration"))
+metrics.gauge("cdss_model_reload_overlap_bytes", "Extra RSS held while the last reload had both versions loaded",
+              function=lambda: _last_reload("overlap"))
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint: per-stage and per-model latency, request/error/byte counters, memory."""
+    const_labels = {"worker": str(worker_identity.index)} if worker_identity.count > 1 else None
+    return Response(content=metrics.render(const_labels), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# --- STUDY INPUTS ---
+@dataclass
+class StudyInput:
+    """The 3 sagittal slices of a study, decoded on demand."""
+    decode: SliceDecoder
+    slice_keys: list[str]  # Slice cache keys, also fingerprint the study
+    metadata: Dict[str, Any]  # Input-specific response metadata
+
+def slices_study(slices: list[bytes], slice_keys: Optional[list[str]] = None) -> StudyInput:
+    """Study sent as 3 separate 2D DICOM slices (slice_keys: precomputed content hashes)."""
+    return StudyInput(
+        decode=slice_decoder(slices),
+        slice_keys=slice_keys or [content_hash(file_bytes) for file_bytes in slices],
+        metadata={'total_file_size_bytes': sum(len(file_bytes) for file_bytes in slices)}
+    )
+
+def volume_study(volume_bytes: bytes, volume_key: Optional[str] = None) -> StudyInput:
+    """Study sent as one multi-frame volume; only the middle frames are decoded."""
+    ds, indices = open_dicom_volume(volume_bytes)
+    volume_key = volume_key or content_hash(volume_bytes)
+    return StudyInput(
+        decode=volume_decoder(ds, indices),
+        slice_keys=[f"{volume_key}:{index}" for index in indices],
+        metadata={
+            'total_file_size_bytes': len(volume_bytes),
+            'volume_frames': volume_frame_count(ds),
+            'slice_indices': indices
+        }
+    )
+
 # --- MAIN ANALYSIS ENDPOINT ---
-@app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_scan(request: AnalysisRequest):
+async def analyze_slices(study: StudyInput, defer_heatmap: bool = False) -> Dict[str, Any]:
     """
-    Main endpoint for DICOM analysis.
+    Preprocesses the 3 DICOM slices of a study, runs the AI models and builds the response fields.
     
-    Downloads 3 DICOM sagittal slices from URLs, stacks them, runs AI models, and returns predictions.
+    Args:
+        study: Slices to analyze
+        defer_heatmap: Store the heatmap inputs and return a heatmap_id
+            instead of rendering the heatmap inline
+        
+    Returns:
+        Dict of AnalysisResponse fields (shared between coalesced requests, do not mutate)
     """
-    logger.info(f"🔍 Analysis request received for {len(request.dicomUrls)} DICOM URLs")
+    # 1. Process the 3 DICOM slices together into a 3-channel tensor
+    input_tensor, visual_imgs = await run_cpu(load_slices, study.decode, study.slice_keys)  # (1, 3, 256, 256)
+    logger.info(f"✅ Stacked tensor shape: {input_tensor.shape}")
     
-    if not models_dict:
-        raise HTTPException(
-            status_code=503,
-            detail="No AI models loaded. Service is not ready."
-        )
+    # Use middle slice for heatmap visualization
+    original_img = visual_imgs[1]
     
-    if len(request.dicomUrls) != 3:
-        raise HTTPException(
-            status_code=400,
-            detail="Exactly 3 DICOM URLs are required"
+    results = {
+        'success': True,
+        'diagnosis': {},
+        'heatmap': [],
+        'metadata': {
+            **study.metadata,
+            'tensor_shape': list(input_tensor.shape),
+            'heatmap_method': HEATMAP_METHOD
+        }
+    }
+    
+    # 3. Run ACL, Meniscus and Abnormal models (a profiled study runs alone, unbatched)
+    if inference_scheduler is not None and current_profile() is None:
+        outputs = await inference_scheduler.submit(input_tensor)
+    else:
+        outputs = (await run_cpu(run_models, input_tensor))[0]
+    model_set = outputs.model_set  # The version that ran, even if a reload swapped it since
+    model_probabilities = outputs.probabilities
+    for task, prob in model_probabilities.items():
+        logger.info(f"📊 {task} probability: {prob:.4f}")
+    results['metadata']['model_versions'] = model_set.versions
+    
+    # 4. Abnormal probability (if model exists)
+    abnormal_prob = abnormal_probability(model_probabilities)
+    
+    # Determine which model has the highest probability
+    if model_probabilities:
+        highest_model = max(model_probabilities, key=model_probabilities.get)
+        highest_prob = model_probabilities[highest_model]
+        logger.info(f"🏆 Highest probability model: {highest_model} ({highest_prob:.4f})")
+        
+        # Generate heatmap only for the highest probability model
+        heatmap_b64 = None
+        if highest_model in model_set.models:
+            cam = outputs.cams.get(highest_model) if outputs.cams else None
+            if defer_heatmap:
+                results['heatmap_id'] = heatmap_store.submit(HeatmapJob(
+                    task=highest_model,
+                    original_img=original_img,
+                    cam=cam,
+                    input_tensor=input_tensor if cam is None else None,
+                    model=model_set.models[highest_model] if cam is None else None
+                ))
+                logger.info(f"⏳ Heatmap deferred ({results['heatmap_id']})")
+            else:
+                heatmap_b64 = await run_cpu(generate_heatmap, model_set.models[highest_model], input_tensor,
+                                            original_img, cam)
+        
+        # Create full PredictionResult only for the highest probability model
+        prediction_result = PredictionResult(
+            probability=round(highest_prob, 4),
+            confidence_level=get_confidence_level(highest_prob),
+            heatmap=None  # Heatmap will be in separate array
         )
+        
+        results['diagnosis'][highest_model] = prediction_result
+        if heatmap_b64:
+            results['heatmap'].append(heatmap_b64)
+    else:
+        logger.warning("⚠️ No models were run successfully")
     
-    try:
-        # 1. Download and process 3 DICOM slices
-        tensors = []
-        visual_imgs = []
-        total_file_size = 0
-        
-        for i, dicom_url in enumerate(request.dicomUrls):
-            logger.info(f"📥 Downloading DICOM {i+1}/3 from: {dicom_url}")
-            response = requests.get(dicom_url, timeout=30)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Failed to download DICOM {i+1}. Status: {response.status_code}"
-                )
-            
-            file_size = len(response.content)
-            total_file_size += file_size
-            logger.info(f"✅ Downloaded DICOM {i+1}: {file_size} bytes")
-            
-            # Process single slice
-            tensor, visual_img = process_dicom(response.content)
-            tensors.append(tensor)
-            visual_imgs.append(visual_img)
-        
-        # Stack the three slices into 3-channel tensor
-        input_tensor = torch.cat(tensors, dim=1)  # (1, 3, 256, 256)
-        logger.info(f"✅ Stacked tensor shape: {input_tensor.shape}")
-        
-        # Use middle slice for heatmap visualization
-        original_img = visual_imgs[1]
+    # For other models, just store probabilities in metadata for reference
+    results['metadata']['model_probabilities'] = {
+        model: round(prob, 4) for model, prob in model_probabilities.items()
+    }
+    
+    # Set abnormal detection results
+    results['abnormal_probability'] = round(abnormal_prob, 4)
+    results['abnormal_detected'] = abnormal_prob >= 0.5
+    
+    return results
+
+def holding_admission(compute: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+    """
+    Wraps a single-flight computation so it keeps the leader's admission slot
+    until it has finished: it is shielded, so it outlives the leader's request
+    if that client disconnects, and must not run outside the concurrency limit.
+    """
+    ticket = current_ticket()
+    if ticket is None:
+        return compute
+    
+    def start():
+        admission.retain(ticket)
+        task = asyncio.ensure_future(compute())
+        task.add_done_callback(lambda _: admission.release(ticket))
+        return task
+    return start
+
+async def analyze_study(study: StudyInput, defer_heatmap: bool = False) -> tuple:
+    """
+    Analyzes a study, serving repeats from the result cache and coalescing
+    concurrent identical studies into one computation.
+    
+    Args:
+        study: Slices to analyze
+        defer_heatmap: Return a heatmap_id instead of an inline heatmap
+        
+    Returns:
+        tuple: (results, cache_status) - cache_status is 'hit', 'coalesced' or 'miss'
+    """
+    base_key = study_fingerprint(study.slice_keys)
+    if defer_heatmap:
+        base_key += ":deferred"
+    study_key = versioned_key(base_key, active_models())
+    require_deadline("analysis")
+    
+    if current_profile() is not None:
+        return await analyze_slices(study, defer_heatmap), 'bypass'
+    
+    if result_cache is not None:
+        cached = result_cache.get(study_key)
+        heatmap_id = cached.get('heatmap_id') if cached is not None else None
+        if heatmap_id is not None and heatmap_id not in heatmap_store:
+            # The deferred heatmap was evicted or expired: recompute rather than return an id that 404s
+            logger.info(f"♻️  Result cache hit without its heatmap, recomputing ({study_key[:12]})")
+        elif cached is not None:
+            logger.info(f"♻️  Result cache hit ({study_key[:12]})")
+            return cached, 'hit'
+    
+    async def compute():
+        results = await analyze_slices(study, defer_heatmap)
+        if result_cache is not None:
+            # Under the versions that actually ran (a reload may have landed meanwhile)
+            result_cache.put(f"{base_key}@{versions_key(results['metadata']['model_versions'])}", results)
+        return results
+    
+    results, shared = await study_flights.do(study_key, holding_admission(compute))
+    if shared:
+        logger.info(f"🔗 Joined in-flight analysis ({study_key[:12]})")
+    return results, 'coalesced' if shared else 'miss'
+
+async def analyze_full_volume(volume_bytes: bytes, pooling: str, volume_key: Optional[str] = None) -> tuple:
+    """
+    Runs every slice of a volume through the models in chunks and pools the
+    per-slice logits (see volume_inference.py). No heatmap is generated; the
+    slice with the highest logit per task is reported instead.
+    
+    Returns:
+        tuple: (results, cache_status) - same shape as analyze_study
+    """
+    model_set = active_models()
+    volume_key = volume_key or await run_cpu(content_hash, volume_bytes)
+    study_key = versioned_key(f"{volume_key}:full:{pooling}", model_set)
+    require_deadline("analysis")
+    
+    if result_cache is not None and current_profile() is None:
+        cached = result_cache.get(study_key)
+        if cached is not None:
+            logger.info(f"♻️  Result cache hit ({study_key[:12]})")
+            return cached, 'hit'
+    
+    async def compute():
+        ds, _ = await run_cpu(open_dicom_volume, volume_bytes)
+        volume = await run_cpu(
+            run_volume, ds, functools.partial(model_logits, model_set=model_set), list(model_set.backend.tasks),
+            chunk_size=VOLUME_CHUNK_SIZE, pooling=pooling, device=device
+        )
+        logger.info(
+            f"⚡ Full volume: {volume.num_slices} slices in {volume.total_seconds:.2f}s "
+            f"({volume.slices_per_second:.1f} slices/s, {volume.num_chunks} chunks)"
+        )
         
+        model_probabilities = volume.probabilities
+        highest_model = max(model_probabilities, key=model_probabilities.get)
+        highest_prob = model_probabilities[highest_model]
+        abnormal_prob = abnormal_probability(model_probabilities)
         results = {
             'success': True,
-            'diagnosis': {},
+            'diagnosis': {
+                highest_model: PredictionResult(
+                    probability=round(highest_prob, 4),
+                    confidence_level=get_confidence_level(highest_prob)
+                )
+            },
             'heatmap': [],
+            'abnormal_probability': round(abnormal_prob, 4),
+            'abnormal_detected': abnormal_prob >= 0.5,
             'metadata': {
-                'total_file_size_bytes': total_file_size,
-                'tensor_shape': list(input_tensor.shape),
-                'dicom_urls': request.dicomUrls
+                'analysis_mode': 'full_volume',
+                'total_file_size_bytes': len(volume_bytes),
+                'volume_frames': volume.num_slices,
+                'pooling': volume.pooling,
+                'chunk_size': volume.chunk_size,
+                'num_chunks': volume.num_chunks,
+                'peak_slices': volume.peak_slices,
+                'slices_per_second': round(volume.slices_per_second, 2),
+                'decode_ms': round(volume.decode_seconds * 1000, 1),
+                'inference_ms': round(volume.inference_seconds * 1000, 1),
+                'total_ms': round(volume.total_seconds * 1000, 1),
+                'model_probabilities': {
+                    model: round(prob, 4) for model, prob in model_probabilities.items()
+                },
+                'model_versions': model_set.versions
             }
         }
-        
-        # Store model probabilities for comparison
-        model_probabilities = {}
-        
-        # 3. Run ACL Model
-        if 'acl' in models_dict:
-            logger.info("🧠 Running ACL model on {device}...")
-            with torch.no_grad(), torch.cuda.amp.autocast(enabled=torch.cuda.is_available()):
-                acl_out = models_dict['acl'](input_tensor)
-                acl_prob = torch.sigmoid(acl_out).item()
-            
-            logger.info(f"📊 ACL probability: {acl_prob:.4f}")
-            model_probabilities['acl'] = acl_prob
-        
-        # 4. Run Meniscus Model
-        if 'meniscus' in models_dict:
-            logger.info("🧠 Running Meniscus model on {device}...")
-            with torch.no_grad(), torch.cuda.amp.autocast(enabled=torch.cuda.is_available()):
-                men_out = models_dict['meniscus'](input_tensor)
-                men_prob = torch.sigmoid(men_out).item()
-            
-            logger.info(f"📊 Meniscus probability: {men_prob:.4f}")
-            model_probabilities['meniscus'] = men_prob
-
-        # 5. Run Abnormal Model (if exists)
-        if 'abnormal' in models_dict:
-            logger.info("🧠 Running Abnormality model on {device}...")
-            with torch.no_grad(), torch.cuda.amp.autocast(enabled=torch.cuda.is_available()):
-                abn_out = models_dict['abnormal'](input_tensor)
-                abnormal_prob = torch.sigmoid(abn_out).item()
-            
-            logger.info(f"📊 Abnormality probability: {abnormal_prob:.4f}")
-            model_probabilities['abnormal'] = abnormal_prob
-        else:
-            # Fallback: use max of ACL and Meniscus if abnormal model not available
-            if 'acl' in model_probabilities and 'meniscus' in model_probabilities:
-                abnormal_prob = max(
-                    model_probabilities['acl'],
-                    model_probabilities['meniscus']
-                )
-            elif 'acl' in model_probabilities:
-                abnormal_prob = model_probabilities['acl']
-            elif 'meniscus' in model_probabilities:
-                abnormal_prob = model_probabilities['meniscus']
-            else:
-                abnormal_prob = 0.0
-        
-        # Determine which model has the highest probability
-        if model_probabilities:
-            highest_model = max(model_probabilities, key=model_probabilities.get)
-            highest_prob = model_probabilities[highest_model]
-            logger.info(f"🏆 Highest probability model: {highest_model} ({highest_prob:.4f})")
-            
-            # Generate heatmap only for the highest probability model
-            heatmap_b64 = None
-            if highest_model in models_dict:
-                heatmap_b64 = generate_heatmap(models_dict[highest_model], input_tensor, original_img)
-            
-            # Create full PredictionResult only for the highest probability model
-            prediction_result = PredictionResult(
-                probability=round(highest_prob, 4),
-                confidence_level=get_confidence_level(highest_prob),
-                heatmap=None  # Heatmap will be in separate array
-            )
-            
-            results['diagnosis'][highest_model] = prediction_result
-            if heatmap_b64:
-                results['heatmap'].append(heatmap_b64)
-        else:
-            logger.warning("⚠️ No models were run successfully")
-        
-        # For other models, just store probabilities in metadata for reference
-        results['metadata']['model_probabilities'] = {
-            model: round(prob, 4) for model, prob in model_probabilities.items()
+        if result_cache is not None and current_profile() is None:
+            result_cache.put(study_key, results)
+        return results
+    
+    if current_profile() is not None:
+        return await compute(), 'bypass'
+    results, shared = await study_flights.do(study_key, holding_admission(compute))
+    if shared:
+        logger.info(f"🔗 Joined in-flight analysis ({study_key[:12]})")
+    return results, 'coalesced' if shared else 'miss'
+
+def versions_key(versions: Dict[str, str]) -> str:
+    return ",".join(f"{task}={version}" for task, version in sorted(versions.items()))
+
+def versioned_key(study_key: str, model_set: ModelSet) -> str:
+    """Result cache / coalescing key: a reloaded model never serves results of the old one."""
+    return f"{study_key}@{versions_key(model_set.versions)}"
+
+def build_response(results: Dict[str, Any], cache_status: str, **metadata) -> AnalysisResponse:
+    """Shallow-copies shared results and adds request-specific metadata (and the profile of a profiled request)."""
+    ANALYSES.inc(cache=cache_status)
+    profile = current_profile()
+    if profile is not None:
+        metadata['profile'] = profile.finish()
+    return AnalysisResponse(**{
+        **results,
+        'metadata': {
+            **results['metadata'],
+            **metadata,
+            'result_cache': cache_status
         }
+    })
+
+def validate_pooling(pooling: Optional[str]) -> str:
+    pooling = (pooling or VOLUME_POOLING).lower()
+    if pooling not in POOLING_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unsupported pooling '{pooling}'. Use one of: {', '.join(POOLING_METHODS)}")
+    return pooling
+
+async def require_models():
+    if models_loading is not None and not models_loading.done():
+        await asyncio.shield(models_loading)  # LAZY_STARTUP: first requests wait for the models
+    model_set = active_models()
+    if model_set is None or not model_set.models:
+        raise HTTPException(
+            status_code=503,
+            detail="No AI models loaded. Service is not ready."
+        )
+
+def request_deadline(timeout: Optional[float]) -> float:
+    """Monotonic deadline of a request: ADMISSION_DEADLINE_SECONDS, or the caller's shorter X-Request-Timeout."""
+    seconds = ADMISSION_DEADLINE_SECONDS
+    if timeout is not None and timeout > 0:
+        seconds = min(seconds, timeout)
+    return time.monotonic() + seconds
+
+def admission_error(rejection: AdmissionRejected) -> HTTPException:
+    ADMISSION_REJECTIONS.inc(reason=rejection.reason)
+    logger.warning(f"🚦 Analysis request rejected ({rejection.reason}): {rejection}")
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail=str(rejection),
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+@asynccontextmanager
+async def admitted(timeout: Optional[float]):
+    """
+    Runs the block in an admission slot, under the request's deadline.
+    
+    Raises:
+        HTTPException: 429 when the queue is full, 503 when no slot frees up
+            before the deadline (both with Retry-After)
+    """
+    if admission is None:
+        yield
+        return
+    try:
+        ticket = await admission.acquire(request_deadline(timeout))
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    ADMISSION_QUEUE_WAIT.observe(ticket.queue_wait)
+    token = set_ticket(ticket)
+    try:
+        yield
+    finally:
+        reset_ticket(token)
+        admission.release(ticket)
+
+def require_deadline(stage_name: str):
+    """504 for an admitted request whose deadline passed meanwhile (e.g. in a slow download): its client has given up."""
+    remaining = deadline_remaining()
+    if remaining is not None and remaining <= 0:
+        raise admission_error(admission.expired(stage_name))
+
+def request_profile(requested: bool, token: Optional[str]) -> Optional[RequestProfile]:
+    """A RequestProfile if profiling was asked for and the caller may profile, else None."""
+    if not requested:
+        return None
+    if not PROFILING and not (PROFILING_TOKEN and hmac.compare_digest(token or "", PROFILING_TOKEN)):
+        raise HTTPException(status_code=403, detail="Profiling needs PROFILING=1 or a valid X-Profile-Token")
+    return RequestProfile(top_ops=PROFILING_TOP_OPS)
+
+# tracemalloc and the process CPU clock are process-wide: one profiled request at a time
+profiling_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def profiled_request(profile: Optional[RequestProfile]):
+    """
+    Runs the block as the given profiled request (or unprofiled with None).
+    Only one profile runs at a time; a second one gets a 409 at once rather
+    than waiting (enter this before admitted() so it never holds a slot idle).
+    """
+    if profile is None:
+        yield
+        return
+    if profiling_lock.locked():
+        raise HTTPException(status_code=409, detail="Another profiled request is running; retry when it has finished")
+    async with profiling_lock:
+        with profile.activate():
+            yield
+
+async def describe_inputs(files: list[bytes]):
+    """Records the DICOM headers of a profiled request (a transfer syntax can explain a slow decode)."""
+    profile = current_profile()
+    if profile is not None:
+        profile.inputs = await run_cpu(lambda: [describe_dicom(file_bytes) for file_bytes in files])
+
+@app.post("/analyze", response_model=AnalysisResponse)
+async def analyze_scan(request: AnalysisRequest, x_profile_token: Optional[str] = Header(default=None),
+                       x_request_timeout: Optional[float] = Header(default=None)):
+    """
+    Main endpoint for DICOM analysis.
+    
+    Downloads 3 DICOM sagittal slices from URLs (or one multi-frame volume,
+    of which only the middle slices are decoded), stacks them, runs AI models,
+    and returns predictions.
+    
+    With "profile": true (and PROFILING=1 or X-Profile-Token), the request
+    skips the caches and micro-batching, and metadata.profile holds its
+    per-stage wall/CPU time, per-model operator summary and memory use.
+    
+    Requests beyond the admission limits get 429/503 with Retry-After;
+    X-Request-Timeout (seconds) shortens the request's deadline.
+    """
+    pooling = validate_analysis_request(request)
+    
+    if request.volumeUrl is not None:
+        logger.info("🔍 Analysis request received for a DICOM volume URL")
+    else:
+        logger.info(f"🔍 Analysis request received for {len(request.dicomUrls)} DICOM URLs")
+    
+    await require_models()
+    profile = request_profile(request.profile, x_profile_token)
+    
+    async with profiled_request(profile), admitted(x_request_timeout):
+        return await analyze_urls(request, pooling)
+
+def validate_analysis_request(request: AnalysisRequest) -> str:
+    """
+    Checks the inputs of an /analyze request (or batch study).
+    
+    Returns:
+        str: The pooling to use in full-volume mode
         
-        # Set abnormal detection results
-        results['abnormal_probability'] = round(abnormal_prob, 4)
-        results['abnormal_detected'] = abnormal_prob >= 0.5
+    Raises:
+        HTTPException: 400 for an invalid combination of inputs
+    """
+    if (request.dicomUrls is None) == (request.volumeUrl is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide either dicomUrls (3 slices) or volumeUrl (one multi-frame volume)"
+        )
+    pooling = validate_pooling(request.pooling)
+    if request.dicomUrls is not None and len(request.dicomUrls) != 3:
+        raise HTTPException(
+            status_code=400,
+            detail="Exactly 3 DICOM URLs are required"
+        )
+    if request.fullVolume and request.volumeUrl is None:
+        raise HTTPException(
+            status_code=400,
+            detail="fullVolume requires volumeUrl"
+        )
+    return pooling
 
-        return AnalysisResponse(**results)
+async def analyze_urls(request: AnalysisRequest, pooling: str) -> AnalysisResponse:
+    """Downloads and analyzes the study of a validated /analyze request."""
+    try:
+        if request.volumeUrl is not None:
+            # Download the volume and pick its middle slices server-side
+            logger.info("📥 Downloading DICOM volume")
+            with stage("download"):
+                download = await dicom_fetcher.fetch(request.volumeUrl)
+            DOWNLOADED_BYTES.inc(len(download.content))
+            await describe_inputs([download.content])
+            logger.info(f"✅ Downloaded DICOM volume: {len(download.content)} bytes")
+            if request.fullVolume:
+                results, cache_status = await analyze_full_volume(download.content, pooling)
+                return build_response(results, cache_status, volume_url=request.volumeUrl)
+            study = await run_cpu(volume_study, download.content)
+            request_metadata = {'volume_url': request.volumeUrl}
+        else:
+            # Download the 3 DICOM slices
+            logger.info(f"📥 Downloading {len(request.dicomUrls)} DICOM slices concurrently")
+            with stage("download"):
+                downloads = await dicom_fetcher.fetch_all(request.dicomUrls)
+            DOWNLOADED_BYTES.inc(sum(len(download.content) for download in downloads))
+            await describe_inputs([download.content for download in downloads])
+            for i, download in enumerate(downloads):
+                logger.info(f"✅ Downloaded DICOM {i+1}: {len(download.content)} bytes")
+            study = await run_cpu(slices_study, [download.content for download in downloads])
+            request_metadata = {'dicom_urls': request.dicomUrls}
+        
+        results, cache_status = await analyze_study(study, defer_heatmap=request.deferHeatmap)
+        return build_response(results, cache_status, **request_metadata)
         
     except HTTPException:
         raise
-    except requests.exceptions.Timeout:
-        logger.error("❌ Download timeout")
-        raise HTTPException(status_code=504, detail="DICOM download timeout")
-    except requests.exceptions.RequestException as e:
+    except DicomFetchError as e:
         logger.error(f"❌ Download error: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to download DICOM: {str(e)}")
+        if e.timeout:
+            raise HTTPException(status_code=504, detail="DICOM download timeout")
+        if e.too_large:
+            raise HTTPException(status_code=413, detail=f"{str(e)} (DICOM_FETCH_MAX_MB)")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Analysis error: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.post("/analyze/volume", response_model=AnalysisResponse)
+async def analyze_volume_upload(request: Request, deferHeatmap: bool = False, fullVolume: bool = False,
+                                pooling: Optional[str] = None,
+                                x_request_timeout: Optional[float] = Header(default=None)):
+    """
+    Analyzes a multi-frame DICOM volume sent as the raw request body
+    (Content-Type: application/dicom), without a storage round-trip.
+    Only the middle slices are decoded, unless fullVolume is set. The body
+    is only read once the request is admitted (see /analyze).
+    """
+    await require_models()
+    pooling = validate_pooling(pooling)
+    
+    async with admitted(x_request_timeout):
+        with stage("upload"):
+            volume_bytes = await request.body()
+        UPLOADED_BYTES.inc(len(volume_bytes))
+        logger.info(f"🔍 Analysis request received for an uploaded DICOM volume ({len(volume_bytes)} bytes)")
+        if not volume_bytes:
+            raise HTTPException(status_code=400, detail="Request body must be a DICOM volume")
+        
+        try:
+            if fullVolume:
+                results, cache_status = await analyze_full_volume(volume_bytes, pooling)
+                return build_response(results, cache_status)
+            study = await run_cpu(volume_study, volume_bytes)
+            results, cache_status = await analyze_study(study, defer_heatmap=deferHeatmap)
+            return build_response(results, cache_status)
+        
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Analysis error: {str(e)}\n{traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@app.post("/analyze/upload", response_model=AnalysisResponse)
+async def analyze_multipart_upload(request: Request, deferHeatmap: bool = False, fullVolume: bool = False,
+                                   pooling: Optional[str] = None,
+                                   x_request_timeout: Optional[float] = Header(default=None)):
+    """
+    Analyzes DICOM files posted as multipart/form-data, skipping the storage
+    URL download (the Express backend already holds the bytes).
+        
+    Send either 3 slice files (in sagittal order, any field name) or one
+    file in a field named 'volume'. Parts are streamed into memory and
+    hashed as they arrive; nothing is written to temporary files. Parts are
+    only read once the request is admitted (see /analyze).
+    """
+    await require_models()
+    pooling = validate_pooling(pooling)
+        
+    async with admitted(x_request_timeout):
+        try:
+            with stage("upload"):
+                parts = await read_multipart(
+                    request.headers.get("content-type", ""),
+                    request.stream(),
+                    max_bytes=int(UPLOAD_MAX_MB * 1e6)
+                )
+        except UploadError as e:
+            logger.error(f"❌ Upload error: {str(e)}")
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        
+        volumes = [part for part in parts if part.name == "volume"]
+        slices = [part for part in parts if part.name != "volume" and part.filename is not None]
+        UPLOADED_BYTES.inc(sum(len(part.content) for part in parts))
+        logger.info(f"📤 Received {len(parts)} uploaded part(s) ({sum(len(part.content) for part in parts)} bytes)")
+        
+        if (volumes and slices) or len(volumes) > 1:
+            raise HTTPException(status_code=400, detail="Upload either 3 slice files or one 'volume' file")
+        if not volumes and len(slices) != 3:
+            raise HTTPException(status_code=400, detail="Exactly 3 DICOM slice files are required")
+        if fullVolume and not volumes:
+            raise HTTPException(status_code=400, detail="fullVolume requires a 'volume' file")
+        
+        try:
+            if volumes:
+                volume = volumes[0]
+                if fullVolume:
+                    results, cache_status = await analyze_full_volume(volume.content, pooling, volume_key=volume.sha256)
+                    return build_response(results, cache_status)
+                study = await run_cpu(volume_study, volume.content, volume_key=volume.sha256)
+            else:
+                study = await run_cpu(slices_study, [part.content for part in slices],
+                                      slice_keys=[part.sha256 for part in slices])
+        
+            results, cache_status = await analyze_study(study, defer_heatmap=deferHeatmap)
+            return build_response(results, cache_status)
+        
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Analysis error: {str(e)}\n{traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+# --- BATCH ANALYSIS ---
+@app.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyzes a list of studies (same fields as /analyze, plus an optional id)
+    and streams one NDJSON line per study as soon as it finishes, in
+    completion order, then a summary line.
+    
+    Studies run like separate /analyze requests, up to `concurrency` at a time:
+    they share the download pool, the caches and micro-batching, and each one
+    is admitted on its own. At most `concurrency` finished results wait for a
+    slow reader, so memory does not grow with the batch size.
+    """
+    if not request.studies:
+        raise HTTPException(status_code=400, detail="Provide at least one study")
+    if len(request.studies) > BATCH_MAX_STUDIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_STUDIES} studies per batch")
+    await require_models()
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    logger.info(f"📦 Batch analysis request received for {len(request.studies)} studies (concurrency: {concurrency})")
+    return StreamingResponse(stream_batch(request.studies, concurrency), media_type="application/x-ndjson")
+
+async def stream_batch(studies: list[BatchStudy], concurrency: int):
+    """Yields the NDJSON lines of a batch; its analysis tasks are cancelled if the client goes away."""
+    started = time.perf_counter()
+    finished: asyncio.Queue = asyncio.Queue(maxsize=concurrency)  # Bounded: a slow reader pauses the batch
+    pending = iter(enumerate(studies))
+    
+    async def worker():
+        for index, study in pending:  # Shared iterator: each worker takes the next study
+            await finished.put(await analyze_batch_study(index, study))
+    
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(studies)))]
+    succeeded = 0
+    try:
+        for _ in range(len(studies)):
+            line = await finished.get()
+            succeeded += line["status"] == 200
+            yield json.dumps(line) + "\n"
+    finally:
+        for task in workers:
+            task.cancel()
+    elapsed = time.perf_counter() - started
+    logger.info(f"📦 Batch finished: {succeeded}/{len(studies)} studies in {elapsed:.2f}s")
+    yield json.dumps({"summary": {
+        "studies": len(studies),
+        "succeeded": succeeded,
+        "failed": len(studies) - succeeded,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "studies_per_second": round(len(studies) / elapsed, 3)
+    }}) + "\n"
+
+async def analyze_batch_study(index: int, study: BatchStudy) -> Dict[str, Any]:
+    """
+    Analyzes one study of a batch, retrying admission after a 429/503 (the
+    batch backs off rather than fail under load). Never raises: errors are
+    reported on the study's line.
+    """
+    line = {"index": index, "id": study.id}
+    try:
+        if study.profile:
+            raise HTTPException(status_code=400, detail="Profiling is not supported in batches")
+        pooling = validate_analysis_request(study)
+        for attempt in range(BATCH_ADMISSION_RETRIES + 1):
+            try:
+                async with admitted(None):
+                    response = await analyze_urls(study, pooling)
+                break
+            except HTTPException as e:
+                retry_after = (e.headers or {}).get("Retry-After")
+                if e.status_code not in (429, 503) or retry_after is None or attempt == BATCH_ADMISSION_RETRIES:
+                    raise
+                await asyncio.sleep(int(retry_after))
+        BATCH_STUDIES.inc(result="ok")
+        return {**line, "status": 200, "result": response.model_dump(mode="json")}
+    except HTTPException as e:
+        error = {"status": e.status_code, "error": e.detail}
+    except Exception as e:
+        logger.error(f"❌ Batch study {index} failed: {str(e)}\n{traceback.format_exc()}")
+        error = {"status": 500, "error": f"Analysis failed: {str(e)}"}
+    BATCH_STUDIES.inc(result="failed")
+    return {**line, **error}
+
+@app.get("/heatmap/{heatmap_id}", response_model=HeatmapResponse)
+async def get_heatmap(heatmap_id: str):
+    """
+    Returns a heatmap deferred by /analyze (deferHeatmap=true).
+    
+    Served from the background render queue when ready, otherwise rendered now.
+    """
+    try:
+        job = await heatmap_store.get(heatmap_id)
+    except Exception as e:
+        logger.error(f"❌ Heatmap rendering failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Heatmap generation failed: {str(e)}")
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Heatmap not found or expired")
+    
+    return HeatmapResponse(heatmap_id=heatmap_id, model=job.task, heatmap=await run_cpu(encode_heatmap_base64, job.result))
+
+@app.get("/heatmap/{heatmap_id}/image")
+async def get_heatmap_image(heatmap_id: str, format: Optional[str] = None, quality: Optional[int] = None):
+    """
+    Returns a deferred heatmap as a raw binary image (no base64, no JSON).
+    
+    Query params:
+        format: png, jpeg or webp (default HEATMAP_IMAGE_FORMAT)
+        quality: PNG compression level 0-9, or JPEG/WebP quality 1-100
+    """
+    fmt = (format or HEATMAP_IMAGE_FORMAT).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in HEATMAP_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'. Use one of: {', '.join(HEATMAP_MEDIA_TYPES)}")
+    if quality is None:
+        quality = HEATMAP_PNG_COMPRESSION if fmt == "png" else HEATMAP_IMAGE_QUALITY
+    
+    try:
+        job = await heatmap_store.get(heatmap_id)
+    except Exception as e:
+        logger.error(f"❌ Heatmap rendering failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Heatmap generation failed: {str(e)}")
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Heatmap not found or expired")
+    
+    image_bytes = await run_cpu(encode_heatmap_image, job.result, fmt, quality)
+    HEATMAP_BYTES.inc(len(image_bytes), format=fmt)
+    return Response(
+        content=image_bytes,
+        media_type=HEATMAP_MEDIA_TYPES[fmt],
+        headers={"X-Heatmap-Model": job.task, "Cache-Control": "private, max-age=900"}
+    )
+
+def encode_heatmap_image(visualization: np.ndarray, fmt: str, quality: int) -> bytes:
+    with stage("heatmap_encode"):
+        return encode_heatmap(visualization, fmt, quality=quality, encoder=HEATMAP_ENCODER)
+
+# --- MODEL VERSIONS ---
+class ModelVersionRequest(BaseModel):
+    path: str  # Checkpoint under models/
+    version: Optional[str] = None  # Version label (default: checkpoint content hash)
+
+class ModelReloadRequest(BaseModel):
+    models: Optional[Dict[str, ModelVersionRequest]] = None  # Tasks to change, the others keep their version
+
+def require_model_admin(token: Optional[str]):
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model admin endpoints are disabled: set MODEL_ADMIN_TOKEN")
+    if not hmac.compare_digest(token or "", MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+    if worker_identity.count > 1:
+        # Each worker holds its own registry; serve.py reloads them all together
+        raise HTTPException(
+            status_code=409,
+            detail="Multi-worker server: send SIGHUP to the serve.py parent to reload every worker"
+        )
+    if not engine_loaded or active_models() is None:
+        raise HTTPException(status_code=503, detail="Models are still loading")
+
+def reload_specs(request: Optional[ModelReloadRequest]) -> Dict[str, ModelSpec]:
+    """Specs to reload: MODEL_MANIFEST without a body, else the active specs with the requested tasks replaced."""
+    if request is None or not request.models:
+        try:
+            return resolve_specs(read_manifest(MODEL_MANIFEST, MODEL_PATHS))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    specs = dict(active_models().specs)
+    models_root = os.path.realpath(MODELS_DIR)
+    for task, entry in request.models.items():
+        if task not in MODEL_PATHS:
+            raise HTTPException(status_code=400, detail=f"Unknown task '{task}'. Use one of: {', '.join(MODEL_PATHS)}")
+        if os.path.commonpath([os.path.realpath(entry.path), models_root]) != models_root:
+            raise HTTPException(status_code=400, detail=f"Checkpoints must be under {MODELS_DIR}/")
+        if not os.path.isfile(entry.path):
+            raise HTTPException(status_code=404, detail=f"Checkpoint not found: {entry.path}")
+        specs[task] = model_spec(entry.path, entry.version)
+    return specs
+
+@app.get("/models")
+async def list_models():
+    """Active and previous model versions, and the latest reload reports (latency, memory)."""
+    return model_registry.stats()
+
+@app.post("/models/reload")
+async def reload_models(request: Optional[ModelReloadRequest] = None,
+                        x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Loads new model versions in the background, warms them up and swaps
+    them in. Requests already running finish on the old version; the old
+    version is kept for POST /models/rollback (MODEL_KEEP_PREVIOUS=1).
+    
+    Without a body MODEL_MANIFEST is re-read; with {"models": {task: {"path",
+    "version"}}} only those tasks change. Unchanged task models are reused.
+    """
+    require_model_admin(x_admin_token)
+    specs = reload_specs(request)
+    if specs == active_models().specs:
+        return {"reloaded": False, "message": "Requested versions are already active", "active": active_models().info()}
+    
+    logger.info(f"🔄 Reloading models: {', '.join(f'{task} {spec.version}' for task, spec in specs.items())}")
+    try:
+        report = await asyncio.get_running_loop().run_in_executor(None, model_registry.reload, specs)
+    except RegistryBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        MODEL_RELOADS.inc(action="reload", result="failed")
+        logger.error(f"❌ Model reload failed, still serving generation {active_models().generation}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed (active version unchanged): {str(e)}")
+    MODEL_RELOADS.inc(action="reload", result="ok")
+    return {"reloaded": True, "report": report.as_dict(), "active": active_models().info()}
+
+@app.post("/models/rollback")
+async def rollback_models(x_admin_token: Optional[str] = Header(default=None)):
+    """Swaps the previous model version back in (the current one becomes previous)."""
+    require_model_admin(x_admin_token)
+    try:
+        report = model_registry.rollback()
+    except RegistryBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    MODEL_RELOADS.inc(action="rollback", result="ok")
+    return {"report": report.as_dict(), "active": active_models().info()}
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("🚀 Starting CDSS AI Service...")
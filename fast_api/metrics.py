@@ -0,0 +1,264 @@
+"""
+Prometheus Metrics
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format (version 0.0.4) for GET /metrics, without a client library
+dependency. Every metric is thread-safe: stages are observed from the event
+loop and from executor threads alike.
+
+Metrics are per process. Under serve.py each worker keeps its own and adds
+a worker="<index>" label, so scrape every worker (or accept that one scrape
+sees one worker).
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a cached result (~ms) to a cold Grad-CAM study on CPU (~10 s), finer
+# where CPU forwards and whole requests land so percentile estimates stay close
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75,
+                   1.0, 1.5, 2.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+GaugeFunction = Callable[[], Union[float, Dict[LabelValues, float], None]]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count (requests, errors, bytes)."""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if self.registry.paused:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. With function, the value is read at scrape
+    time: a float, or {label values: float} for labelled gauges.
+    """
+    type = "gauge"
+
+    def __init__(self, *args, function: Optional[GaugeFunction] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            values = value if isinstance(value, dict) else {(): value} if value is not None else {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    """Latency (or size) distribution in cumulative buckets."""
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels) -> None:
+        if self.registry.paused:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the enclosed block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            labels = self._labels(key)
+            for bound, count in zip(self.buckets, values):
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, values[-2]
+            yield f"{self.name}_count", labels, values[-2]
+            yield f"{self.name}_sum", labels, values[-1]
+
+
+class MetricsRegistry:
+    """Owns the metrics and renders them for a scrape."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._paused = threading.local()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[GaugeFunction] = None) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, function=function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics.append(metric)
+        return metric
+
+    @property
+    def paused(self) -> bool:
+        return getattr(self._paused, "active", False)
+
+    @contextmanager
+    def pause(self):
+        """Drops counter/histogram updates from this thread (warm-up traffic is not real traffic)."""
+        previous = self.paused
+        self._paused.active = True
+        try:
+            yield
+        finally:
+            self._paused.active = previous
+
+    def render(self, const_labels: Optional[Dict[str, str]] = None) -> str:
+        """All metrics in the Prometheus text format, with const_labels added to every sample."""
+        const_labels = const_labels or {}
+        lines = []
+        for metric in self._metrics:
+            help_text = metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {metric.name} {help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels({**const_labels, **labels})} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting requests by route template (not raw path, so
+    /heatmap/{heatmap_id} is one series), their latency up to the response
+    headers, and the requests in flight.
+    """
+
+    def __init__(self, app, requests: Counter, latency: Histogram, in_flight: Gauge):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+        self.in_flight = in_flight
+        self._route_paths: Optional[Dict[Callable, str]] = None
+
+    def _endpoint_label(self, scope) -> str:
+        if self._route_paths is None:
+            router = scope.get("router") or getattr(scope.get("app"), "router", None)
+            routes = getattr(router, "routes", [])
+            self._route_paths = {route.endpoint: route.path for route in routes if hasattr(route, "endpoint")}
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.in_flight.dec()
+            endpoint = self._endpoint_label(scope)
+            self.requests.inc(method=scope["method"], endpoint=endpoint, status=str(status))
+            self.latency.observe(time.perf_counter() - started, endpoint=endpoint)
@@ -0,0 +1,329 @@
+"""
+Model Registry
+Versioned, hot-reloadable task models. Everything inference reads (task
+models, fused engine, backend, precision) lives in one ModelSet; the
+registry builds a new set in the background, warms it up and then swaps the
+active reference in one assignment. Requests hold on to the set they
+started with, so in-flight work finishes on the old version while new
+requests see the new one. The replaced set is kept for rollback.
+
+Versions come from a JSON manifest (MODEL_MANIFEST), task -> checkpoint path
+or {"path": ..., "version": ...}; without an explicit label a checkpoint is
+identified by its content hash, so a file replaced in place is a new version.
+"""
+
+import gc
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from startup import StartupPhases
+from workers import process_memory
+
+logger = logging.getLogger(__name__)
+
+# (path, size, mtime_ns) -> content version, so unchanged checkpoints are hashed once
+_hash_cache: Dict[Tuple[str, int, int], str] = {}
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """One task checkpoint and its version label."""
+    path: str
+    version: str
+
+
+@dataclass
+class ModelSet:
+    """One generation of the task models; never modified once installed."""
+    specs: Dict[str, ModelSpec]
+    models: Dict[str, Any]  # task -> MRNetModel
+    precision: str
+    fused: Optional[Any] = None  # FusedMRNet when fusion is on
+    engine: Optional[Any] = None  # fused model or TaskEnsemble
+    backend: Optional[Any] = None  # InferenceBackend
+    backend_check_delta: Optional[float] = None
+    precision_check_delta: Optional[float] = None
+    generation: int = 0
+    loaded_at: Optional[float] = None  # Unix time it became active
+
+    @property
+    def versions(self) -> Dict[str, str]:
+        return {task: spec.version for task, spec in self.specs.items()}
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "versions": self.versions,
+            "paths": {task: spec.path for task, spec in self.specs.items()},
+            "backend": self.backend.name if self.backend is not None else None,
+            "precision": self.precision,
+            "loaded_at": self.loaded_at,
+        }
+
+
+@dataclass
+class ReloadReport:
+    """Timing and memory of one reload (or rollback)."""
+    action: str  # reload or rollback
+    generation: int
+    versions: Dict[str, str]
+    previous_versions: Dict[str, str]
+    reused: List[str] = field(default_factory=list)  # Tasks whose model was carried over unchanged
+    phases_ms: Dict[str, float] = field(default_factory=dict)
+    total_ms: float = 0.0
+    memory_mb: Dict[str, Optional[float]] = field(default_factory=dict)  # before, peak (both resident), after
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "generation": self.generation,
+            "versions": self.versions,
+            "previous_versions": self.previous_versions,
+            "reused": self.reused,
+            "phases_ms": self.phases_ms,
+            "total_ms": self.total_ms,
+            "memory_mb": self.memory_mb,
+        }
+
+
+class RegistryBusyError(RuntimeError):
+    """Another reload is already running."""
+
+
+def checkpoint_version(path: str) -> str:
+    """
+    Content version of a checkpoint, e.g. 'sha256:3f2a9c0d1b7e'.
+
+    Raises:
+        FileNotFoundError: If the checkpoint does not exist
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    version = _hash_cache.get(key)
+    if version is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        version = _hash_cache[key] = f"sha256:{digest.hexdigest()[:12]}"
+    return version
+
+
+def model_spec(path: str, version: Optional[str] = None) -> ModelSpec:
+    """ModelSpec with the given label, or the checkpoint's content version."""
+    return ModelSpec(path=path, version=version or checkpoint_version(path))
+
+
+def read_manifest(path: Optional[str], defaults: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Task entries from a JSON manifest, or the defaults if it does not exist.
+
+    Raises:
+        ValueError: If the manifest is not a JSON object of task entries
+    """
+    if not path or not os.path.exists(path):
+        return dict(defaults)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read model manifest {path}: {str(e)}")
+    if not isinstance(manifest, dict) or not manifest:
+        raise ValueError(f"Model manifest {path} must be a JSON object of task -> checkpoint")
+    return manifest
+
+
+def resolve_specs(entries: Dict[str, Any]) -> Dict[str, ModelSpec]:
+    """
+    ModelSpecs for manifest-style entries (path string or {"path", "version"}).
+    Checkpoints that do not exist keep a 'missing' version and are skipped
+    by the loader.
+
+    Raises:
+        ValueError: On an entry without a path
+    """
+    specs = {}
+    for task, entry in entries.items():
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("path"), str):
+            raise ValueError(f"Model entry for '{task}' needs a checkpoint path")
+        try:
+            specs[task] = model_spec(entry["path"], entry.get("version"))
+        except FileNotFoundError:
+            specs[task] = ModelSpec(path=entry["path"], version=entry.get("version") or "missing")
+    return specs
+
+
+def memory_snapshot() -> Dict[str, Optional[float]]:
+    """Process RSS/PSS (and CUDA allocated) in MB."""
+    memory = process_memory()
+    snapshot = {"rss_mb": memory.get("rss_mb"), "pss_mb": memory.get("pss_mb")}
+    if torch.cuda.is_available():
+        snapshot["cuda_allocated_mb"] = round(torch.cuda.memory_allocated() / 1e6, 1)
+    return snapshot
+
+
+class ModelRegistry:
+    """
+    Holds the active ModelSet and the one it replaced.
+
+    Args:
+        build: Builds a ModelSet from specs; gets the active set to reuse
+            unchanged task models from, and a StartupPhases to time its steps
+        warm_up: Runs a new set through the request path before it goes
+            live (None = no warm-up)
+        keep_previous: Keep the replaced set for rollback (otherwise it is
+            freed once its in-flight requests finish)
+        history_size: Reload reports kept for GET /models
+    """
+
+    def __init__(
+        self,
+        build: Callable[[Dict[str, ModelSpec], Optional[ModelSet], StartupPhases], ModelSet],
+        warm_up: Optional[Callable[[ModelSet], Any]] = None,
+        keep_previous: bool = True,
+        history_size: int = 10,
+    ):
+        self.build = build
+        self.warm_up = warm_up
+        self.keep_previous = keep_previous
+        self.active: Optional[ModelSet] = None
+        self.previous: Optional[ModelSet] = None
+        self.history: deque = deque(maxlen=history_size)
+        self._generation = 0
+        self._reload_lock = threading.Lock()
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def _install(self, model_set: ModelSet) -> None:
+        """Makes model_set active (one reference assignment); the replaced set becomes previous."""
+        replaced = self.active
+        self.active = model_set  # Requests read this once, so the swap is atomic for them
+        self.previous = replaced if self.keep_previous else None
+
+    def load(self, specs: Dict[str, ModelSpec], phases: StartupPhases) -> ModelSet:
+        """Builds and installs the first set (startup; warm-up is the caller's)."""
+        model_set = self.build(specs, None, phases)
+        self._generation += 1
+        model_set.generation = self._generation
+        model_set.loaded_at = time.time()
+        self._install(model_set)
+        return model_set
+
+    def reload(self, specs: Dict[str, ModelSpec]) -> ReloadReport:
+        """
+        Builds a set from specs next to the active one, warms it up, then
+        swaps it in. Task models whose spec did not change are reused.
+
+        Raises:
+            RegistryBusyError: If another reload is running
+            RuntimeError: If a task model fails to load or the warm-up fails
+                (the active set is left untouched)
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise RegistryBusyError("A model reload is already running")
+        try:
+            started = time.perf_counter()
+            phases = StartupPhases(origin=started)
+            before = memory_snapshot()
+            current = self.active
+            model_set = self.build(specs, current, phases)
+            missing = sorted(set(specs) - set(model_set.models))
+            if missing:
+                raise RuntimeError(f"Failed to load model(s): {', '.join(missing)}")
+            if self.warm_up is not None:
+                with phases.phase("warmup"):
+                    self.warm_up(model_set)
+            peak = memory_snapshot()  # Old and new sets both resident
+
+            self._generation += 1
+            model_set.generation = self._generation
+            model_set.loaded_at = time.time()
+            self._install(model_set)
+
+            previous_versions = current.versions if current is not None else {}
+            reused = [task for task, model in model_set.models.items()
+                      if current is not None and current.models.get(task) is model]
+            del current
+            gc.collect()  # Frees the replaced set now unless it is kept or still serving requests
+            report = ReloadReport(
+                action="reload",
+                generation=model_set.generation,
+                versions=model_set.versions,
+                previous_versions=previous_versions,
+                reused=reused,
+                phases_ms=phases.as_dict()["phases_ms"],
+                total_ms=round((time.perf_counter() - started) * 1000, 1),
+                memory_mb=self._memory_delta(before, peak, memory_snapshot()),
+            )
+            self.history.append(report)
+            logger.info(f"🔄 Models reloaded in {report.total_ms / 1000:.2f}s → generation {report.generation} "
+                        f"({', '.join(f'{task} {version}' for task, version in report.versions.items())})")
+            return report
+        finally:
+            self._reload_lock.release()
+
+    def rollback(self) -> ReloadReport:
+        """
+        Swaps the previous set back in; the rolled-back set becomes previous.
+
+        Raises:
+            RegistryBusyError: If a reload is running
+            LookupError: If there is no previous set
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise RegistryBusyError("A model reload is running")
+        try:
+            if self.previous is None:
+                raise LookupError("No previous model version to roll back to")
+            started = time.perf_counter()
+            before = memory_snapshot()
+            target, current = self.previous, self.active
+            self.active, self.previous = target, current
+            report = ReloadReport(
+                action="rollback",
+                generation=target.generation,
+                versions=target.versions,
+                previous_versions=current.versions,
+                total_ms=round((time.perf_counter() - started) * 1000, 1),
+                memory_mb=self._memory_delta(before, before, memory_snapshot()),
+            )
+            self.history.append(report)
+            logger.info(f"↩️  Rolled back to generation {target.generation} "
+                        f"({', '.join(f'{task} {version}' for task, version in target.versions.items())})")
+            return report
+        finally:
+            self._reload_lock.release()
+
+    @staticmethod
+    def _memory_delta(before: Dict, peak: Dict, after: Dict) -> Dict[str, Optional[float]]:
+        memory = {"rss_before": before.get("rss_mb"), "rss_peak": peak.get("rss_mb"), "rss_after": after.get("rss_mb")}
+        if memory["rss_before"] is not None and memory["rss_peak"] is not None:
+            # Extra memory held while both versions were resident
+            memory["overlap"] = round(memory["rss_peak"] - memory["rss_before"], 1)
+        if "cuda_allocated_mb" in before:
+            memory["cuda_before"] = before["cuda_allocated_mb"]
+            memory["cuda_peak"] = peak["cuda_allocated_mb"]
+            memory["cuda_after"] = after["cuda_allocated_mb"]
+        return memory
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active.info() if self.active is not None else None,
+            "previous": self.previous.info() if self.previous is not None else None,
+            "keep_previous": self.keep_previous,
+            "reloading": self.reloading,
+            "history": [report.as_dict() for report in self.history],
+        }
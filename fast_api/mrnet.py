@@ -0,0 +1,118 @@
+"""
+MRNet model definition shared by the AI service and its tools.
+"""
+
+import inspect
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+
+class BasicBlock(nn.Module):
+    """torchvision's ResNet BasicBlock (same submodule names, so same state_dict keys)."""
+
+    def __init__(self, in_planes: int, planes: int, stride: int = 1):
+        super().__init__()
+        self.conv1 = nn.Conv2d(in_planes, planes, 3, stride=stride, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(planes)
+        self.relu = nn.ReLU(inplace=True)
+        self.conv2 = nn.Conv2d(planes, planes, 3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(planes)
+        self.downsample = None
+        if stride != 1 or in_planes != planes:
+            self.downsample = nn.Sequential(
+                nn.Conv2d(in_planes, planes, 1, stride=stride, bias=False), nn.BatchNorm2d(planes)
+            )
+
+    def forward(self, x):
+        identity = x if self.downsample is None else self.downsample(x)
+        out = self.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return self.relu(out + identity)
+
+
+class ResNet18(nn.Module):
+    """
+    torchvision.models.resnet18 without importing torchvision (about 2 s of
+    service start-up). Checkpoints saved from either load into the other.
+
+    Args:
+        init_weights: Apply torchvision's Kaiming init to the convs; skipped
+            when a checkpoint overwrites them anyway
+    """
+
+    def __init__(self, init_weights: bool = True):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 64, 7, stride=2, padding=3, bias=False)
+        self.bn1 = nn.BatchNorm2d(64)
+        self.relu = nn.ReLU(inplace=True)
+        self.maxpool = nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
+        self.layer1 = nn.Sequential(BasicBlock(64, 64), BasicBlock(64, 64))
+        self.layer2 = nn.Sequential(BasicBlock(64, 128, stride=2), BasicBlock(128, 128))
+        self.layer3 = nn.Sequential(BasicBlock(128, 256, stride=2), BasicBlock(256, 256))
+        self.layer4 = nn.Sequential(BasicBlock(256, 512, stride=2), BasicBlock(512, 512))
+        self.avgpool = nn.AdaptiveAvgPool2d((1, 1))
+        self.fc = nn.Linear(512, 1000)
+        for m in self.modules() if init_weights else ():
+            if isinstance(m, nn.Conv2d):
+                nn.init.kaiming_normal_(m.weight, mode="fan_out", nonlinearity="relu")
+
+    def forward(self, x):
+        x = self.maxpool(self.relu(self.bn1(self.conv1(x))))
+        x = self.layer4(self.layer3(self.layer2(self.layer1(x))))
+        return self.fc(torch.flatten(self.avgpool(x), 1))
+
+
+class MRNetModel(nn.Module):
+    def __init__(self, init_weights: bool = True):
+        super().__init__()
+        self.backbone = ResNet18(init_weights)
+        self.backbone.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(512, 1))
+    def forward(self, x):
+        return self.backbone(x)
+
+    def forward_features(self, x):
+        """Returns (logits (B, 1), layer4 features (B, 512, h, w))."""
+        b = self.backbone
+        x = b.maxpool(b.relu(b.bn1(b.conv1(x))))
+        features = b.layer4(b.layer3(b.layer2(b.layer1(x))))
+        logits = b.fc(torch.flatten(b.avgpool(features), 1))
+        return logits, features
+
+
+def load_mrnet(path: str, device: torch.device, mmap: bool = False) -> MRNetModel:
+    """
+    Load a checkpoint into a new MRNetModel in eval mode.
+
+    The model is built on the meta device and the checkpoint tensors are
+    assigned to it, skipping ResNet18's random initialization. With mmap=True
+    (CPU only) torch.load maps the checkpoint instead of reading it, so the
+    weights are paged in from the page cache on first use and shared with any
+    other process mapping the same file.
+
+    Raises:
+        FileNotFoundError: If the checkpoint does not exist
+    """
+    options = {}
+    if mmap and device.type == "cpu" and "mmap" in inspect.signature(torch.load).parameters:
+        options["mmap"] = True
+    try:
+        state_dict = torch.load(path, map_location=device, weights_only=True, **options)
+    except RuntimeError as e:
+        if not options:
+            raise
+        # Legacy (non-zip) checkpoints cannot be mapped
+        logger.warning(f"⚠️  Cannot mmap {path}, loading it into memory: {str(e)}")
+        state_dict = torch.load(path, map_location=device, weights_only=True)
+
+    if "assign" not in inspect.signature(nn.Module.load_state_dict).parameters:
+        model = MRNetModel()
+        model.load_state_dict(state_dict)
+        return model.to(device).eval()
+    with torch.device("meta"):
+        model = MRNetModel(init_weights=False)
+    model.load_state_dict(state_dict, assign=True)
+    return model.eval()
@@ -0,0 +1,316 @@
+"""
+Batched Slice Preprocessing
+Decodes all DICOM slices of a request and prepares them in one pass:
+per-slice min/max statistics are computed once and shared by the model
+tensor path and the uint8 visual path, same-shaped slices are normalized
+and resized together, and float32 work buffers are reused between calls.
+
+The output matches the training normalization bit for bit:
+    x = (x - min) / (max - min)  (zeros for constant slices)
+    Resize((256, 256), antialias=True)
+and the visual image is uint8(normalized * 255), which is exactly what the
+old separate NumPy path produced.
+
+Multi-frame volumes are opened once and only the frames that are analyzed
+(the middle slices, as picked by dicom_related/extract_dicom_slices.py) are
+decoded.
+"""
+
+import io
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pydicom
+import torch
+import torch.nn.functional as F
+from pydicom.encaps import encapsulate, generate_pixel_data_frame
+from pydicom.pixel_data_handlers.util import pixel_dtype
+
+from dicom_related.extract_dicom_slices import middle_slice_indices
+
+TARGET_SIZE = (256, 256)
+MIN_VOLUME_FRAMES = 3
+
+# Returns the raw 2D pixel arrays for a list of slice positions in a study
+SliceDecoder = Callable[[List[int]], List[np.ndarray]]
+
+_buffers = threading.local()
+
+
+def _resize(stack: torch.Tensor) -> torch.Tensor:
+    """
+    Bilinear, antialiased resize of (N, H, W) to TARGET_SIZE. Same kernel as
+    torchvision's transforms.Resize(TARGET_SIZE, antialias=True) on tensors,
+    without importing torchvision at startup.
+    """
+    if tuple(stack.shape[-2:]) == TARGET_SIZE:
+        return stack
+    return F.interpolate(stack.unsqueeze(0), size=TARGET_SIZE, mode="bilinear",
+                         align_corners=False, antialias=True).squeeze(0)
+
+
+def _work_buffer(shape: Tuple[int, ...]) -> np.ndarray:
+    """Per-thread float32 scratch buffer, reused while the shape repeats."""
+    cache: Dict[Tuple[int, ...], np.ndarray] = getattr(_buffers, "by_shape", None)
+    if cache is None:
+        cache = _buffers.by_shape = {}
+    buffer = cache.get(shape)
+    if buffer is None:
+        if len(cache) >= 4:
+            cache.clear()  # Bound memory when slice shapes keep changing
+        buffer = cache[shape] = np.empty(shape, dtype=np.float32)
+    return buffer
+
+
+def decode_slice(file_bytes: bytes) -> np.ndarray:
+    """
+    Parses a single 2D DICOM slice and returns its raw pixel array.
+
+    Raises:
+        pydicom.errors.InvalidDicomError: If the bytes are not DICOM
+        ValueError: If the file is not a single 2D slice
+    """
+    ds = pydicom.dcmread(io.BytesIO(file_bytes))
+    pixel_array = ds.pixel_array
+    if len(pixel_array.shape) != 2:
+        raise ValueError(f"Expected 2D DICOM slice, got shape: {pixel_array.shape}")
+    return pixel_array
+
+
+def open_volume(file_bytes: bytes) -> pydicom.Dataset:
+    """
+    Parses a multi-frame DICOM volume without decoding its pixel data.
+
+    Raises:
+        pydicom.errors.InvalidDicomError: If the bytes are not DICOM
+        ValueError: If the file is not a volume with enough frames
+    """
+    ds = pydicom.dcmread(io.BytesIO(file_bytes))
+    if "PixelData" not in ds:
+        raise ValueError("DICOM volume has no pixel data")
+    num_frames = volume_frame_count(ds)
+    if num_frames < MIN_VOLUME_FRAMES:
+        raise ValueError(f"Expected 3D DICOM volume with at least {MIN_VOLUME_FRAMES} frames, got {num_frames}")
+    return ds
+
+
+def volume_frame_count(ds: pydicom.Dataset) -> int:
+    return int(getattr(ds, "NumberOfFrames", 1) or 1)
+
+
+def volume_slice_indices(ds: pydicom.Dataset) -> List[int]:
+    """Frames analyzed for a volume: the same middle slices extract_middle_slices picks."""
+    return middle_slice_indices(volume_frame_count(ds))
+
+
+def describe_dicom(file_bytes: bytes) -> Dict[str, Any]:
+    """
+    Header facts that drive decode cost (transfer syntax, geometry, frames),
+    read without touching the pixel data.
+    """
+    info: Dict[str, Any] = {"bytes": len(file_bytes)}
+    try:
+        ds = pydicom.dcmread(io.BytesIO(file_bytes), stop_before_pixels=True)
+    except Exception as e:
+        info["error"] = str(e)
+        return info
+    transfer_syntax = getattr(getattr(ds, "file_meta", None), "TransferSyntaxUID", None)
+    if transfer_syntax is not None:
+        info["transfer_syntax"] = f"{transfer_syntax.name} ({transfer_syntax})"
+        info["compressed"] = transfer_syntax.is_compressed
+    for key, attribute in (("rows", "Rows"), ("columns", "Columns"), ("bits_allocated", "BitsAllocated"),
+                           ("samples_per_pixel", "SamplesPerPixel")):
+        if attribute in ds:
+            info[key] = int(ds.get(attribute))
+    info["frames"] = volume_frame_count(ds)
+    return info
+
+
+def decode_frames(ds: pydicom.Dataset, indices: Sequence[int]) -> List[np.ndarray]:
+    """
+    Decodes only the requested frames of a multi-frame volume.
+
+    Uncompressed single-channel pixel data is read straight from the frame
+    offsets; other native layouts (signed sub-word, colour, packed bits) and
+    encapsulated (compressed) pixel data are decoded one frame at a time,
+    so no decoded copy of the whole volume is kept. Only 1-bit frames that
+    do not end on a byte boundary fall back to decoding the whole volume.
+
+    Returns:
+        List of raw (H, W) frames, same values as ds.pixel_array[index]
+    """
+    if ds.file_meta.TransferSyntaxUID.is_encapsulated:
+        return decode_encapsulated_frames(ds, indices)
+
+    bits_allocated = ds.BitsAllocated
+    direct = (
+        bits_allocated in (8, 16, 32)
+        and getattr(ds, "SamplesPerPixel", 1) == 1
+        and not (ds.PixelRepresentation == 1 and ds.BitsStored < bits_allocated)
+    )
+    if not direct:
+        return decode_native_frames(ds, indices)
+
+    rows, columns = ds.Rows, ds.Columns
+    frame_pixels = rows * columns
+    frame_bytes = frame_pixels * bits_allocated // 8
+    pixel_data = ds.PixelData
+    dtype = pixel_dtype(ds)
+    if len(pixel_data) < frame_bytes * volume_frame_count(ds):
+        raise ValueError(f"DICOM pixel data is truncated ({len(pixel_data)} bytes)")
+    return [
+        np.frombuffer(pixel_data, dtype=dtype, count=frame_pixels, offset=i * frame_bytes).reshape(rows, columns)
+        for i in indices
+    ]
+
+
+# Image Pixel module attributes a single-frame dataset needs to be decoded
+_FRAME_ATTRIBUTES = (
+    "Rows", "Columns", "SamplesPerPixel", "PhotometricInterpretation", "PlanarConfiguration",
+    "BitsAllocated", "BitsStored", "HighBit", "PixelRepresentation",
+)
+
+
+def _frame_dataset(ds: pydicom.Dataset, pixel_data: bytes, encapsulated: bool) -> pydicom.Dataset:
+    """Single-frame dataset with ds's Image Pixel attributes around one frame's pixel data."""
+    frame_ds = pydicom.Dataset()
+    frame_ds.file_meta = ds.file_meta
+    frame_ds.is_little_endian, frame_ds.is_implicit_VR = ds.is_little_endian, ds.is_implicit_VR
+    for keyword in _FRAME_ATTRIBUTES:
+        if keyword in ds:
+            setattr(frame_ds, keyword, ds.data_element(keyword).value)
+    frame_ds.NumberOfFrames = 1
+    frame_ds.PixelData = encapsulate([pixel_data]) if encapsulated else pixel_data
+    frame_ds["PixelData"].VR = "OW" if not encapsulated and ds.BitsAllocated > 8 else "OB"
+    return frame_ds
+
+
+def decode_native_frames(ds: pydicom.Dataset, indices: Sequence[int]) -> List[np.ndarray]:
+    """
+    Decodes the requested frames of uncompressed pixel data that cannot be
+    viewed directly (signed sub-word, colour, packed bits), one at a time.
+    """
+    frame_bits = ds.Rows * ds.Columns * getattr(ds, "SamplesPerPixel", 1) * ds.BitsAllocated
+    if frame_bits % 8:
+        volume = ds.pixel_array  # 1-bit frames sharing bytes: no per-frame byte range
+        return [volume[i] for i in indices]
+    frame_bytes = frame_bits // 8
+    pixel_data = ds.PixelData
+    if len(pixel_data) < frame_bytes * volume_frame_count(ds):
+        raise ValueError(f"DICOM pixel data is truncated ({len(pixel_data)} bytes)")
+    return [
+        _frame_dataset(ds, pixel_data[i * frame_bytes:(i + 1) * frame_bytes], encapsulated=False).pixel_array
+        for i in indices
+    ]
+
+
+def decode_encapsulated_frames(ds: pydicom.Dataset, indices: Sequence[int]) -> List[np.ndarray]:
+    """
+    Decodes the requested frames of compressed pixel data one at a time.
+
+    Each frame's fragments are wrapped in a single-frame dataset and decoded
+    by pydicom's handler for the transfer syntax, so peak memory is one
+    decoded frame plus the compressed volume, whatever the series length.
+    """
+    wanted = set(indices)
+    decoded: Dict[int, np.ndarray] = {}
+    for i, frame in enumerate(generate_pixel_data_frame(ds.PixelData, volume_frame_count(ds))):
+        if i not in wanted:
+            continue
+        decoded[i] = _frame_dataset(ds, frame, encapsulated=True).pixel_array
+        if len(decoded) == len(wanted):
+            break
+    missing = wanted - decoded.keys()
+    if missing:
+        raise ValueError(f"DICOM pixel data is truncated (frame {min(missing)} missing)")
+    return [decoded[i] for i in indices]
+
+
+def normalize_stack(pixel_arrays: List[np.ndarray], visuals: bool = True) -> Tuple[torch.Tensor, List[np.ndarray]]:
+    """
+    Normalizes and resizes same-shaped 2D slices together.
+
+    Args:
+        pixel_arrays: N raw (H, W) slices of identical shape
+        visuals: Also build the uint8 visual images (empty list if False)
+
+    Returns:
+        tuple: (tensor, visual_imgs)
+            - tensor: Float32 CPU tensor (N, 256, 256)
+            - visual_imgs: N uint8 arrays (H, W) for heatmap visualization
+    """
+    n = len(pixel_arrays)
+    height, width = pixel_arrays[0].shape
+    stack = _work_buffer((n, height, width))
+    for i, pixel_array in enumerate(pixel_arrays):
+        np.copyto(stack[i], pixel_array, casting="unsafe")  # float32, like .astype(np.float32)
+
+    # Statistics computed once per slice, shared by both paths
+    flat = stack.reshape(n, -1)
+    mins = flat.min(axis=1)
+    maxs = flat.max(axis=1)
+    ranges = maxs - mins
+    constant = ranges <= 0
+
+    np.subtract(stack, mins[:, None, None], out=stack)
+    np.divide(stack, np.where(constant, 1, ranges)[:, None, None], out=stack)
+    if constant.any():
+        stack[constant] = 0.0
+
+    # --- PATH B: FOR HEATMAP (Visual only) ---
+    visual_imgs = [np.uint8(stack[i] * 255.0) for i in range(n)] if visuals else []
+
+    # --- PATH A: FOR AI MODEL (High Precision) ---
+    tensor = _resize(torch.from_numpy(stack))
+    if np.shares_memory(tensor.numpy(), stack):
+        tensor = tensor.clone()  # Already 256x256: detach from the reused buffer
+    return tensor, visual_imgs
+
+
+def preprocess_slices(slices: List[bytes]) -> Tuple[torch.Tensor, List[np.ndarray]]:
+    """
+    Decodes and preprocesses all slices of a request.
+
+    Args:
+        slices: Raw DICOM bytes, one 2D slice each
+
+    Returns:
+        tuple: (tensor, visual_imgs)
+            - tensor: Float32 CPU tensor (N, 256, 256), one channel per slice
+            - visual_imgs: N uint8 arrays (H, W)
+    """
+    return preprocess_arrays([decode_slice(file_bytes) for file_bytes in slices])
+
+
+def preprocess_arrays(pixel_arrays: List[np.ndarray], visuals: bool = True) -> Tuple[torch.Tensor, List[np.ndarray]]:
+    """
+    Preprocesses decoded 2D slices (see preprocess_slices). With visuals=False
+    only the model tensor is built.
+    """
+    # Slices of one series normally share a shape; group them just in case
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for i, pixel_array in enumerate(pixel_arrays):
+        groups.setdefault(pixel_array.shape, []).append(i)
+
+    if len(groups) == 1:
+        return normalize_stack(pixel_arrays, visuals)
+
+    tensor = torch.empty((len(pixel_arrays),) + TARGET_SIZE, dtype=torch.float32)
+    visual_imgs: List[np.ndarray] = [None] * len(pixel_arrays) if visuals else []
+    for indices in groups.values():
+        group_tensor, group_visuals = normalize_stack([pixel_arrays[i] for i in indices], visuals)
+        tensor[indices] = group_tensor
+        for i, visual in zip(indices, group_visuals):
+            visual_imgs[i] = visual
+    return tensor, visual_imgs
+
+
+def slice_decoder(slices: List[bytes]) -> SliceDecoder:
+    """Decoder for positions of a study sent as separate 2D slice files."""
+    return lambda positions: [decode_slice(slices[i]) for i in positions]
+
+
+def volume_decoder(ds: pydicom.Dataset, indices: List[int]) -> SliceDecoder:
+    """Decoder for positions of a study taken from frames of one volume."""
+    return lambda positions: decode_frames(ds, [indices[i] for i in positions])
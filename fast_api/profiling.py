@@ -0,0 +1,195 @@
+"""
+Per-Request Profiling
+Opt-in breakdown of one analysis request, returned in its response
+metadata: wall and CPU time per stage (the same stages /metrics times),
+torch profiler operator summaries per model forward, peak Python
+allocations (tracemalloc) and the RSS delta.
+
+The active profile lives in a context variable, so the stage and forward
+hooks cost one lookup when no request is being profiled. Work handed to a
+thread (run_in_executor) is only seen when it runs in a copied context.
+
+CPU time is process CPU time, so torch's intra-op threads are included,
+and so is any other traffic the process served meanwhile; profile on a
+quiet worker for clean numbers. tracemalloc is process-wide too: callers
+run one profiled request at a time.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import torch
+
+from workers import process_memory
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_profiler_ready = False
+
+
+def _init_torch_profiler() -> None:
+    """One empty profile: the profiler's first start takes seconds, which no request should be charged for."""
+    global _profiler_ready
+    if not _profiler_ready:
+        from torch.profiler import ProfilerActivity, profile
+
+        with profile(activities=[ProfilerActivity.CPU]):
+            pass
+        _profiler_ready = True
+
+
+class RequestProfile:
+    """
+    Collects the breakdown of one request.
+
+    Args:
+        top_ops: Operators kept per model in the summary (by self CPU time)
+    """
+
+    def __init__(self, top_ops: int = 15):
+        self.top_ops = top_ops
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.forwards: Dict[str, Dict[str, Any]] = {}
+        self.inputs: list = []
+        self._tasks_ms: Dict[str, float] = {}  # Per-task times of the forward being profiled
+        self._overhead = [0.0, 0.0]  # Wall, CPU seconds spent in the torch profiler itself
+        self._started: Optional[float] = None
+        self._rss_before: Optional[float] = None
+        self._python_baseline = 0
+        self._owns_tracemalloc = False
+        self._result: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def activate(self):
+        """Makes this the profile of the current context until the block exits."""
+        _init_torch_profiler()  # Before tracemalloc, which slows it down further
+        self._rss_before = process_memory().get("rss_mb")
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._python_baseline = tracemalloc.get_traced_memory()[0]
+        self._started = time.perf_counter()
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+            self.finish()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times a stage, minus the profiler overhead of forwards inside it."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        overhead_wall, overhead_cpu = self._overhead
+        try:
+            yield
+        finally:
+            totals = self.stages.setdefault(name, {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0})
+            totals["calls"] += 1
+            totals["wall_ms"] += (time.perf_counter() - wall - (self._overhead[0] - overhead_wall)) * 1000
+            totals["cpu_ms"] += (time.process_time() - cpu - (self._overhead[1] - overhead_cpu)) * 1000
+
+    @contextmanager
+    def forward(self, model: str, backend: str):
+        """Runs a model forward under the torch profiler and merges its operator totals."""
+        from torch.profiler import ProfilerActivity, profile
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        self._tasks_ms = {}
+        outer_wall, outer_cpu = time.perf_counter(), time.process_time()
+        with profile(activities=activities, profile_memory=True) as profiler:
+            wall, cpu = time.perf_counter(), time.process_time()
+            yield
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        events = profiler.key_averages()
+        self._overhead[0] += time.perf_counter() - outer_wall - wall
+        self._overhead[1] += time.process_time() - outer_cpu - cpu
+        entry = self.forwards.setdefault(model, {
+            "backend": backend, "calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "tasks_ms": {}, "operators": {}
+        })
+        entry["calls"] += 1
+        entry["wall_ms"] += wall * 1000
+        entry["cpu_ms"] += cpu * 1000
+        for task, ms in self._tasks_ms.items():
+            entry["tasks_ms"][task] = entry["tasks_ms"].get(task, 0.0) + ms
+        for event in events:
+            op = entry["operators"].setdefault(event.key, {
+                "calls": 0, "self_cpu_ms": 0.0, "cpu_total_ms": 0.0, "self_cpu_memory_mb": 0.0
+            })
+            op["calls"] += event.count
+            op["self_cpu_ms"] += event.self_cpu_time_total / 1000
+            op["cpu_total_ms"] += event.cpu_time_total / 1000
+            op["self_cpu_memory_mb"] += event.self_cpu_memory_usage / 1e6
+            if torch.cuda.is_available():
+                op["self_device_ms"] = op.get("self_device_ms", 0.0) + event.self_device_time_total / 1000
+
+    def task_forward(self, task: str, seconds: float) -> None:
+        """Per-task time inside the forward being profiled (eager per-model engine)."""
+        self._tasks_ms[task] = self._tasks_ms.get(task, 0.0) + seconds * 1000
+
+    def finish(self) -> Dict[str, Any]:
+        """Stops the clocks (once) and returns the breakdown."""
+        if self._result is not None:
+            return self._result
+        total_ms = (time.perf_counter() - self._started) * 1000
+        current, peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        rss_after = process_memory().get("rss_mb")
+        self._result = {
+            "total_ms": round(total_ms, 2),
+            "profiler_overhead_ms": round(self._overhead[0] * 1000, 2),  # Included in total_ms, not in the stages
+            "stages": {
+                name: {"calls": totals["calls"], "wall_ms": round(totals["wall_ms"], 2), "cpu_ms": round(totals["cpu_ms"], 2)}
+                for name, totals in self.stages.items()
+            },
+            "model_forwards": {model: self._forward_summary(entry) for model, entry in self.forwards.items()},
+            "inputs": self.inputs,
+            "memory": {
+                "python_peak_mb": round((peak - self._python_baseline) / 1e6, 3),
+                "python_retained_mb": round((current - self._python_baseline) / 1e6, 3),
+                "rss_before_mb": self._rss_before,
+                "rss_after_mb": rss_after,
+                "rss_delta_mb": round(rss_after - self._rss_before, 1)
+                if rss_after is not None and self._rss_before is not None else None,
+            },
+        }
+        return self._result
+
+    def _forward_summary(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        operators = sorted(entry["operators"].items(), key=lambda item: item[1]["self_cpu_ms"], reverse=True)
+        summary = {
+            "backend": entry["backend"],
+            "calls": entry["calls"],
+            "wall_ms": round(entry["wall_ms"], 2),
+            "cpu_ms": round(entry["cpu_ms"], 2),
+            "operators": [
+                {"op": name, **{key: round(value, 3) for key, value in op.items()}}
+                for name, op in operators[:self.top_ops]
+            ],
+        }
+        if entry["tasks_ms"]:
+            summary["tasks_ms"] = {task: round(ms, 2) for task, ms in entry["tasks_ms"].items()}
+        return summary
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """The profile of the request being handled in this context, if any."""
+    return _current.get()
+
+
+def profile_stage(name: str):
+    """Times the block as a stage of the current profile (no-op when not profiling)."""
+    profile = _current.get()
+    return profile.stage(name) if profile is not None else nullcontext()
+
+
+def profile_forward(model: str, backend: str):
+    """Torch-profiles the block as a forward of model (no-op when not profiling)."""
+    profile = _current.get()
+    return profile.forward(model, backend) if profile is not None else nullcontext()
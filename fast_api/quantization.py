@@ -0,0 +1,166 @@
+"""
+INT8 Quantization
+Post-training quantization of MRNetModel checkpoints for CPU inference.
+
+'static' quantizes every convolution and the fc head to INT8 with FX graph
+mode (BatchNorm folded into the convs). It needs a calibration pass over
+representative slices to pick activation ranges. 'dynamic' only quantizes
+nn.Linear weights, which for ResNet18 is the single fc layer, so it barely
+changes latency; it is kept for comparison.
+
+Quantized models keep the forward_features interface, (logits (B, 1),
+layer4 features (B, 512, h, w)), so CAMs still work. They are saved as
+frozen TorchScript next to the fp32 checkpoint (acl_model.pth ->
+acl_model.int8.ts), with a sidecar .json like the inference_backends
+artifacts.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pydicom
+import torch
+import torch.nn as nn
+
+from inference_backends import FeaturesModule, checkpoint_fingerprint
+from preprocessing import decode_slice, open_volume, preprocess_arrays, volume_frame_count
+from volume_inference import load_chunk
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("static", "dynamic")
+INT8_SUFFIX = ".int8.ts"
+
+
+def int8_artifact_path(checkpoint_path: str) -> Path:
+    """models/acl_model.pth -> models/acl_model.int8.ts"""
+    path = Path(checkpoint_path)
+    return path.with_name(path.stem + INT8_SUFFIX)
+
+
+def quantization_engine() -> str:
+    """Quantized kernel library for this CPU ('x86' or 'fbgemm', else 'qnnpack' on ARM)."""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError(f"No quantized engine available (supported: {engines})")
+
+
+def load_calibration_inputs(folder: str, max_samples: int = 64) -> torch.Tensor:
+    """
+    Builds model inputs (N, 3, 256, 256) from the DICOM files in a folder,
+    preprocessed exactly like the service does.
+
+    Multi-frame volumes contribute one 3-slice window per slice (as in
+    full-volume mode). 2D slice files are taken in sorted filename order
+    and grouped in consecutive triplets, like the files
+    extract_middle_slices writes (scan_1.dcm, scan_2.dcm, scan_3.dcm).
+    """
+    windows: List[torch.Tensor] = []
+    pending_slices = []
+    count = 0
+    for path in sorted(Path(folder).glob("**/*.dcm")):
+        if count >= max_samples:
+            break
+        file_bytes = path.read_bytes()
+        try:
+            ds = open_volume(file_bytes)
+        except (pydicom.errors.InvalidDicomError, ValueError):
+            ds = None
+        if ds is not None:
+            end = min(volume_frame_count(ds), max_samples - count)
+            windows.append(load_chunk(ds, 0, end))
+            count += end
+            continue
+        try:
+            pending_slices.append(decode_slice(file_bytes))
+        except Exception as e:
+            logger.warning(f"⚠️  Skipping {path}: {str(e)}")
+            continue
+        if len(pending_slices) == 3:
+            tensor, _ = preprocess_arrays(pending_slices, visuals=False)
+            windows.append(tensor.unsqueeze(0))
+            pending_slices = []
+            count += 1
+    if not windows:
+        raise ValueError(f"No usable DICOM slices or volumes found in {folder}")
+    return torch.cat(windows)[:max_samples]
+
+
+def quantize_model(model: nn.Module, mode: str = "static",
+                   calibration: Optional[Iterable[torch.Tensor]] = None) -> torch.jit.ScriptModule:
+    """
+    Quantize an MRNetModel to INT8 and freeze it as TorchScript.
+
+    Args:
+        model: fp32 MRNetModel in eval mode, on CPU
+        mode: 'static' (convs + fc, needs calibration) or 'dynamic' (fc only)
+        calibration: Batches (B, 3, 256, 256) used to observe activation ranges
+
+    Returns:
+        Frozen ScriptModule returning (logits, features)
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported quantization mode: {mode}")
+    engine = quantization_engine()
+    torch.backends.quantized.engine = engine
+    example = torch.rand(1, 3, 256, 256)
+    wrapper = FeaturesModule(model).eval()
+
+    if mode == "dynamic":
+        quantized = torch.ao.quantization.quantize_dynamic(wrapper, {nn.Linear}, dtype=torch.qint8)
+    else:
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if calibration is None:
+            raise ValueError("Static quantization needs calibration batches")
+        prepared = prepare_fx(wrapper, get_default_qconfig_mapping(engine), (example,))
+        with torch.no_grad():
+            for batch in calibration:
+                prepared(batch)
+        quantized = convert_fx(prepared)
+
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(quantized.eval(), example, check_trace=False))
+
+
+def save_int8_artifact(module: torch.jit.ScriptModule, checkpoint_path: str, mode: str,
+                       calibration_samples: int) -> Path:
+    """Write the quantized model next to its checkpoint, plus a sidecar .json."""
+    path = int8_artifact_path(checkpoint_path)
+    torch.jit.save(module, str(path))
+    path.with_name(path.name + ".json").write_text(json.dumps({
+        "backend": "int8",
+        "mode": mode,
+        "quantized_engine": torch.backends.quantized.engine,
+        "calibration_samples": calibration_samples,
+        "checkpoint_sha256": checkpoint_fingerprint([checkpoint_path]),
+        "torch_version": torch.__version__,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, indent=2))
+    return path
+
+
+def load_int8_artifact(checkpoint_path: str) -> torch.jit.ScriptModule:
+    """
+    Load the quantized model for a checkpoint.
+
+    Raises:
+        RuntimeError: If the artifact is missing or was built from another checkpoint
+    """
+    path = int8_artifact_path(checkpoint_path)
+    if not path.exists():
+        raise RuntimeError(f"No INT8 artifact at {path} (run quantize_models.py)")
+    try:
+        info = json.loads(path.with_name(path.name + ".json").read_text())
+    except (OSError, ValueError):
+        info = {}
+    if info.get("checkpoint_sha256") != checkpoint_fingerprint([checkpoint_path]):
+        raise RuntimeError(f"{path} was quantized from a different checkpoint (re-run quantize_models.py)")
+    torch.backends.quantized.engine = info.get("quantized_engine") or quantization_engine()
+    return torch.jit.load(str(path), map_location="cpu")
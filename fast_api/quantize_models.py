@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+INT8 Model Quantizer
+Quantizes the ACL, meniscus and abnormal checkpoints in models/ to INT8
+(quantization.py) and writes each next to its checkpoint
+(acl_model.pth -> acl_model.int8.ts). It then compares every INT8 model
+against fp32 on an evaluation set and writes a report with file size,
+batch-1 CPU latency, probability deltas and 0.5-threshold decision flips.
+
+Calibrate on real studies: a folder of DICOM files (multi-frame volumes,
+or 2D slices grouped three at a time in filename order). The service runs
+them with INFERENCE_BACKEND=int8.
+
+Usage:
+    python quantize_models.py --calibration-dir data/calibration --eval-dir data/eval
+    python quantize_models.py --mode dynamic --calibration-dir data/calibration
+    python quantize_models.py --synthetic          # random inputs, smoke test only
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import torch
+
+from mrnet import MRNetModel
+from quantization import (
+    QUANTIZATION_MODES, int8_artifact_path, load_calibration_inputs, load_int8_artifact, quantize_model,
+    save_int8_artifact,
+)
+
+TASKS = ["acl", "meniscus", "abnormal"]
+
+
+def time_module(module, iterations):
+    x = torch.rand(1, 3, 256, 256)
+    with torch.no_grad():
+        module(x)  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            module(x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def probabilities(module, inputs, batch_size=8):
+    with torch.no_grad():
+        logits = torch.cat([module(inputs[i:i + batch_size])[0] for i in range(0, len(inputs), batch_size)])
+    return torch.sigmoid(logits.float()).squeeze(1)
+
+
+def load_inputs(folder, max_samples, synthetic, label):
+    if folder:
+        inputs = load_calibration_inputs(folder, max_samples)
+        print(f"📂 {label}: {len(inputs)} windows from {folder}")
+        return inputs
+    if not synthetic:
+        raise SystemExit(f"❌ No {label.lower()} folder given (use --synthetic for a random-input smoke test)")
+    print(f"⚠️  {label}: {max_samples} random windows. Activation ranges will not match real MRI, "
+          f"do not ship these artifacts.")
+    return torch.rand(max_samples, 3, 256, 256)
+
+
+def main(args):
+    torch.manual_seed(0)
+    calibration = load_inputs(args.calibration_dir, args.max_samples, args.synthetic, "Calibration")
+    if args.eval_dir:
+        evaluation = load_inputs(args.eval_dir, args.max_samples, args.synthetic, "Evaluation")
+    else:
+        print("ℹ️  No --eval-dir, evaluating on the calibration windows (optimistic)")
+        evaluation = calibration
+
+    print("=" * 70)
+    print(f"🔢 INT8 QUANTIZATION ({args.mode})")
+    print("=" * 70)
+    print(f"Threads: {torch.get_num_threads()}, calibration windows: {len(calibration)}, "
+          f"evaluation windows: {len(evaluation)}\n")
+
+    report = {
+        "mode": args.mode,
+        "calibration_dir": args.calibration_dir,
+        "calibration_samples": len(calibration),
+        "eval_dir": args.eval_dir,
+        "eval_samples": len(evaluation),
+        "synthetic": args.calibration_dir is None,
+        "threads": torch.get_num_threads(),
+        "torch_version": torch.__version__,
+        "tasks": {},
+    }
+    print(f"{'task':10s} {'fp32 MB':>8s} {'int8 MB':>8s} {'fp32 ms':>8s} {'int8 ms':>8s} "
+          f"{'max Δp':>8s} {'mean Δp':>8s} {'flips':>6s}")
+    for task in TASKS:
+        checkpoint = Path(args.models_dir) / f"{task}_model.pth"
+        if not checkpoint.exists():
+            print(f"⚠️  Skipping {task}: {checkpoint} not found")
+            continue
+        model = MRNetModel()
+        model.load_state_dict(torch.load(checkpoint, map_location="cpu", weights_only=True))
+        model.eval()
+
+        if not args.no_export:
+            batches = calibration.split(args.batch_size)
+            save_int8_artifact(quantize_model(model, args.mode, batches), str(checkpoint),
+                               args.mode, len(calibration))
+        try:
+            quantized = load_int8_artifact(str(checkpoint))
+        except RuntimeError as e:
+            print(f"{task:10s} ❌ {str(e)}")
+            continue
+
+        fp32_probs = probabilities(model.forward_features, evaluation)
+        int8_probs = probabilities(quantized, evaluation)
+        delta = (int8_probs - fp32_probs).abs()
+        flips = int(((int8_probs > 0.5) != (fp32_probs > 0.5)).sum())
+        fp32_ms = time_module(model.forward_features, args.iterations)
+        int8_ms = time_module(quantized, args.iterations)
+        fp32_mb = checkpoint.stat().st_size / 1e6
+        int8_mb = int8_artifact_path(str(checkpoint)).stat().st_size / 1e6
+
+        report["tasks"][task] = {
+            "artifact": str(int8_artifact_path(str(checkpoint))),
+            "fp32_size_mb": round(fp32_mb, 2),
+            "int8_size_mb": round(int8_mb, 2),
+            "fp32_ms": round(fp32_ms, 2),
+            "int8_ms": round(int8_ms, 2),
+            "speedup": round(fp32_ms / int8_ms, 2),
+            "max_probability_delta": round(delta.max().item(), 5),
+            "mean_probability_delta": round(delta.mean().item(), 5),
+            "decision_flips": flips,
+        }
+        print(f"{task:10s} {fp32_mb:8.1f} {int8_mb:8.1f} {fp32_ms:8.1f} {int8_ms:8.1f} "
+              f"{delta.max().item():8.4f} {delta.mean().item():8.4f} {flips:6d}")
+
+    Path(args.report).write_text(json.dumps(report, indent=2))
+    print(f"\n📝 Report written to {args.report}")
+    print("'flips' counts evaluation windows whose prediction crosses 0.5 between fp32 and INT8.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize the task models to INT8 and report accuracy/latency")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES, default="static",
+                        help="static: convs + fc, calibrated; dynamic: fc weights only")
+    parser.add_argument("--calibration-dir", help="Folder of DICOM volumes or slices for calibration")
+    parser.add_argument("--eval-dir", help="Folder of DICOM volumes or slices for the fp32 vs INT8 report")
+    parser.add_argument("--max-samples", type=int, default=64, help="Max 3-slice windows per folder")
+    parser.add_argument("--batch-size", type=int, default=8, help="Calibration batch size")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed batch-1 forwards per model")
+    parser.add_argument("--report", default="models/int8_report.json")
+    parser.add_argument("--synthetic", action="store_true", help="Random inputs when no folder is given")
+    parser.add_argument("--no-export", action="store_true", help="Only report on existing INT8 artifacts")
+    main(parser.parse_args())
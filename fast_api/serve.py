@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Multi-Worker Server
+Loads the models once, then forks N uvicorn workers that share the weights
+copy-on-write and accept connections from one listening socket. Each worker
+gets its own intra-op thread budget (CPUs / workers by default), so the
+workers do not oversubscribe the cores. A worker that dies is re-forked from
+the parent, which still holds the loaded models; one that keeps exiting right
+after its fork is restarted with exponential backoff, then given up on.
+
+The parent logs per-worker RSS/PSS once the workers are up and on SIGUSR1
+(kill -USR1 <parent pid>); each worker also reports its own in /health.
+
+SIGHUP (kill -HUP <parent pid>) reloads the models from MODEL_MANIFEST in
+the parent, then replaces the workers one at a time: a new worker is forked
+from the reloaded parent before the old one is asked to stop, and the old
+one finishes its in-flight requests before exiting (uvicorn graceful
+shutdown). POST /models/reload only reloads a single process, so workers
+refuse it.
+
+Usage:
+    python serve.py --workers 4                  # 4 workers, CPUs/4 threads each
+    python serve.py --workers 2 --threads-per-worker 8 --port 5000
+    WORKERS=4 WORKER_THREADS=2 python serve.py
+"""
+
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import torch
+
+from workers import available_cpus, configure_worker, process_memory, threads_per_worker
+
+logger = logging.getLogger("serve")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(main, sock: socket.socket, index: int, workers: int, num_threads: int, args) -> None:
+    """Body of a forked worker process; never returns."""
+    import uvicorn
+
+    code = 0
+    try:
+        configure_worker(index, workers, num_threads)
+        model_set = main.active_models()
+        if model_set is not None and model_set.backend is not None:
+            model_set.backend.set_num_threads(num_threads)
+        logger.info(f"👷 Worker {index} (pid {os.getpid()}) serving with {num_threads} intra-op thread(s)")
+        config = uvicorn.Config(main.app, host=args.host, port=args.port, log_level=args.log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    except Exception as e:
+        logger.error(f"❌ Worker {index} failed: {str(e)}")
+        code = 1
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+def run_multithreaded(fn, num_threads: int):
+    """
+    Runs fn() on a helper thread with num_threads intra-op threads and
+    returns its result (or raises its exception).
+
+    OpenMP keeps its thread pool per calling thread, and a process forked
+    from a thread that has run a parallel region hangs in its own first
+    one. Loading, self-checks and reloads therefore run here at full speed,
+    while the main thread, which forks the workers, never starts a pool.
+    """
+    outcome = {}
+
+    def target():
+        torch.set_num_threads(num_threads)
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, name="model-loader")
+    thread.start()
+    thread.join()
+    torch.set_num_threads(1)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
+
+
+def restart_delay(failures: int, base: float, cap: float) -> float:
+    """Seconds before restarting a worker after its n-th consecutive quick failure (0 = at once)."""
+    return 0.0 if failures == 0 else min(cap, base * 2 ** (failures - 1))
+
+
+def log_memory(children: dict, parent_rss: float) -> None:
+    """Per-worker RSS/PSS table; sum of PSS vs N independent processes."""
+    logger.info(f"💾 {'worker':>6s} {'pid':>8s} {'RSS MB':>8s} {'PSS MB':>8s} {'shared MB':>10s} {'private MB':>11s}")
+    parent = process_memory()
+    total_pss = parent.get("pss_mb", 0.0)
+    rows = [("parent", os.getpid(), parent)] + [
+        (str(index), pid, process_memory(pid)) for pid, index in sorted(children.items(), key=lambda c: c[1])
+    ]
+    for name, pid, mem in rows:
+        shared = mem.get("shared_clean_mb", 0.0) + mem.get("shared_dirty_mb", 0.0)
+        private = mem.get("private_clean_mb", 0.0) + mem.get("private_dirty_mb", 0.0)
+        if name != "parent":
+            total_pss += mem.get("pss_mb", 0.0)
+        logger.info(f"💾 {name:>6s} {pid:8d} {mem.get('rss_mb', 0.0):8.1f} {mem.get('pss_mb', 0.0):8.1f} "
+                    f"{shared:10.1f} {private:11.1f}")
+    logger.info(f"💾 Total PSS (parent + {len(children)} workers): {total_pss:.0f} MB, vs ~{parent_rss * len(children):.0f} MB "
+                f"for {len(children)} independent processes ({parent_rss:.0f} MB each after loading)")
+
+
+def main(args):
+    workers = args.workers
+    num_threads = args.threads_per_worker or threads_per_worker(workers)
+
+    # The main thread stays single-threaded (see run_multithreaded); loading uses every CPU
+    torch.set_num_threads(1)
+
+    def load():
+        service = importlib.import_module("main")
+        service.load_inference_engine()  # Models, fusion, backend, self-checks (already done unless LAZY_STARTUP=1)
+        return service
+
+    service = run_multithreaded(load, available_cpus())
+
+    if service.active_models() is None or service.active_models().backend is None:
+        logger.error("❌ No models loaded, refusing to start workers")
+        sys.exit(1)
+    gc.collect()
+    gc.freeze()  # Keep the GC from touching (and so copying) objects inherited by the workers
+    parent_rss = process_memory().get("rss_mb", 0.0)
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"🚀 Starting {workers} worker(s) on {args.host}:{args.port} "
+                f"({num_threads} thread(s) each, {available_cpus()} CPU(s))")
+
+    children = {}  # pid -> worker index
+    retiring = set()  # Replaced workers finishing their requests after a reload
+    spawned_at = {}  # Worker index -> time.monotonic() of its last fork
+    quick_failures = {}  # Worker index -> consecutive exits soon after starting
+    restarts = {}  # Worker index -> time.monotonic() at which to restart it
+    given_up = set()  # Worker indexes that kept failing on startup
+    stopping = False
+    report_requested = False
+    reload_requested = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+            run_worker(service, sock, index, workers, num_threads, args)
+        children[pid] = index
+        spawned_at[index] = time.monotonic()
+
+    def terminate(pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        restarts.clear()
+        for pid in list(children) + list(retiring):
+            terminate(pid)
+
+    def request_reload(signum, frame):
+        nonlocal reload_requested
+        reload_requested = True
+
+    def rolling_reload() -> None:
+        """Reloads the models in the parent, then swaps in freshly forked workers one at a time."""
+        try:
+            report = run_multithreaded(
+                lambda: service.model_registry.reload(service.read_model_specs()), available_cpus()
+            )
+        except Exception as e:
+            logger.error(f"❌ Reload failed, workers keep the current models: {str(e)}")
+            return
+        logger.info(f"🔄 Reloaded in {report.total_ms / 1000:.2f}s (overlap {report.memory_mb.get('overlap')} MB), "
+                    f"replacing {len(children)} worker(s)")
+        gc.collect()
+        gc.freeze()
+        for pid, index in sorted(children.items(), key=lambda c: c[1]):
+            spawn(index)
+            children.pop(pid)
+            retiring.add(pid)
+            terminate(pid)
+        for index in sorted(given_up | set(restarts)):
+            logger.info(f"🔁 Retrying worker {index} with the reloaded models")
+            quick_failures.pop(index, None)
+            restarts.pop(index, None)
+            spawn(index)
+        given_up.clear()
+
+    def request_report(signum, frame):
+        nonlocal report_requested
+        report_requested = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, request_report)
+    signal.signal(signal.SIGHUP, request_reload)
+
+    for index in range(workers):
+        spawn(index)
+
+    report_at = time.monotonic() + args.memory_report_delay
+    while children or retiring or restarts:
+        pid, status = os.waitpid(-1, os.WNOHANG) if children or retiring else (0, 0)
+        if pid == 0:
+            if reload_requested and not stopping:
+                reload_requested = False
+                rolling_reload()
+            now = time.monotonic()
+            for index, restart_at in list(restarts.items()):
+                if now >= restart_at:
+                    del restarts[index]
+                    spawn(index)
+            if report_requested or (report_at is not None and time.monotonic() >= report_at):
+                log_memory(children, parent_rss)
+                report_requested, report_at = False, None
+            time.sleep(0.5)
+            continue
+        retiring.discard(pid)
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        if time.monotonic() - spawned_at[index] < args.quick_exit_seconds:
+            quick_failures[index] = quick_failures.get(index, 0) + 1
+        else:
+            quick_failures[index] = 0
+        if quick_failures[index] >= args.max_quick_restarts:
+            logger.error(f"❌ Worker {index} (pid {pid}) exited {quick_failures[index]} times within "
+                         f"{args.quick_exit_seconds:.0f}s of starting, not restarting it (SIGHUP retries)")
+            given_up.add(index)
+            continue
+        delay = restart_delay(quick_failures[index], args.restart_backoff, args.restart_backoff_max)
+        logger.warning(f"⚠️  Worker {index} (pid {pid}) exited with status {status}, restarting it in {delay:.1f}s")
+        restarts[index] = time.monotonic() + delay
+    sock.close()
+    if given_up and not stopping:
+        logger.error("❌ Every worker kept failing on startup, exiting")
+        sys.exit(1)
+    logger.info("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the CDSS AI service with forked workers sharing model weights")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "2")))
+    parser.add_argument("--threads-per-worker", type=int, default=int(os.getenv("WORKER_THREADS", "0")),
+                        help="Intra-op threads per worker (0 = CPUs / workers)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--memory-report-delay", type=float, default=10.0,
+                        help="Seconds after start before logging per-worker memory")
+    parser.add_argument("--restart-backoff", type=float, default=1.0,
+                        help="Delay before restarting a worker after a quick exit, doubled per repeat")
+    parser.add_argument("--restart-backoff-max", type=float, default=60.0)
+    parser.add_argument("--quick-exit-seconds", type=float, default=30.0,
+                        help="A worker exiting sooner than this after its fork counts as a startup failure")
+    parser.add_argument("--max-quick-restarts", type=int, default=5,
+                        help="Stop restarting a worker after this many consecutive quick exits")
+    main(parser.parse_args())
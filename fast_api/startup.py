@@ -0,0 +1,81 @@
+"""
+Startup Phases
+Wall-clock breakdown of service startup (imports, weight loading, fusion,
+backend build, self-checks), reported in /health. Times are measured from
+process start where the OS exposes it (/proc on Linux), so the 'imports'
+phase also covers interpreter start-up and uvicorn's own imports.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started (Linux), or None."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesized command name; starttime is field 22
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupPhases:
+    """
+    Records how long each startup phase took, in order.
+
+    Args:
+        origin: perf_counter() value the phases are measured from (default:
+            process start when known, else construction time)
+    """
+
+    def __init__(self, origin: Optional[float] = None):
+        if origin is None:
+            age = process_age()
+            origin = time.perf_counter() - (age or 0.0)
+        self.origin = origin
+        self._phases: List[Tuple[str, float]] = []
+        self._marks: Dict[str, float] = {}
+        self._last = origin
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the enclosed block as one phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self._record(name, self._last - started)
+
+    def since_last(self, name: str) -> None:
+        """Records the time since the previous phase ended (or since the origin)."""
+        now = time.perf_counter()
+        self._record(name, now - self._last)
+        self._last = now
+
+    def mark(self, name: str) -> None:
+        """Records a milestone, in seconds since the origin (e.g. 'models_ready')."""
+        with self._lock:
+            self._marks[name] = time.perf_counter() - self.origin
+
+    def elapsed(self, name: str) -> Optional[float]:
+        return self._marks.get(name)
+
+    def as_dict(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self._phases},
+                "milestones_s": {name: round(seconds, 3) for name, seconds in self._marks.items()},
+            }
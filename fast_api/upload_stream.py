@@ -0,0 +1,119 @@
+"""
+Streaming Multipart Uploads
+Parses multipart/form-data request bodies chunk by chunk with python-multipart.
+Each part is kept in memory, unlike FastAPI's UploadFile, which spools large
+parts to temporary files. Each part is hashed while it arrives, so its cache
+key is ready as soon as the part ends.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional
+
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+
+@dataclass
+class UploadedPart:
+    """One multipart field or file, fully received."""
+    name: str
+    filename: Optional[str]
+    content_type: Optional[str]
+    content: bytearray
+    sha256: str  # Hex digest of content, same as caching.content_hash
+
+
+class UploadError(Exception):
+    """Raised when an upload is not a usable multipart body."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def read_multipart(
+    content_type: str,
+    stream: AsyncIterator[bytes],
+    max_bytes: int,
+    max_parts: int = 16,
+) -> List[UploadedPart]:
+    """
+    Receive a multipart/form-data body into memory.
+
+    Args:
+        content_type: Request Content-Type header (carries the boundary)
+        stream: Request body chunks (e.g. Starlette's request.stream())
+        max_bytes: Maximum total body size
+        max_parts: Maximum number of parts
+
+    Returns:
+        Parts in the order they were sent
+
+    Raises:
+        UploadError: 415 if not multipart, 413 if too large, 400 if malformed
+    """
+    mime_type, options = parse_options_header(content_type or "")
+    if mime_type != b"multipart/form-data":
+        raise UploadError("Expected a multipart/form-data body", status_code=415)
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise UploadError("Missing multipart boundary")
+
+    parts: List[UploadedPart] = []
+    state = {}
+
+    def on_part_begin():
+        state.update(headers={}, field=bytearray(), value=bytearray(),
+                     content=bytearray(), hasher=hashlib.sha256())
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][bytes(state["field"]).lower()] = bytes(state["value"])
+        state["field"].clear()
+        state["value"].clear()
+
+    def on_part_data(data, start, end):
+        chunk = memoryview(data)[start:end]
+        state["content"] += chunk
+        state["hasher"].update(chunk)
+
+    def on_part_end():
+        if len(parts) >= max_parts:
+            raise UploadError(f"Too many parts (max {max_parts})")
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        filename = disposition.get(b"filename")
+        content_type = state["headers"].get(b"content-type")
+        parts.append(UploadedPart(
+            name=disposition.get(b"name", b"").decode("utf-8", "replace"),
+            filename=filename.decode("utf-8", "replace") if filename is not None else None,
+            content_type=content_type.decode("latin-1") if content_type is not None else None,
+            content=state["content"],
+            sha256=state["hasher"].hexdigest(),
+        ))
+
+    parser = MultipartParser(boundary, callbacks={
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    try:
+        async for chunk in stream:
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadError(f"Upload exceeds {max_bytes} bytes", status_code=413)
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise UploadError(f"Malformed multipart body: {str(e)}")
+    return parts
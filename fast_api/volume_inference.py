@@ -0,0 +1,145 @@
+"""
+Full-Volume Inference
+Runs every slice of a multi-frame series through the task models and pools
+the per-slice logits (max or mean), instead of looking only at the three
+middle slices.
+
+Each slice is fed as the 3-channel stack the models were trained on: the
+slice with its two neighbours, clamped at the volume edges (the middle-slice
+path is the same window centred on the middle frame). Slices are processed
+in fixed-size chunks, so only one chunk of frames is decoded and
+preprocessed at a time and peak memory depends on the chunk size, not on the
+length of the series. The next chunk is decoded on a helper thread while the
+current one runs through the models.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import pydicom
+import torch
+
+from preprocessing import decode_frames, preprocess_arrays, volume_frame_count
+
+POOLING_METHODS = ("max", "mean")
+
+
+@dataclass
+class VolumeResult:
+    """Pooled predictions and throughput for one full-volume pass."""
+    probabilities: Dict[str, float]
+    peak_slices: Dict[str, int]  # Slice with the highest logit per task
+    num_slices: int
+    num_chunks: int
+    chunk_size: int
+    pooling: str
+    decode_seconds: float  # Summed over chunks, overlaps inference
+    inference_seconds: float
+    total_seconds: float
+
+    @property
+    def slices_per_second(self) -> float:
+        return self.num_slices / self.total_seconds if self.total_seconds > 0 else 0.0
+
+
+def chunk_ranges(num_slices: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """[start, end) slice ranges of at most chunk_size slices."""
+    return [(start, min(start + chunk_size, num_slices)) for start in range(0, num_slices, chunk_size)]
+
+
+def load_chunk(ds: pydicom.Dataset, start: int, end: int) -> torch.Tensor:
+    """
+    Decodes and preprocesses the frames needed for slices [start, end) and
+    builds one 3-slice window per slice.
+
+    Returns:
+        Float32 CPU tensor (end - start, 3, 256, 256)
+    """
+    num_slices = volume_frame_count(ds)
+    first = max(0, start - 1)
+    last = min(num_slices - 1, end)
+    frames, _ = preprocess_arrays(decode_frames(ds, range(first, last + 1)), visuals=False)
+
+    centers = torch.arange(start, end)
+    windows = torch.stack([
+        (centers - 1).clamp(min=0),
+        centers,
+        (centers + 1).clamp(max=num_slices - 1),
+    ], dim=1)
+    return frames[windows - first]
+
+
+def run_volume(
+    ds: pydicom.Dataset,
+    predict_logits: Callable[[torch.Tensor], torch.Tensor],
+    tasks: List[str],
+    chunk_size: int = 16,
+    pooling: str = "max",
+    device: torch.device = torch.device("cpu"),
+) -> VolumeResult:
+    """
+    Runs every slice of a volume through the models in chunks and pools the logits.
+
+    Args:
+        ds: Opened multi-frame dataset (see preprocessing.open_volume)
+        predict_logits: Maps windows (B, 3, 256, 256) to logits (B, T)
+        tasks: Task names for the T logit columns
+        chunk_size: Slices per forward pass (bounds peak memory)
+        pooling: 'max' or 'mean' over the per-slice logits
+        device: Device the windows are moved to
+
+    Returns:
+        VolumeResult with sigmoid(pooled logit) per task
+    """
+    if pooling not in POOLING_METHODS:
+        raise ValueError(f"Unsupported pooling: {pooling}")
+    num_slices = volume_frame_count(ds)
+    chunks = chunk_ranges(num_slices, max(1, chunk_size))
+
+    def timed_load(start: int, end: int) -> Tuple[torch.Tensor, float]:
+        began = time.perf_counter()
+        windows = load_chunk(ds, start, end)
+        return windows, time.perf_counter() - began
+
+    started = time.perf_counter()
+    decode_seconds = 0.0
+    inference_seconds = 0.0
+    logit_max = logit_argmax = logit_sum = None
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="volume-decode") as decoder:
+        pending = decoder.submit(timed_load, *chunks[0])
+        for k, (start, end) in enumerate(chunks):
+            windows, seconds = pending.result()
+            decode_seconds += seconds
+            if k + 1 < len(chunks):
+                pending = decoder.submit(timed_load, *chunks[k + 1])  # Decode ahead while the models run
+
+            began = time.perf_counter()
+            logits = predict_logits(windows.to(device)).float().cpu()  # (B, T)
+            inference_seconds += time.perf_counter() - began
+            del windows
+
+            chunk_max, chunk_argmax = logits.max(dim=0)
+            chunk_argmax += start
+            if logit_max is None:
+                logit_max, logit_argmax, logit_sum = chunk_max, chunk_argmax, logits.sum(dim=0)
+            else:
+                better = chunk_max > logit_max
+                logit_max = torch.where(better, chunk_max, logit_max)
+                logit_argmax = torch.where(better, chunk_argmax, logit_argmax)
+                logit_sum += logits.sum(dim=0)
+
+    pooled = logit_max if pooling == "max" else logit_sum / num_slices
+    return VolumeResult(
+        probabilities=dict(zip(tasks, torch.sigmoid(pooled).tolist())),
+        peak_slices=dict(zip(tasks, logit_argmax.tolist())),
+        num_slices=num_slices,
+        num_chunks=len(chunks),
+        chunk_size=chunk_size,
+        pooling=pooling,
+        decode_seconds=decode_seconds,
+        inference_seconds=inference_seconds,
+        total_seconds=time.perf_counter() - started,
+    )
@@ -0,0 +1,110 @@
+"""
+Worker Processes
+Identity, CPU budget and memory accounting for the multi-process server
+(serve.py). serve.py loads the models once in a parent process and forks the
+workers from it, so every worker maps the same physical pages for the weights
+(copy-on-write: they are never written after loading). Per-worker RSS counts
+those shared pages in full; PSS splits them between the processes sharing
+them, so the sum of PSS is the real footprint.
+"""
+
+import os
+import resource
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import torch
+
+_MEMORY_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+}
+
+
+@dataclass
+class WorkerIdentity:
+    index: int = 0
+    count: int = 1  # 1 = single-process server (python main.py / uvicorn)
+    parent_pid: Optional[int] = None
+
+
+current = WorkerIdentity()
+_memory_snapshot: Tuple[Optional[int], float, Dict[str, float]] = (None, 0.0, {})  # pid, read at, memory
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects taskset/cgroup affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers: int, cpus: Optional[int] = None) -> int:
+    """Intra-op threads per worker so that workers x threads <= CPUs."""
+    return max(1, (cpus or available_cpus()) // max(1, workers))
+
+
+def configure_worker(index: int, count: int, num_threads: int) -> None:
+    """Called in each forked worker before it starts serving."""
+    current.index = index
+    current.count = count
+    current.parent_pid = os.getppid()
+    torch.set_num_threads(num_threads)
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, float]:
+    """
+    Memory of a process in MB, from /proc/<pid>/smaps_rollup on Linux.
+
+    Args:
+        pid: Process id (None = this process)
+
+    Returns:
+        rss_mb, pss_mb and shared/private clean/dirty MB; only rss_mb (peak,
+        from getrusage) where smaps_rollup is unavailable
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    memory = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in _MEMORY_FIELDS:
+                    memory[_MEMORY_FIELDS[key]] = round(int(value.split()[0]) / 1024, 1)  # kB
+    except OSError:
+        if pid is None:
+            memory["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+
+def recent_process_memory(max_age: float = 1.0) -> Dict[str, float]:
+    """
+    process_memory() of this process, re-read at most every max_age seconds.
+    Reading smaps_rollup walks every mapping (~15 ms with the weights mapped),
+    too slow to repeat for every /health probe and /metrics gauge.
+    """
+    global _memory_snapshot
+    pid, read_at, memory = _memory_snapshot
+    now = time.monotonic()
+    if pid != os.getpid() or now - read_at > max_age:  # A forked worker never reports its parent
+        memory = process_memory()
+        _memory_snapshot = (os.getpid(), now, memory)
+    return memory
+
+
+def worker_info() -> Dict[str, object]:
+    """This worker's identity, thread budget and memory (reported in /health)."""
+    return {
+        "index": current.index,
+        "workers": current.count,
+        "pid": os.getpid(),
+        "parent_pid": current.parent_pid,
+        "intra_op_threads": torch.get_num_threads(),
+        "memory": recent_process_memory(),
+    }